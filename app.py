@@ -4,6 +4,10 @@ import warnings
 
 warnings.filterwarnings('ignore')
 
+# Copy-on-write: filtros e seleções de colunas não copiam os dados até que alguém os altere.
+# Os DataFrames da sessão são compartilhados entre as abas e tratados como somente leitura.
+pd.set_option('mode.copy_on_write', True)
+
 # Configuração da página
 st.set_page_config(
     page_title="Sistema de Análise de Call Center",
@@ -14,14 +18,21 @@ st.set_page_config(
 
 # Importar tabs
 try:
-    from tabs import upload_tab, rechamadas_tab, motivos_tab, agentes_tab, mailing_tab, ranking_tab
+    from tabs import upload_tab, rechamadas_tab, motivos_tab, agentes_tab, mailing_tab, ranking_tab, consulta_tab, periodo
 except ImportError as e:
     st.error(f"❌ Erro ao importar tabs: {e}")
     st.stop()
 
+# Diagnósticos dos utilitários (logging) aparecem na aba que os gerou
+from utils.log import configurar_log_streamlit
+from utils.pipeline import Pipeline
+configurar_log_streamlit()
+
 # Inicialização do session_state
 if 'df_chamadas' not in st.session_state:
     st.session_state.df_chamadas = None
+if 'df_chamadas_completo' not in st.session_state:
+    st.session_state.df_chamadas_completo = None  # arquivo inteiro; df_chamadas é o recorte do período
 if 'df_target' not in st.session_state:
     st.session_state.df_target = None
 if 'df_tma' not in st.session_state:
@@ -30,44 +41,27 @@ if 'df_desliga' not in st.session_state:
     st.session_state.df_desliga = None
 if 'df_nota' not in st.session_state:
     st.session_state.df_nota = None
-if 'rechamadas_detalhe' not in st.session_state:
-    st.session_state.rechamadas_detalhe = None
-if 'rechamadas_result' not in st.session_state:
-    st.session_state.rechamadas_result = None
-if 'df_final_motivos' not in st.session_state:
-    st.session_state.df_final_motivos = None
 if 'operator_performance' not in st.session_state:
     st.session_state.operator_performance = None
-if 'df_mailing_list' not in st.session_state:
-    st.session_state.df_mailing_list = None
+if 'pipeline' not in st.session_state:
+    st.session_state.pipeline = Pipeline()  # resultados das análises (ver utils/pipeline.py)
+if 'uploads_processados' not in st.session_state:
+    st.session_state.uploads_processados = {}  # tipo -> upload já processado (ver upload_tab)
 
 # Título
 st.title("📊 Sistema de Análise de Call Center")
 
-# Tabs
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-    "📁 Upload de Arquivos",
-    "📞 Análise de Rechamadas",
-    "🔍 Motivos de Rechamadas",
-    "👥 Desempenho de Agentes",
-    "🏆 Ranking",
-    "📧 Lista para Mailing"
-])
-
-with tab1:
-    upload_tab.show()
-
-with tab2:
-    rechamadas_tab.show()
-
-with tab3:
-    motivos_tab.show()
-
-with tab4:
-    agentes_tab.show()
-
-with tab5:
-    ranking_tab.show()
-
-with tab6:
-    mailing_tab.show()
+# Páginas: só a página selecionada roda a cada interação (st.tabs executaria todas as abas).
+# Os resultados ficam no session_state e continuam disponíveis ao trocar de página.
+paginas = st.navigation([
+    st.Page(upload_tab.show, title="Upload de Arquivos", icon="📁", url_path="upload", default=True),
+    st.Page(rechamadas_tab.show, title="Análise de Rechamadas", icon="📞", url_path="rechamadas"),
+    st.Page(motivos_tab.show, title="Motivos de Rechamadas", icon="🔍", url_path="motivos"),
+    st.Page(agentes_tab.show, title="Desempenho de Agentes", icon="👥", url_path="agentes"),
+    st.Page(ranking_tab.show, title="Ranking", icon="🏆", url_path="ranking"),
+    st.Page(mailing_tab.show, title="Lista para Mailing", icon="📧", url_path="mailing"),
+    st.Page(consulta_tab.show, title="Consulta de Cliente", icon="🔎", url_path="consulta"),
+], position="top")
+# Filtro de período na barra lateral: define df_chamadas antes da página rodar
+periodo.show()
+paginas.run()
@@ -0,0 +1,275 @@
+"""
+Execução em lote (sem navegador) das análises do app, para relatórios agendados.
+
+    python cli.py --chamadas chamadas.csv --target target.xlsx --coluna-assunto Assunto \\
+        --nota nota.csv --desempenho desempenho.csv --atendimentos atendimentos.csv \\
+        --saida relatorios/
+
+Cada arquivo é opcional; roda cada análise cujos arquivos foram informados e grava na
+pasta de saída as mesmas planilhas/CSV que as abas oferecem para download.
+Diagnósticos do processamento vão para o log (stderr).
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from utils.data_loader import (
+    load_file_chamadas,
+    load_file_target_motivos,
+    carregar_colunas_target,
+    load_file_agentes,
+    usar_streaming,
+    identificar_faixas_rechamada,
+    indexar_telefones,
+    indexar_target,
+    indexar_ids_chamadas,
+    indexar_assuntos,
+    indexar_datas,
+    fatiar_periodo,
+    convert_duration_to_seconds,
+    MEMORIA_STREAMING_MB,
+)
+from utils.cache import carregar_com_cache
+from utils.analises import (
+    consolidar_rechamadas,
+    excel_rechamadas,
+    colunas_id_target,
+    cruzar_motivos,
+    resumir_assuntos,
+    excel_motivos,
+    PESOS_PADRAO,
+    normalizar_pesos,
+    calcular_ranking,
+    excel_ranking,
+    gerar_lista_mailing,
+)
+
+# Mesmo modo do app: os DataFrames carregados são compartilhados e só lidos pelas análises
+pd.set_option('mode.copy_on_write', True)
+
+logger = logging.getLogger('cli')
+
+
+def _argumentos(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Roda as análises do Sistema de Análise de Call Center sem a interface."
+    )
+    arquivos = parser.add_argument_group('arquivos')
+    arquivos.add_argument('--chamadas', help="Arquivo de chamadas (CSV ou Excel)")
+    arquivos.add_argument('--target', help="Arquivo target com os assuntos (CSV ou Excel)")
+    arquivos.add_argument('--nota', help="Arquivo de nota dos agentes")
+    arquivos.add_argument('--desempenho', help="Arquivo de desempenho dos agentes")
+    arquivos.add_argument('--atendimentos', help="Arquivo de atendimentos detalhados")
+    parser.add_argument('--saida', default='.', help="Pasta onde os relatórios são gravados (padrão: pasta atual)")
+
+    carga = parser.add_argument_group('carga')
+    carga.add_argument('--streaming', action='store_true', help="Lê o CSV de chamadas em blocos (automático acima do limite)")
+    carga.add_argument('--memoria-mb', type=int, default=MEMORIA_STREAMING_MB, help="Memória por bloco no streaming")
+    carga.add_argument('--cache', action='store_true', help="Usa o cache local de uploads processados (utils/cache.py)")
+    carga.add_argument('--inicio', type=pd.Timestamp, help="Analisa só as ligações a partir desta data/hora (AAAA-MM-DD [HH:MM])")
+    carga.add_argument('--fim', type=pd.Timestamp, help="Analisa só as ligações antes desta data/hora (exclusivo)")
+
+    rechamadas = parser.add_argument_group('rechamadas e motivos')
+    rechamadas.add_argument('--valor-ligacao', type=float, default=7.56, help="Valor médio por ligação")
+    rechamadas.add_argument('--id-target', help="Coluna de ID no target (padrão: a de ID Genesys)")
+    rechamadas.add_argument('--coluna-assunto', help="Coluna de assunto/motivo no target (obrigatória com --target)")
+
+    ranking = parser.add_argument_group('ranking')
+    ranking.add_argument('--t-min', default='00:30', help="T Min (mm:ss ou segundos)")
+    ranking.add_argument('--t-max', default='05:00', help="T Max (mm:ss ou segundos)")
+    for indicador, peso in PESOS_PADRAO.items():
+        ranking.add_argument(
+            f"--peso-{indicador.lower().replace('_', '-')}", type=float, default=peso,
+            dest=f"peso_{indicador}", help=f"Peso de {indicador} (0 = não considerar)"
+        )
+
+    mailing = parser.add_argument_group('mailing')
+    mailing.add_argument('--min-ligacoes', type=int, default=5, help="Mínimo de ligações (0 = não usar o critério)")
+    mailing.add_argument('--periodos', nargs='*', default=[], choices=['0-24h', '24-48h', '48-72h'],
+                         help="Períodos de rechamada a incluir")
+    mailing.add_argument('--duracao-minima', type=int, help="Duração mínima em minutos para ligações longas")
+
+    parser.add_argument('-v', '--verbose', action='store_true', help="Mostra também as mensagens de depuração")
+
+    args = parser.parse_args(argv)
+    if args.target and not args.coluna_assunto:
+        parser.error("--coluna-assunto é obrigatória com --target")
+    if args.target and not args.chamadas:
+        parser.error("--target precisa de --chamadas")
+    return args
+
+
+def _carregar(caminho, tipo, carregar, usar_cache):
+    """Abre o arquivo local e aplica a função de carga (uploaded_file -> (df, erro))."""
+    with open(caminho, 'rb') as arquivo:
+        if usar_cache:
+            df, erro = carregar_com_cache(arquivo, tipo, carregar)
+        else:
+            df, erro = carregar(arquivo)
+    if erro:
+        raise RuntimeError(f"{os.path.basename(caminho)}: {erro}")
+    logger.info(f"📁 {os.path.basename(caminho)}: {len(df):,} registros")
+    return df
+
+
+def _gravar(saida, nome, conteudo):
+    caminho = os.path.join(saida, nome)
+    with open(caminho, 'wb') as f:
+        f.write(conteudo)
+    logger.info(f"💾 {caminho}")
+    return caminho
+
+
+def executar(args):
+    """Roda as análises com os arquivos informados. Retorna a lista de relatórios gravados."""
+    os.makedirs(args.saida, exist_ok=True)
+    carimbo = datetime.now().strftime('%Y%m%d_%H%M%S')
+    gravados = []
+
+    rechamadas_detalhe = None
+    indice_telefones = None
+    df_chamadas = None
+    if args.chamadas:
+        with open(args.chamadas, 'rb') as arquivo:
+            streaming = args.streaming or usar_streaming(arquivo)
+        df_chamadas = _carregar(
+            args.chamadas,
+            'chamadas_streaming' if streaming else 'chamadas',
+            lambda f: load_file_chamadas(f, streaming=streaming, memoria_mb=args.memoria_mb),
+            args.cache
+        )
+        if df_chamadas['datetime'].isna().all():
+            raise RuntimeError("Nenhuma data válida no arquivo de chamadas.")
+
+        if args.inicio or args.fim:
+            # Mesmo recorte do filtro de período do app
+            indice_datas = indexar_datas(df_chamadas)
+            primeira, ultima = indice_datas.limites()
+            df_chamadas = fatiar_periodo(
+                df_chamadas, indice_datas,
+                args.inicio or primeira,
+                args.fim or ultima + pd.Timedelta(1, 'ns')
+            )
+            if df_chamadas.empty:
+                raise RuntimeError("Nenhuma ligação no período informado.")
+            logger.info(f"🗓️ {len(df_chamadas):,} ligações no período")
+
+        # Índice por telefone construído uma vez e compartilhado pelas análises
+        indice_telefones = indexar_telefones(df_chamadas)
+        rechamadas_detalhe = identificar_faixas_rechamada(df_chamadas)
+        consolidado = consolidar_rechamadas(
+            df_chamadas, rechamadas_detalhe, indice_telefones, valor_ligacao=args.valor_ligacao
+        )
+        logger.info(
+            f"📞 {consolidado['total_rechamadas_identificadas']:,} rechamadas em "
+            f"{consolidado['total_ligacoes']:,} ligações ({consolidado['periodo_analise']})"
+        )
+        gravados.append(_gravar(
+            args.saida, f"analise_rechamadas_{carimbo}.xlsx",
+            excel_rechamadas(rechamadas_detalhe, consolidado).getvalue()
+        ))
+
+    if args.target:
+        # Como no app: só as colunas de ID, e a de assunto lida em seguida
+        df_target = _carregar(args.target, 'target', load_file_target_motivos, args.cache)
+        id_coluna_target = args.id_target or colunas_id_target(df_target.columns)[0]
+        for coluna in (id_coluna_target, args.coluna_assunto):
+            if coluna not in df_target.attrs['colunas_arquivo']:
+                raise RuntimeError(f"Coluna '{coluna}' não encontrada no target.")
+        with open(args.target, 'rb') as arquivo:
+            df_target, erro = carregar_colunas_target(df_target, arquivo, [id_coluna_target, args.coluna_assunto])
+        if erro:
+            raise RuntimeError(erro)
+
+        # Índices por ID do target e das chamadas, compartilhados pelos dois cruzamentos
+        indice_target = indexar_target(df_target, id_coluna_target)
+        ids_chamadas = indexar_ids_chamadas(df_chamadas)
+        df_final_motivos, erro = cruzar_motivos(
+            df_chamadas, rechamadas_detalhe, df_target, indice_target, ids_chamadas,
+            id_coluna_target, args.coluna_assunto
+        )
+        if erro:
+            raise RuntimeError(erro)
+        if df_final_motivos.empty:
+            logger.warning("⚠️ Nenhum motivo encontrado para as rechamadas; relatório de motivos não gerado.")
+        else:
+            resumo, detalhe_assuntos = resumir_assuntos(
+                df_chamadas, rechamadas_detalhe, df_target, indice_telefones, indice_target, ids_chamadas,
+                indexar_assuntos(df_target, args.coluna_assunto), id_coluna_target, args.coluna_assunto
+            )
+            gravados.append(_gravar(
+                args.saida, f"analise_motivos_rechamadas_{carimbo}.xlsx",
+                excel_motivos(resumo, detalhe_assuntos, df_final_motivos).getvalue()
+            ))
+
+    if args.nota and args.desempenho and args.atendimentos:
+        df_nota, df_perf, df_atend = (
+            _carregar(caminho, tipo, lambda f, tipo=tipo: load_file_agentes(f, tipo), args.cache)
+            for caminho, tipo in (
+                (args.nota, 'nota'),
+                (args.desempenho, 'desempenho'),
+                (args.atendimentos, 'atendimentos'),
+            )
+        )
+        pesos_normalizados = normalizar_pesos({
+            indicador: getattr(args, f"peso_{indicador}") for indicador in PESOS_PADRAO
+        })
+        if pesos_normalizados is None:
+            raise RuntimeError("Informe pelo menos um indicador com peso maior que zero.")
+
+        df_ranking = calcular_ranking(
+            df_nota, df_perf, df_atend,
+            convert_duration_to_seconds(args.t_min),
+            convert_duration_to_seconds(args.t_max),
+            pesos_normalizados
+        )
+        if df_ranking.empty:
+            logger.warning("⚠️ Nenhum agente com atendimentos; ranking não gerado.")
+        else:
+            logger.info(f"🏆 Ranking com {len(df_ranking)} agentes")
+            gravados.append(_gravar(
+                args.saida, f"ranking_agentes_{carimbo}.xlsx", excel_ranking(df_ranking).getvalue()
+            ))
+    elif args.nota or args.desempenho or args.atendimentos:
+        logger.warning("⚠️ O ranking precisa de --nota, --desempenho e --atendimentos; ranking não gerado.")
+
+    if df_chamadas is not None:
+        lista_mailing = gerar_lista_mailing(
+            df_chamadas,
+            rechamadas_detalhe=rechamadas_detalhe,
+            indice_telefones=indice_telefones,
+            min_ligacoes=args.min_ligacoes or None,
+            periodos=args.periodos,
+            duracao_minima_seg=args.duracao_minima * 60 if args.duracao_minima else None,
+        )
+        if lista_mailing.empty:
+            logger.warning("⚠️ Nenhum cliente atende aos critérios de mailing; lista não gerada.")
+        else:
+            logger.info(f"📧 Lista de mailing com {len(lista_mailing)} contatos")
+            gravados.append(_gravar(
+                args.saida, f"lista_mailing_{carimbo}.csv", lista_mailing.to_csv(index=False).encode('utf-8')
+            ))
+
+    return gravados
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+    try:
+        executar(args)
+    except (RuntimeError, OSError) as e:
+        logger.error(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
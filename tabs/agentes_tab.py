@@ -12,97 +12,37 @@ def show():
     # 1. VERIFICAÇÃO DE ARQUIVOS CARREGADOS
     # ============================================================
     if st.session_state.get('df_nota') is None:
-        st.warning("⚠️ Arquivo de Nota não carregado. Faça o upload na aba 'Upload de Arquivos'.")
+        st.warning("⚠️ Arquivo de Nota não carregado. Faça o upload na página 'Upload de Arquivos'.")
         return
 
     if st.session_state.get('df_desempenho') is None:
-        st.warning("⚠️ Arquivo de Desempenho não carregado. Faça o upload na aba 'Upload de Arquivos'.")
+        st.warning("⚠️ Arquivo de Desempenho não carregado. Faça o upload na página 'Upload de Arquivos'.")
         return
 
-    df_nota = st.session_state.df_nota.copy()
-    df_perf = st.session_state.df_desempenho.copy()
-
-    # Garantia extra: normaliza nomes novamente (case-insensitive)
-    df_nota['Nome_Agente'] = df_nota['Nome_Agente'].astype(str).str.strip().str.lower()
-    df_perf['Nome_Agente'] = df_perf['Nome_Agente'].astype(str).str.strip().str.lower()
+    # A consolidação é calculada pelo pipeline da sessão (utils/pipeline.py)
+    pipeline = st.session_state.pipeline
 
     # ============================================================
     # 2. CONSOLIDAÇÃO DOS DADOS
     # ============================================================
     if st.button("🔄 Consolidar Dados dos Agentes", type="primary"):
         with st.spinner("Consolidando dados..."):
-            # Merge usando Nome_Agente como chave (case-insensitive)
-            df_consolidado = pd.merge(
-                df_perf,
-                df_nota,
-                on='Nome_Agente',
-                how='outer'
-            )
-
-            # Preenche valores faltantes
-            df_consolidado = df_consolidado.fillna({
-                'Atendidas': 0,
-                'TMA_Segundos': 0,
-                'Transferidas': 0,
-                'Conversa_Max_Segundos': 0,
-                'Notas_Atendente': 0,
-                'CSAT': 0
-            })
-
-            # ========================================================
-            # 2.1 EXCLUSÃO DE AGENTES SEM ATENDIMENTOS
-            # ========================================================
-            antes_exclusao = len(df_consolidado)
-
-            # Converte para numérico e remove zeros/nulls
-            df_consolidado['Atendidas'] = pd.to_numeric(df_consolidado['Atendidas'], errors='coerce')
-            df_consolidado = df_consolidado[df_consolidado['Atendidas'] > 0].copy()
-
-            depois_exclusao = len(df_consolidado)
-            agentes_excluidos = antes_exclusao - depois_exclusao
+            df_consolidado, agentes_excluidos = pipeline.obter('agentes', st.session_state)
 
             if agentes_excluidos > 0:
                 st.warning(f"⚠️ {agentes_excluidos} agentes foram excluídos por não terem atendimentos (Atendidas = 0 ou null)")
 
-            # ========================================================
-            # 2.2 CÁLCULO DAS MÉTRICAS DERIVADAS
-            # ========================================================
-
-            # Converte TMA de segundos para minutos
-            df_consolidado['TMA_Minutos'] = (df_consolidado['TMA_Segundos'] / 60).round(2)
-
-            # Converte Conversa_Max de segundos para minutos
-            df_consolidado['Conversa_Max_Minutos'] = (df_consolidado['Conversa_Max_Segundos'] / 60).round(2)
-
-            # ========================================================
-            # 2.3 CÁLCULO CORRETO DO ENCAMINHAMENTO PARA PESQUISA
-            # ========================================================
-            # Garante que Transferidas seja numérico
-            df_consolidado['Transferidas'] = pd.to_numeric(
-                df_consolidado['Transferidas'], 
-                errors='coerce'
-            ).fillna(0)
-
-            # Calcula o percentual de encaminhamento para pesquisa
-            df_consolidado['Perc_Encaminhamento_Pesquisa'] = (
-                (df_consolidado['Transferidas'] / df_consolidado['Atendidas']) * 100
-            ).fillna(0).round(2)
-
-            # Garante que não ultrapasse 100%
-            df_consolidado['Perc_Encaminhamento_Pesquisa'] = df_consolidado['Perc_Encaminhamento_Pesquisa'].clip(upper=100)
-
-            # Ordena por CSAT (maior para menor)
-            df_consolidado = df_consolidado.sort_values('CSAT', ascending=False)
-
-            # Salva no session_state
-            st.session_state.df_agentes_consolidado = df_consolidado
             st.success(f"✅ Dados consolidados! {len(df_consolidado)} agentes ativos.")
 
     # ============================================================
     # 3. EXIBIÇÃO DOS RESULTADOS
     # ============================================================
-    if st.session_state.get('df_agentes_consolidado') is not None:
-        df_consolidado = st.session_state.df_agentes_consolidado
+    consolidacao = pipeline.atual('agentes', st.session_state)
+    if consolidacao is None and pipeline.calculada('agentes'):
+        st.info("🔄 Os arquivos dos agentes mudaram desde a última consolidação. Consolide novamente.")
+
+    if consolidacao is not None:
+        df_consolidado, _ = consolidacao
 
         st.subheader("📊 Métricas Gerais")
 
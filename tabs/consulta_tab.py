@@ -0,0 +1,110 @@
+import streamlit as st
+import pandas as pd
+from utils.data_loader import carregar_colunas_target, sanitizar_telefones, MIN_DIGITOS_TELEFONE
+from utils.analises import colunas_id_target, historico_telefone
+
+
+def show():
+    st.header("🔎 Consulta de Cliente")
+
+    if st.session_state.get('df_chamadas') is None:
+        st.warning("⚠️ Nenhum dado de chamadas carregado. Por favor, faça o upload do arquivo na página 'Upload de Arquivos'.")
+        return
+
+    # Índice por telefone e rechamadas vêm do pipeline da sessão (calculados uma vez por upload)
+    pipeline = st.session_state.pipeline
+    df_chamadas = st.session_state.df_chamadas
+    df_target = st.session_state.get('df_target')
+
+    telefone_digitado = st.text_input(
+        "Telefone do cliente",
+        key="telefone_consulta",
+        help="Digite o telefone como aparece nas listas de rechamadas ou de mailing (só os dígitos contam)."
+    )
+
+    # Assuntos do target (opcional)
+    indice_target = None
+    coluna_assunto = None
+    if df_target is not None:
+        colunas_target = df_target.attrs.get('colunas_arquivo', list(df_target.columns))
+        col1, col2 = st.columns(2)
+        with col1:
+            id_coluna_target = st.selectbox(
+                "Coluna de ID no Target (ID Genesys)",
+                colunas_id_target(df_target.columns),
+                key="id_coluna_target_consulta"
+            )
+        with col2:
+            coluna_assunto = st.selectbox(
+                "Coluna de Assunto",
+                options=colunas_target,
+                key="coluna_assunto_consulta"
+            )
+
+        if coluna_assunto not in df_target.columns:
+            if st.session_state.get('target_arquivo') is None:
+                st.error(f"❌ Coluna '{coluna_assunto}' não carregada e o arquivo target original não está disponível. Carregue-o novamente.")
+                coluna_assunto = None
+            else:
+                with st.spinner(f"Lendo a coluna '{coluna_assunto}' do arquivo target..."):
+                    df_target_lido, erro = carregar_colunas_target(
+                        df_target, st.session_state.target_arquivo, [coluna_assunto]
+                    )
+                if erro:
+                    st.error(f"❌ {erro}")
+                    coluna_assunto = None
+                else:
+                    df_target = st.session_state.df_target = df_target_lido
+
+        indice_target = pipeline.obter('indice_target', st.session_state, id_coluna_target=id_coluna_target)
+    else:
+        st.caption("Carregue o arquivo Target na página 'Upload de Arquivos' para ver os assuntos de cada ligação.")
+
+    if not (telefone_digitado or '').strip():
+        return
+
+    # Mesma limpeza do carregamento: a chave de busca é o texto só com dígitos
+    telefones, mascaras = sanitizar_telefones(pd.Series([telefone_digitado]))
+    digitos = telefones[0]
+    if not digitos:
+        if mascaras['curtos'][0] and not mascaras['bloqueados'][0]:
+            st.warning(f"Telefone inválido: informe ao menos {MIN_DIGITOS_TELEFONE} dígitos.")
+        else:
+            st.warning("Telefone inválido: bloqueado, repetido ou na lista de números descartados no carregamento.")
+        return
+
+    with st.spinner("Montando índice de telefones..."):
+        indice_telefones = pipeline.obter('telefones', st.session_state)
+        rechamadas_detalhe = pipeline.obter('rechamadas', st.session_state)
+
+    historico = historico_telefone(
+        df_chamadas, indice_telefones, rechamadas_detalhe, digitos,
+        df_target=df_target, indice_target=indice_target, coluna_assunto=coluna_assunto
+    )
+    if historico is None:
+        st.warning(f"Nenhuma ligação encontrada para o telefone {digitos}.")
+        return
+
+    resumo = historico['resumo']
+    st.subheader(f"📞 Telefone {digitos}")
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1: st.metric("Ligações", f"{resumo['total_ligacoes']:,}")
+    with col2: st.metric("Rechamadas", f"{resumo['total_rechamadas']:,}")
+    with col3: st.metric("Duração Total", f"{resumo['duracao_total_seg'] / 60:,.1f} min")
+    with col4: st.metric("Maior Ligação", f"{resumo['duracao_maxima_seg'] / 60:,.1f} min")
+    st.info(f"Período: {resumo['primeira_ligacao']:%d/%m/%Y %H:%M} a {resumo['ultima_ligacao']:%d/%m/%Y %H:%M}")
+
+    st.subheader("Histórico de Ligações")
+    ligacoes = historico['ligacoes'].rename(columns={
+        'datetime': 'Data/Hora',
+        'duracao_segundos': 'Duração (seg)',
+        'primeira_ligacao': 'Primeira Ligação',
+    })
+    st.dataframe(ligacoes, use_container_width=True)
+
+    st.subheader("Rechamadas")
+    if historico['rechamadas'].empty:
+        st.info("Este telefone não tem rechamadas.")
+    else:
+        st.dataframe(historico['rechamadas'], use_container_width=True)
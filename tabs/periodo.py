@@ -0,0 +1,81 @@
+import streamlit as st
+from datetime import datetime, time, timedelta
+from utils.data_loader import fatiar_periodo
+
+# --- FILTRO GLOBAL DE PERÍODO ---
+# O upload guarda o arquivo inteiro em df_chamadas_completo; todas as páginas leem
+# df_chamadas, que é o recorte do período escolhido na barra lateral (ou o próprio
+# arquivo inteiro). O recorte usa o índice por data do pipeline: duas buscas binárias
+# e um take só das linhas do período.
+
+
+def aplicar_periodo(inicio=None, fim=None):
+    """
+    Atualiza st.session_state.df_chamadas com as ligações de df_chamadas_completo em
+    [inicio, fim); sem período, usa o arquivo inteiro. O recorte fica guardado e é
+    reaproveitado enquanto o arquivo e o período não mudarem.
+    """
+    completo = st.session_state.get('df_chamadas_completo')
+    if completo is None or inicio is None:
+        st.session_state.df_chamadas = completo
+        return
+
+    anterior = st.session_state.get('recorte_periodo')
+    if anterior is not None and anterior['origem'] is completo and anterior['periodo'] == (inicio, fim):
+        recorte = anterior['df']
+    else:
+        indice_datas = st.session_state.pipeline.obter('indice_datas', st.session_state)
+        recorte = fatiar_periodo(completo, indice_datas, inicio, fim)
+        st.session_state.recorte_periodo = {'origem': completo, 'periodo': (inicio, fim), 'df': recorte}
+
+    # Sem ligações no período as páginas não têm o que analisar
+    st.session_state.df_chamadas = recorte if not recorte.empty else None
+
+
+def show():
+    """Filtro de data/hora na barra lateral, aplicado antes da página selecionada rodar."""
+    completo = st.session_state.get('df_chamadas_completo')
+    if completo is None:
+        aplicar_periodo()
+        return
+
+    with st.sidebar:
+        st.header("🗓️ Período da Análise")
+
+        primeira, ultima = st.session_state.pipeline.obter('indice_datas', st.session_state).limites()
+        # Um novo arquivo recria os campos com o período inteiro dele
+        sufixo = str(completo.attrs.get('impressao') or id(completo))[:12]
+
+        datas = st.date_input(
+            "Datas",
+            value=(primeira.date(), ultima.date()),
+            min_value=primeira.date(),
+            max_value=ultima.date(),
+            format="DD/MM/YYYY",
+            key=f"periodo_datas_{sufixo}"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            hora_inicio = st.time_input("Hora inicial", time(0, 0), key=f"periodo_hora_inicio_{sufixo}")
+        with col2:
+            hora_fim = st.time_input("Hora final", time(23, 59), key=f"periodo_hora_fim_{sufixo}")
+
+        if len(datas) != 2:
+            st.caption("Selecione também a data final. Até lá, todo o arquivo é considerado.")
+            aplicar_periodo()
+            return
+
+        inicio = datetime.combine(datas[0], hora_inicio)
+        # A hora final é inclusiva: vai até o fim daquele minuto
+        fim = datetime.combine(datas[1], hora_fim) + timedelta(minutes=1)
+
+        if inicio <= primeira and fim > ultima:
+            aplicar_periodo()
+        else:
+            aplicar_periodo(inicio, fim)
+
+        df_chamadas = st.session_state.df_chamadas
+        if df_chamadas is None:
+            st.warning("⚠️ Nenhuma ligação no período selecionado. Ajuste as datas ou horas.")
+        else:
+            st.caption(f"{len(df_chamadas):,} de {len(completo):,} ligações no período")
@@ -1,28 +1,10 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import io
 from datetime import datetime
 from utils.visualization import set_style, plot_bar_chart
 from utils.data_loader import convert_duration_to_seconds
-
-
-def normalizar_metrica(serie, inverter=False):
-    """Normaliza métrica para escala 0-100. Se inverter=True, menor valor = melhor."""
-    if len(serie) == 0:
-        return pd.Series([], dtype=float)
-
-    if serie.max() == serie.min():
-        return pd.Series([50] * len(serie), index=serie.index)
-
-    if inverter:
-        # Menor valor = 100, maior valor = 0
-        normalized = 100 - ((serie - serie.min()) / (serie.max() - serie.min()) * 100)
-    else:
-        # Maior valor = 100, menor valor = 0
-        normalized = ((serie - serie.min()) / (serie.max() - serie.min()) * 100)
-
-    return normalized
+from utils.analises import normalizar_pesos, tabela_ranking, excel_ranking
 
 
 def show():
@@ -42,7 +24,7 @@ def show():
 
     if arquivos_faltando:
         st.warning(f"⚠️ Arquivos não carregados: {', '.join(arquivos_faltando)}")
-        st.info("Faça o upload na aba 'Upload de Arquivos'")
+        st.info("Faça o upload na página 'Upload de Arquivos'")
         return
 
     # ============================================================
@@ -161,19 +143,17 @@ def show():
             else 0.0
         )
 
-    total_pesos = peso_tma + peso_csat + peso_enc + peso_desconexoes + peso_acima_tmax
-    if total_pesos == 0:
+    pesos_normalizados = normalizar_pesos({
+        "TMA": peso_tma,
+        "CSAT": peso_csat,
+        "Enc_Pesquisa": peso_enc,
+        "Desconexoes": peso_desconexoes,
+        "Acima_TMax": peso_acima_tmax,
+    })
+    if pesos_normalizados is None:
         st.error("❌ Selecione pelo menos um indicador com peso maior que zero!")
         return
 
-    pesos_normalizados = {
-        "TMA": peso_tma / total_pesos,
-        "CSAT": peso_csat / total_pesos,
-        "Enc_Pesquisa": peso_enc / total_pesos,
-        "Desconexoes": peso_desconexoes / total_pesos,
-        "Acima_TMax": peso_acima_tmax / total_pesos,
-    }
-
     st.write("**Pesos Normalizados:**")
     df_pesos = pd.DataFrame([pesos_normalizados]).T
     df_pesos.columns = ["Peso (%)"]
@@ -183,145 +163,25 @@ def show():
     # ============================================================
     # 4. BOTÃO: GERAR RANKING
     # ============================================================
+    # O ranking é calculado pelo pipeline da sessão (utils/pipeline.py)
+    pipeline = st.session_state.pipeline
+    parametros_ranking = {
+        't_min': t_min,
+        't_max': t_max,
+        'pesos_normalizados': pesos_normalizados,
+    }
+
     if st.button("🏆 Gerar Ranking de Desempenho", type="primary"):
         with st.spinner("Calculando ranking..."):
-            df_nota = st.session_state.df_nota.copy()
-            df_perf = st.session_state.df_desempenho.copy()
-            df_atend = st.session_state.df_atendimentos.copy()
-
-            # Normaliza nomes
-            for df in (df_nota, df_perf, df_atend):
-                df["Nome_Agente"] = (
-                    df["Nome_Agente"].astype(str).str.strip().str.lower()
-                )
-
-            # 4.1 Merge base
-            df_ranking = pd.merge(df_perf, df_nota, on="Nome_Agente", how="outer")
-
-            # 4.2 Métricas de atendimentos
-            if "desconexao_agente" not in df_atend.columns:
-                df_atend["desconexao_agente"] = False
-
-            metricas_atend = (
-                df_atend.groupby("Nome_Agente")
-                .agg(
-                    total_atendimentos=("Nome_Agente", "count"),
-                    acima_tmax=("duracao_segundos", lambda x: (x > t_max).sum()),
-                    abaixo_tmin=("duracao_segundos", lambda x: (x < t_min).sum()),
-                    desconexoes_agente=("desconexao_agente", "sum"),
-                )
-                .reset_index()
-            )
-
-            metricas_atend["perc_acima_tmax"] = (
-                metricas_atend["acima_tmax"]
-                / metricas_atend["total_atendimentos"]
-                * 100
-            ).fillna(0)
-            metricas_atend["perc_abaixo_tmin"] = (
-                metricas_atend["abaixo_tmin"]
-                / metricas_atend["total_atendimentos"]
-                * 100
-            ).fillna(0)
-            metricas_atend["perc_desconexoes"] = (
-                metricas_atend["desconexoes_agente"]
-                / metricas_atend["total_atendimentos"]
-                * 100
-            ).fillna(0)
-
-            df_ranking = pd.merge(
-                df_ranking, metricas_atend, on="Nome_Agente", how="left"
-            )
-
-            # 4.3 Filtra agentes com atendidas
-            df_ranking["Atendidas"] = pd.to_numeric(
-                df_ranking["Atendidas"], errors="coerce"
-            ).fillna(0)
-            df_ranking = df_ranking[df_ranking["Atendidas"] > 0].copy()
-            df_ranking = df_ranking.fillna(0)
-
-            # 4.4 TMA e Conversa Máx em minutos
-            if "TMA_Segundos" in df_ranking.columns:
-                df_ranking["TMA_Minutos"] = (
-                    df_ranking["TMA_Segundos"] / 60
-                ).round(2)
-            else:
-                df_ranking["TMA_Minutos"] = 0
-
-            if "Conversa_Max_Segundos" in df_ranking.columns:
-                df_ranking["Conversa_Max_Minutos"] = (
-                    df_ranking["Conversa_Max_Segundos"] / 60
-                ).round(2)
-            else:
-                df_ranking["Conversa_Max_Minutos"] = 0
-
-            # 4.5 % Encaminhamento para pesquisa
-            df_ranking["Transferidas"] = pd.to_numeric(
-                df_ranking.get("Transferidas", 0), errors="coerce"
-            ).fillna(0)
-            df_ranking["Perc_Encaminhamento_Pesquisa"] = (
-                df_ranking["Transferidas"] / df_ranking["Atendidas"] * 100
-            ).fillna(0).clip(upper=100).round(2)
-
-            # 4.6 Scores normalizados
-            if usar_tma and "TMA_Segundos" in df_ranking.columns:
-                df_ranking["TMA_Score"] = normalizar_metrica(
-                    df_ranking["TMA_Segundos"], inverter=True
-                )
-            else:
-                df_ranking["TMA_Score"] = 0
-
-            if usar_csat and "CSAT" in df_ranking.columns:
-                df_ranking["CSAT_Score"] = normalizar_metrica(
-                    df_ranking["CSAT"], inverter=False
-                )
-            else:
-                df_ranking["CSAT_Score"] = 0
-
-            if usar_enc:
-                df_ranking["Enc_Pesquisa_Score"] = normalizar_metrica(
-                    df_ranking["Perc_Encaminhamento_Pesquisa"], inverter=False
-                )
-            else:
-                df_ranking["Enc_Pesquisa_Score"] = 0
-
-            if usar_desconexoes:
-                df_ranking["Desconexoes_Score"] = normalizar_metrica(
-                    df_ranking["perc_desconexoes"], inverter=True
-                )
-            else:
-                df_ranking["Desconexoes_Score"] = 0
-
-            if usar_acima_tmax:
-                df_ranking["AcimaTMax_Score"] = normalizar_metrica(
-                    df_ranking["perc_acima_tmax"], inverter=True
-                )
-            else:
-                df_ranking["AcimaTMax_Score"] = 0
-
-            # 4.7 Score final
-            df_ranking["Score_Final"] = (
-                df_ranking["TMA_Score"] * pesos_normalizados["TMA"]
-                + df_ranking["CSAT_Score"] * pesos_normalizados["CSAT"]
-                + df_ranking["Enc_Pesquisa_Score"] * pesos_normalizados["Enc_Pesquisa"]
-                + df_ranking["Desconexoes_Score"]
-                * pesos_normalizados["Desconexoes"]
-                + df_ranking["AcimaTMax_Score"]
-                * pesos_normalizados["Acima_TMax"]
-            )
-
-            df_ranking["Posicao"] = df_ranking["Score_Final"].rank(
-                ascending=False, method="min"
-            ).astype(int)
-            df_ranking = df_ranking.sort_values("Posicao")
-
-            st.session_state.df_ranking = df_ranking
+            df_ranking = pipeline.obter('ranking', st.session_state, **parametros_ranking)
             st.success(f"✅ Ranking gerado com {len(df_ranking)} agentes!")
 
     # ============================================================
-    # 5. EXIBIÇÃO DO RANKING (usa o que estiver no session_state)
+    # 5. EXIBIÇÃO DO RANKING (válido para os arquivos e parâmetros atuais)
     # ============================================================
-    df_ranking = st.session_state.get("df_ranking")
+    df_ranking = pipeline.atual('ranking', st.session_state, **parametros_ranking)
+    if df_ranking is None and pipeline.calculada('ranking'):
+        st.info("🔄 Os arquivos, limites ou pesos mudaram desde o último ranking. Gere o ranking novamente.")
     if df_ranking is None or df_ranking.empty:
         return
 
@@ -336,55 +196,7 @@ def show():
         st.metric("Melhor Score", f"{df_ranking['Score_Final'].max():.1f}")
 
     # 5.1 Tabela
-    colunas_desejadas = [
-        "Posicao",
-        "Nome_Agente",
-        "Score_Final",
-        "Atendidas",
-        "TMA_Minutos",
-        "CSAT",
-        "Perc_Encaminhamento_Pesquisa",
-        "perc_desconexoes",
-        "perc_acima_tmax",
-        "perc_abaixo_tmin",
-    ]
-    colunas_disponiveis = [c for c in colunas_desejadas if c in df_ranking.columns]
-    df_display = df_ranking[colunas_disponiveis].copy()
-
-    rename_map = {
-        "Posicao": "Rank",
-        "Nome_Agente": "Agente",
-        "Score_Final": "Score",
-        "Atendidas": "Atendidas",
-        "TMA_Minutos": "TMA (min)",
-        "CSAT": "CSAT",
-        "Perc_Encaminhamento_Pesquisa": "% Encaminhamentos Pesquisa",
-        "perc_desconexoes": "Desconex. (%)",
-        "perc_acima_tmax": "Acima TMax (%)",
-        "perc_abaixo_tmin": "Abaixo TMin (%)",
-    }
-    df_display = df_display.rename(
-        columns={k: v for k, v in rename_map.items() if k in df_display.columns}
-    )
-
-    if "Agente" in df_display.columns:
-        df_display["Agente"] = df_display["Agente"].str.title()
-    if "Score" in df_display.columns:
-        df_display["Score"] = df_display["Score"].round(1)
-    if "TMA (min)" in df_display.columns:
-        df_display["TMA (min)"] = df_display["TMA (min)"].round(1)
-    if "CSAT" in df_display.columns:
-        df_display["CSAT"] = df_display["CSAT"].round(2)
-    if "% Encaminhamentos Pesquisa" in df_display.columns:
-        df_display["% Encaminhamentos Pesquisa"] = df_display[
-            "% Encaminhamentos Pesquisa"
-        ].round(1)
-    if "Desconex. (%)" in df_display.columns:
-        df_display["Desconex. (%)"] = df_display["Desconex. (%)"].round(1)
-    if "Acima TMax (%)" in df_display.columns:
-        df_display["Acima TMax (%)"] = df_display["Acima TMax (%)"].round(1)
-    if "Abaixo TMin (%)" in df_display.columns:
-        df_display["Abaixo TMin (%)"] = df_display["Abaixo TMin (%)"].round(1)
+    df_display = tabela_ranking(df_ranking)
 
     st.dataframe(df_display, use_container_width=True, height=400)
 
@@ -422,31 +234,10 @@ def show():
 
     # 5.3 Download
     st.subheader("📥 Download")
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-        df_display.to_excel(writer, sheet_name="Ranking", index=False)
-
-        colunas_scores_desejadas = [
-            "Nome_Agente",
-            "Posicao",
-            "Score_Final",
-            "TMA_Score",
-            "CSAT_Score",
-            "Enc_Pesquisa_Score",
-            "Desconexoes_Score",
-            "AcimaTMax_Score",
-        ]
-        colunas_scores_disponiveis = [
-            c for c in colunas_scores_desejadas if c in df_ranking.columns
-        ]
-        df_scores = df_ranking[colunas_scores_disponiveis].copy()
-        df_scores["Nome_Agente"] = df_scores["Nome_Agente"].str.title()
-        df_scores.to_excel(writer, sheet_name="Scores_Detalhados", index=False)
-
-    buffer.seek(0)
+    # A planilha só é montada quando o botão é clicado
     st.download_button(
         "📥 Baixar Ranking Completo",
-        data=buffer,
+        data=lambda: excel_ranking(df_ranking).getvalue(),
         file_name=f"ranking_agentes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
-import io
 from datetime import datetime
-from utils.data_loader import identificar_faixas_rechamada, faixas_ligacoes_e_reincidentes, calcular_impacto_financeiro # Importa as funções de análise
+from utils.data_loader import formatar_telefone
+from utils.analises import excel_rechamadas # Importa as funções de análise
 from utils.visualization import set_style, plot_bar_chart, plot_pie_chart, plot_histogram # Importa as funções de visualização
 
 def show():
@@ -10,10 +10,12 @@ def show():
     st.header("📞 Análise de Rechamadas")
 
     if st.session_state.get('df_chamadas') is None:
-        st.warning("⚠️ Nenhum dado de chamadas carregado. Por favor, faça o upload do arquivo na aba 'Upload de Arquivos'.")
+        st.warning("⚠️ Nenhum dado de chamadas carregado. Por favor, faça o upload do arquivo na página 'Upload de Arquivos'.")
         return
 
-    df = st.session_state.df_chamadas.copy()
+    # As análises rodam pelo pipeline da sessão (utils/pipeline.py), que só recalcula o que
+    # um novo upload ou a mudança de parâmetros invalidou
+    pipeline = st.session_state.pipeline
 
     st.subheader("Configurações da Análise")
 
@@ -23,54 +25,13 @@ def show():
 
     if st.button("Executar Análise de Rechamadas"):
         with st.spinner("Processando análise de rechamadas..."):
-            # 1. Identificar rechamadas
-            rechamadas_detalhe = identificar_faixas_rechamada(df)
-            st.session_state.rechamadas_detalhe = rechamadas_detalhe # Armazena para outras abas
-
-            # 2. Faixas de ligações e reincidentes
-            faixas_ligacoes, total_telefones_reincidentes, contagem_por_telefone = faixas_ligacoes_e_reincidentes(df)
-
-            # 3. Clientes frequentes (mais de 1 ligação)
-            clientes_frequentes_todos = contagem_por_telefone[contagem_por_telefone > 1].reset_index()
-            clientes_frequentes_todos.columns = ['telefone', 'total_ligacoes']
-
-            # 4. Impacto financeiro
-            impacto_financeiro = calcular_impacto_financeiro(rechamadas_detalhe, valor_ligacao)
-
-            # 5. Ligações por dia da semana
-            df['dia_semana'] = df['datetime'].dt.dayofweek
-            dias_semana_pt = {
-                0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira',
-                3: 'Quinta-feira', 4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'
-            }
-            df['dia_semana_nome'] = df['dia_semana'].map(dias_semana_pt)
-            ligacoes_por_dia = df['dia_semana_nome'].value_counts().reindex(dias_semana_pt.values(), fill_value=0)
-
-            # 6. Horários de pico
-            df['hora'] = df['datetime'].dt.hour
-            horarios_pico = df['hora'].value_counts().sort_index()
-
-            # 7. Consolidar resultados para exibição e download
-            consolidado_results = {
-                'total_ligacoes': len(df),
-                'periodo_analise': f"{df['datetime'].min():%d/%m/%Y} a {df['datetime'].max():%d/%m/%Y}",
-                'total_telefones_unicos': df['telefone'].nunique(),
-                'total_rechamadas_identificadas': sum(len(v) for k, v in rechamadas_detalhe.items()),
-                'impacto_financeiro_rechamadas': impacto_financeiro,
-                'ligacoes_por_dia': ligacoes_por_dia,
-                'horarios_pico': horarios_pico,
-                'faixas_ligacoes': faixas_ligacoes,
-                'total_telefones_reincidentes': total_telefones_reincidentes,
-                'contagem_por_telefone': contagem_por_telefone,
-                'clientes_frequentes_todos': clientes_frequentes_todos
-            }
-            st.session_state.rechamadas_result = consolidado_results
+            pipeline.obter('indicadores_rechamadas', st.session_state, valor_ligacao=valor_ligacao)
             st.success("✅ Análise de rechamadas concluída!")
 
-    # Exibir resultados se a análise já foi executada
-    if st.session_state.get('rechamadas_result') is not None:
-        consolidado = st.session_state.rechamadas_result
-        rechamadas_detalhe = st.session_state.rechamadas_detalhe
+    # Exibir resultados se a análise já foi executada com os dados e parâmetros atuais
+    consolidado = pipeline.atual('indicadores_rechamadas', st.session_state, valor_ligacao=valor_ligacao)
+    if consolidado is not None:
+        rechamadas_detalhe = pipeline.obter('rechamadas', st.session_state)
         contagem_por_telefone = consolidado['contagem_por_telefone']
 
         st.subheader("Resumo da Análise")
@@ -161,53 +122,23 @@ def show():
         # 5. Top 10 Clientes que Mais Ligaram
         st.write("#### Top 10 Clientes que Mais Ligaram")
         if not consolidado['clientes_frequentes_todos'].empty:
-            st.dataframe(consolidado['clientes_frequentes_todos'].nlargest(10, 'total_ligacoes'))
+            top_clientes = consolidado['clientes_frequentes_todos'].nlargest(10, 'total_ligacoes')
+            top_clientes['telefone'] = formatar_telefone(top_clientes['telefone'])
+            st.dataframe(top_clientes)
         else:
             st.info("Nenhum cliente frequente encontrado.")
 
         # Download dos resultados
         st.subheader("Download dos Resultados")
 
-        # Preparar buffer para Excel
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            # Rechamadas por Período (Detalhe)
-            if rechamadas_detalhe:
-                all_rechamadas_flat = []
-                for periodo, items in rechamadas_detalhe.items():
-                    for item in items:
-                        item_copy = item.copy()
-                        item_copy['periodo_rechamada'] = periodo
-                        all_rechamadas_flat.append(item_copy)
-                if all_rechamadas_flat:
-                    df_rechamadas_detalhe_excel = pd.DataFrame(all_rechamadas_flat)
-                    df_rechamadas_detalhe_excel.to_excel(writer, sheet_name='Detalhe_Rechamadas', index=False)
-                else:
-                    pd.DataFrame([{"Mensagem": "Nenhum detalhe de rechamada disponível."}]).to_excel(writer, sheet_name='Detalhe_Rechamadas', index=False)
-            else:
-                pd.DataFrame([{"Mensagem": "Nenhum detalhe de rechamada disponível."}]).to_excel(writer, sheet_name='Detalhe_Rechamadas', index=False)
-
-            # Faixas de Ligações
-            if consolidado['faixas_ligacoes']:
-                faixas_df = pd.DataFrame(list(consolidado['faixas_ligacoes'].items()), columns=['Faixa', 'Quantidade'])
-                faixas_df.to_excel(writer, sheet_name='Faixas_Ligacoes', index=False)
-            else:
-                pd.DataFrame([{"Mensagem": "Nenhuma faixa de ligação identificada."}]).to_excel(writer, sheet_name='Faixas_Ligacoes', index=False)
-
-            # Clientes Frequentes
-            if not consolidado['clientes_frequentes_todos'].empty:
-                clientes_freq_excel = consolidado['clientes_frequentes_todos']
-                clientes_freq_excel.to_excel(writer, sheet_name='Clientes_Frequentes', index=False)
-            else:
-                pd.DataFrame([{"Mensagem": "Nenhum cliente frequente identificado."}]).to_excel(writer, sheet_name='Clientes_Frequentes', index=False)
-
-        buffer.seek(0)
-
+        # A planilha só é montada quando o botão é clicado
         st.download_button(
             label="📥 Baixar Resultados em Excel",
-            data=buffer,
+            data=lambda: excel_rechamadas(rechamadas_detalhe, consolidado).getvalue(),
             file_name=f"analise_rechamadas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+    elif pipeline.calculada('indicadores_rechamadas'):
+        st.info("🔄 Os dados ou o valor por ligação mudaram desde a última análise. Execute a análise novamente.")
     else:
         st.info("Aguardando a execução da análise de rechamadas para exibir os resultados.")
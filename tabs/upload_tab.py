@@ -1,8 +1,119 @@
 import streamlit as st
-from utils.data_loader import load_file_chamadas, load_file_target, convert_duration_to_seconds
+import hashlib
+from utils.data_loader import (
+    load_file_chamadas,
+    load_file_target_motivos,
+    load_file_agentes,
+    usar_streaming,
+    decodificar_ids,
+    MEMORIA_STREAMING_MB,
+)
+from utils.cache import carregar_com_cache, listar_cache, limpar_cache
+from utils.analises import colunas_id_target
+from tabs.periodo import aplicar_periodo
 import pandas as pd
 
 
+def _identificar_upload(uploaded_file):
+    """Identidade do upload: file_id + tamanho do uploader ou, sem file_id, o hash do conteúdo."""
+    file_id = getattr(uploaded_file, 'file_id', None)
+    if file_id:
+        return (file_id, uploaded_file.size)
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+
+def _carregar_upload(uploaded_file, tipo, carregar, tipo_cache=None):
+    """
+    Processa cada arquivo enviado uma única vez por sessão. Nos reruns do Streamlit
+    (qualquer interação em qualquer aba) devolve o (df, erro) já guardado para o mesmo upload.
+    tipo_cache distingue modos de leitura que geram DataFrames diferentes (padrão: tipo).
+    """
+    tipo_cache = tipo_cache or tipo
+    registro = st.session_state.setdefault('uploads_processados', {})
+    identidade = (tipo_cache, _identificar_upload(uploaded_file))
+
+    anterior = registro.get(tipo)
+    if anterior is not None and anterior['identidade'] == identidade:
+        return anterior['df'], anterior['erro']
+
+    df, erro = carregar_com_cache(uploaded_file, tipo_cache, carregar)
+    registro[tipo] = {'identidade': identidade, 'df': df, 'erro': erro}
+    return df, erro
+
+
+def _definir_chamadas(df_chamadas):
+    """
+    Guarda o arquivo de chamadas inteiro; as páginas usam o recorte do período da barra
+    lateral (tabs/periodo.py), que volta ao arquivo inteiro quando ele muda.
+    """
+    if st.session_state.get('df_chamadas_completo') is df_chamadas:
+        return
+    st.session_state.df_chamadas_completo = df_chamadas
+    aplicar_periodo()
+
+
+def _progresso_abas(rotulo):
+    """Callback de progresso por aba do Excel, exibido em uma barra criada na primeira aba lida."""
+    barra = None
+
+    def atualizar(concluidas, total, aba):
+        nonlocal barra
+        if barra is None:
+            barra = st.progress(0.0)
+        barra.progress(concluidas / total, text=f"{rotulo}: aba '{aba}' lida ({concluidas}/{total})")
+
+    return atualizar
+
+
+def _mostrar_dialeto(df):
+    """Exibe encoding e separador detectados quando o arquivo é CSV."""
+    dialeto = df.attrs.get('dialeto_csv')
+    if dialeto:
+        separador = 'TAB' if dialeto['separador'] == '\t' else dialeto['separador']
+        st.caption(f"📄 CSV lido com encoding `{dialeto['encoding']}` e separador `{separador}`")
+    if df.attrs.get('cache'):
+        st.caption("⚡ Carregado do cache local (arquivo já processado antes)")
+
+
+def _mostrar_cache():
+    """Lista os datasets do cache local e permite removê-los."""
+    with st.expander("🗄️ Cache local de arquivos processados"):
+        pipeline = st.session_state.get('pipeline')
+        if pipeline is not None:
+            quantidade, memoria = pipeline.uso_memoria()
+            col_memo, col_liberar = st.columns([3, 1])
+            with col_memo:
+                st.caption(
+                    f"🧠 Resultados de análises guardados nesta sessão: {quantidade} "
+                    f"({memoria / (1024 * 1024):,.1f} MB de {pipeline.limite_bytes / (1024 * 1024):,.0f} MB)"
+                )
+            with col_liberar:
+                if st.button("Liberar resultados", disabled=not quantidade):
+                    pipeline.limpar()
+                    st.rerun()
+
+        df_cache = listar_cache()
+        if df_cache.empty:
+            st.info("Nenhum arquivo no cache.")
+            return
+
+        st.caption(f"{len(df_cache)} arquivo(s), {df_cache['tamanho_mb'].sum():.1f} MB")
+        st.dataframe(df_cache.drop(columns=['chave']), use_container_width=True)
+
+        opcoes = dict(zip(df_cache['arquivo'] + ' (' + df_cache['tipo'] + ')', df_cache['chave']))
+        selecionados = st.multiselect("Remover do cache", list(opcoes.keys()), key="cache_remover")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Remover selecionados", disabled=not selecionados):
+                for nome in selecionados:
+                    limpar_cache(opcoes[nome])
+                st.rerun()
+        with col2:
+            if st.button("Limpar todo o cache"):
+                limpar_cache()
+                st.rerun()
+
+
 def show():
     st.header("📁 Upload de Arquivos")
 
@@ -14,27 +125,60 @@ def show():
         key="chamadas_upload"
     )
 
+    with st.expander("⚙️ Leitura de arquivos grandes"):
+        forcar_streaming = st.checkbox(
+            "Ler o CSV de chamadas em blocos (streaming)",
+            value=False,
+            key="forcar_streaming",
+            help="Usado automaticamente em CSVs grandes. Mantém só as colunas padronizadas "
+                 "(datetime, telefone, duracao_segundos, ID_Conversa)."
+        )
+        memoria_mb = st.number_input(
+            "Memória máxima por bloco (MB)",
+            min_value=64,
+            max_value=8192,
+            value=MEMORIA_STREAMING_MB,
+            step=64,
+            key="memoria_streaming_mb"
+        )
+
     if uploaded_file_chamadas:
-        df_chamadas, error = load_file_chamadas(uploaded_file_chamadas)
+        streaming = forcar_streaming or usar_streaming(uploaded_file_chamadas)
+        df_chamadas, error = _carregar_upload(
+            uploaded_file_chamadas,
+            'chamadas',
+            lambda f: load_file_chamadas(
+                f, streaming=streaming, memoria_mb=memoria_mb, progresso=_progresso_abas("Chamadas")
+            ),
+            tipo_cache='chamadas_streaming' if streaming else 'chamadas'
+        )
         if error:
             st.error(f"Erro ao carregar arquivo de chamadas: {error}")
-            st.session_state.df_chamadas = None
+            _definir_chamadas(None)
         else:
             if not df_chamadas.empty and 'datetime' in df_chamadas.columns and not df_chamadas['datetime'].isna().all():
-                st.session_state.df_chamadas = df_chamadas
+                _definir_chamadas(df_chamadas)
                 st.success(
                     f"✅ Arquivo de chamadas carregado com sucesso! "
                     f"Total de registros: {len(df_chamadas):,}"
                 )
+                _mostrar_dialeto(df_chamadas)
+                memoria = df_chamadas.attrs.get('memoria')
+                if memoria:
+                    st.caption(
+                        f"🗜️ Memória: {memoria['antes_mb']:,.1f} MB → {memoria['depois_mb']:,.1f} MB "
+                        f"(colunas removidas: {', '.join(memoria['colunas_removidas']) or 'nenhuma'}; "
+                        f"categóricas: {', '.join(memoria['colunas_categoricas']) or 'nenhuma'})"
+                    )
                 st.write(f"Colunas detectadas: {list(df_chamadas.columns)}")
                 st.write("Primeiras 5 linhas do arquivo de chamadas:")
-                st.dataframe(df_chamadas.head())
+                st.dataframe(decodificar_ids(df_chamadas.head()))
             else:
                 st.error(
                     "❌ O arquivo de chamadas carregado está vazio ou não contém datas válidas após o processamento. "
                     "Verifique o conteúdo do arquivo."
                 )
-                st.session_state.df_chamadas = None
+                _definir_chamadas(None)
 
     # --- ARQUIVO TARGET ---
     st.subheader("Arquivo Target (para Motivos de Rechamadas)")
@@ -45,22 +189,44 @@ def show():
     )
 
     if uploaded_file_target:
-        df_target, error = load_file_target(uploaded_file_target)
+        df_target, error = _carregar_upload(
+            uploaded_file_target,
+            'target',
+            lambda f: load_file_target_motivos(f, progresso=_progresso_abas("Target"))
+        )
         if error:
             st.error(f"Erro ao carregar arquivo target: {error}")
             st.session_state.df_target = None
         else:
-            st.session_state.df_target = df_target
+            # O mesmo upload mantém o target da sessão, que pode ter ganho colunas lidas sob
+            # demanda nas abas de motivos e consulta (carregar_colunas_target)
+            anterior = st.session_state.get('df_target')
+            impressao = df_target.attrs.get('impressao')
+            if impressao is None or anterior is None or anterior.attrs.get('impressao') != impressao:
+                st.session_state.df_target = df_target
+            df_target = st.session_state.df_target
+            # Arquivo original para ler sob demanda as colunas escolhidas na aba de motivos
+            st.session_state.target_arquivo = uploaded_file_target
+            # O índice por ID do target é montado já no upload (coluna de ID Genesys padrão);
+            # motivos e consulta cruzam as ligações com ele sem voltar ao texto dos IDs
+            with st.spinner("Indexando os IDs do target..."):
+                st.session_state.pipeline.obter(
+                    'indice_target', st.session_state, id_coluna_target=colunas_id_target(df_target.columns)[0]
+                )
             st.success(
                 f"✅ Arquivo target carregado com sucesso! "
                 f"Total de registros: {len(df_target):,}"
             )
-            st.write(f"Colunas detectadas: {list(df_target.columns)}")
+            _mostrar_dialeto(df_target)
+            st.write(f"Colunas detectadas: {df_target.attrs.get('colunas_arquivo', list(df_target.columns))}")
+            st.caption(
+                f"Colunas já lidas: {list(df_target.columns)}. "
+                "As demais são lidas quando escolhidas na aba de motivos."
+            )
             st.write("Primeiras 5 linhas do arquivo target:")
-            st.dataframe(df_target.head())
+            st.dataframe(decodificar_ids(df_target.head()))
 
     # --- ARQUIVOS DE DESEMPENHO ---
-# ... código existente de upload de chamadas e target ...
 
     # --- NOVO: ARQUIVO DE NOTA ---
     st.subheader("📊 Arquivo de Nota (Zendesk)")
@@ -73,37 +239,19 @@ def show():
 
     if uploaded_file_nota:
         with st.spinner("Carregando arquivo de Nota..."):
-            df_nota, error = load_file_target(uploaded_file_nota)
+            df_nota, error = _carregar_upload(
+                uploaded_file_nota, 'nota', lambda f: load_file_agentes(f, 'nota')
+            )
 
             if error:
                 st.error(f"❌ Erro ao carregar arquivo de Nota: {error}")
             else:
-                # Verifica colunas necessárias
-                colunas_necessarias = ['Nome do atribuído', 'Notas Atendente', 'CSAT']
-                colunas_faltando = [col for col in colunas_necessarias if col not in df_nota.columns]
-
-                if colunas_faltando:
-                    st.error(f"❌ Colunas faltando: {', '.join(colunas_faltando)}")
-                    st.info(f"Colunas encontradas: {', '.join(df_nota.columns)}")
-                else:
-                    # Padroniza nomes
-                    df_nota = df_nota.rename(columns={
-                        'Nome do atribuído': 'Nome_Agente',
-                        'Notas Atendente': 'Notas_Atendente',
-                        'CSAT': 'CSAT'
-                    })
-
-                    # Limpa dados
-                    df_nota = df_nota[df_nota['Nome_Agente'].notna() & (df_nota['Nome_Agente'] != '')]
-                    df_nota['Nome_Agente'] = df_nota['Nome_Agente'].astype(str).str.strip().str.lower()
-                    df_nota['Notas_Atendente'] = pd.to_numeric(df_nota['Notas_Atendente'], errors='coerce').fillna(0)
-                    df_nota['CSAT'] = pd.to_numeric(df_nota['CSAT'], errors='coerce').fillna(0)
-
-                    st.session_state.df_nota = df_nota
-                    st.success(f"✅ Arquivo de Nota carregado! {len(df_nota)} agentes.")
-
-                    with st.expander("👁️ Preview"):
-                        st.dataframe(df_nota.head(10))
+                st.session_state.df_nota = df_nota
+                st.success(f"✅ Arquivo de Nota carregado! {len(df_nota)} agentes.")
+                _mostrar_dialeto(df_nota)
+
+                with st.expander("👁️ Preview"):
+                    st.dataframe(df_nota.head(10))
 
     # --- NOVO: ARQUIVO DE DESEMPENHO ---
     st.subheader("📈 Arquivo de Desempenho (Genesys)")
@@ -116,41 +264,19 @@ def show():
 
     if uploaded_file_perf:
         with st.spinner("Carregando arquivo de Desempenho..."):
-            df_perf, error = load_file_target(uploaded_file_perf)
+            df_perf, error = _carregar_upload(
+                uploaded_file_perf, 'desempenho', lambda f: load_file_agentes(f, 'desempenho')
+            )
 
             if error:
                 st.error(f"❌ Erro: {error}")
             else:
-                colunas_necessarias = ['Nome do agente', 'Atendidas', 'Conversação média', 'Transferidas', 'Conversa máx.']
-                colunas_faltando = [col for col in colunas_necessarias if col not in df_perf.columns]
-
-                if colunas_faltando:
-                    st.error(f"❌ Colunas faltando: {', '.join(colunas_faltando)}")
-                    st.info(f"Colunas encontradas: {', '.join(df_perf.columns)}")
-                else:
-                    df_perf = df_perf.rename(columns={
-                        'Nome do agente': 'Nome_Agente',
-                        'Atendidas': 'Atendidas',
-                        'Conversação média': 'Conversacao_Media',
-                        'Transferidas': 'Transferidas',
-                        'Conversa máx.': 'Conversa_Max'
-                    })
-
-                    df_perf = df_perf[df_perf['Nome_Agente'].notna() & (df_perf['Nome_Agente'] != '')]
-                    df_perf['Nome_Agente'] = df_perf['Nome_Agente'].astype(str).str.strip().str.lower()
+                st.session_state.df_desempenho = df_perf
+                st.success(f"✅ Arquivo de Desempenho carregado! {len(df_perf)} agentes.")
+                _mostrar_dialeto(df_perf)
 
-                    # Converte durações para segundos
-                    df_perf['TMA_Segundos'] = df_perf['Conversacao_Media'].apply(convert_duration_to_seconds)
-                    df_perf['Conversa_Max_Segundos'] = df_perf['Conversa_Max'].apply(convert_duration_to_seconds)
-
-                    df_perf['Atendidas'] = pd.to_numeric(df_perf['Atendidas'], errors='coerce').fillna(0).astype(int)
-                    df_perf['Transferidas'] = pd.to_numeric(df_perf['Transferidas'], errors='coerce').fillna(0).astype(int)
-
-                    st.session_state.df_desempenho = df_perf
-                    st.success(f"✅ Arquivo de Desempenho carregado! {len(df_perf)} agentes.")
-
-                    with st.expander("👁️ Preview"):
-                        st.dataframe(df_perf.head(10))
+                with st.expander("👁️ Preview"):
+                    st.dataframe(df_perf.head(10))
 
     # --- ARQUIVO DE ATENDIMENTOS DETALHADOS ---
     st.subheader("📋 Arquivo de Atendimentos Detalhados")
@@ -163,100 +289,51 @@ def show():
 
     if uploaded_file_atendimentos:
         with st.spinner("Carregando arquivo de Atendimentos..."):
-            df_atend, error = load_file_target(uploaded_file_atendimentos)
+            df_atend, error = _carregar_upload(
+                uploaded_file_atendimentos, 'atendimentos', lambda f: load_file_agentes(f, 'atendimentos')
+            )
 
             if error:
                 st.error(f"❌ Erro: {error}")
             else:
-                # --- NORMALIZAÇÃO DE NOMES DE COLUNA (resolve hífen/traço) ---
-                def normalizar_nome_col(col):
-                    col = str(col)
-                    # troca EN DASH (–) e EM DASH (—) por hífen normal (-)
-                    col = col.replace('–', '-').replace('—', '-')
-                    # remove espaços duplicados
-                    col = ' '.join(col.split())
-                    return col.strip()
-
-                df_atend.rename(columns=lambda c: normalizar_nome_col(c), inplace=True)
-
-                # Agora os nomes normalizados:
-                # 'Usuários – Interagiram' -> 'Usuários - Interagiram'
-                colunas_necessarias = ['Duração', 'Usuários - Interagiram', 'Tipo de desconexão']
-                colunas_faltando = [c for c in colunas_necessarias if c not in df_atend.columns]
-
-                if colunas_faltando:
-                    st.error(f"❌ Colunas faltando: {', '.join(colunas_faltando)}")
-                    st.info(f"Colunas encontradas (normalizadas): {', '.join(df_atend.columns)}")
-                else:
-                    # Renomeia para padrão interno
-                    df_atend = df_atend.rename(columns={
-                        'Usuários - Interagiram': 'Nome_Agente',
-                        'Duração': 'Duracao',
-                        'Tipo de desconexão': 'Tipo_Desconexao'
-                    })
-
-                    # 1. NORMALIZA NOME DO AGENTE
-                    df_atend['Nome_Agente'] = (
-                        df_atend['Nome_Agente']
-                        .astype(str)
-                        .str.strip()
-                        .str.lower()
+                # Estatísticas rápidas
+                total_registros = len(df_atend)
+                total_agentes = df_atend['Nome_Agente'].nunique()
+                total_desconexoes_agente = df_atend['desconexao_agente'].sum()
+                duracao_media = df_atend['duracao_segundos'].mean()
+
+                st.session_state.df_atendimentos = df_atend
+                st.success("✅ Atendimentos carregados e processados com sucesso!")
+                _mostrar_dialeto(df_atend)
+
+                col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+                with col_m1:
+                    st.metric("Total de Atendimentos", f"{total_registros:,}")
+                with col_m2:
+                    st.metric("Agentes Únicos", f"{total_agentes}")
+                with col_m3:
+                    st.metric("Desconexões (Agente)", f"{total_desconexoes_agente:,}")
+                with col_m4:
+                    st.metric("Duração Média", f"{duracao_media/60:.1f} min")
+
+                with st.expander("👁️ Preview dos Dados Processados"):
+                    st.dataframe(
+                        df_atend[[
+                            'Nome_Agente',
+                            'Duracao',
+                            'duracao_segundos',
+                            'Tipo_Desconexao',
+                            'desconexao_agente'
+                        ]].head(10),
+                        use_container_width=True
                     )
 
-                    df_atend = df_atend[
-                        df_atend['Nome_Agente'].notna() &
-                        (df_atend['Nome_Agente'] != '') &
-                        (df_atend['Nome_Agente'] != 'nan')
-                    ]
-
-                    # 2. CONVERTE DURAÇÃO PARA SEGUNDOS
-                    df_atend['duracao_segundos'] = df_atend['Duracao'].apply(convert_duration_to_seconds)
-
-                    # 3. TIPO DE DESCONEXÃO → marcar AGENTE
-                    df_atend['Tipo_Desconexao'] = (
-                        df_atend['Tipo_Desconexao']
-                        .astype(str)
-                        .str.strip()
-                        .str.lower()
+                    st.write("**Distribuição de Tipos de Desconexão:**")
+                    dist_desconexao = df_atend['Tipo_Desconexao'].value_counts()
+                    st.dataframe(
+                        dist_desconexao
+                        .reset_index()
+                        .rename(columns={'index': 'Tipo', 'Tipo_Desconexao': 'Quantidade'})
                     )
-                    df_atend['desconexao_agente'] = df_atend['Tipo_Desconexao'] == 'agente'
-
-                    # Estatísticas rápidas
-                    total_registros = len(df_atend)
-                    total_agentes = df_atend['Nome_Agente'].nunique()
-                    total_desconexoes_agente = df_atend['desconexao_agente'].sum()
-                    duracao_media = df_atend['duracao_segundos'].mean()
-
-                    st.session_state.df_atendimentos = df_atend
-                    st.success("✅ Atendimentos carregados e processados com sucesso!")
-
-                    col_m1, col_m2, col_m3, col_m4 = st.columns(4)
-                    with col_m1:
-                        st.metric("Total de Atendimentos", f"{total_registros:,}")
-                    with col_m2:
-                        st.metric("Agentes Únicos", f"{total_agentes}")
-                    with col_m3:
-                        st.metric("Desconexões (Agente)", f"{total_desconexoes_agente:,}")
-                    with col_m4:
-                        st.metric("Duração Média", f"{duracao_media/60:.1f} min")
-
-                    with st.expander("👁️ Preview dos Dados Processados"):
-                        st.dataframe(
-                            df_atend[[
-                                'Nome_Agente',
-                                'Duracao',
-                                'duracao_segundos',
-                                'Tipo_Desconexao',
-                                'desconexao_agente'
-                            ]].head(10),
-                            use_container_width=True
-                        )
-
-                        st.write("**Distribuição de Tipos de Desconexão:**")
-                        dist_desconexao = df_atend['Tipo_Desconexao'].value_counts()
-                        st.dataframe(
-                            dist_desconexao
-                            .reset_index()
-                            .rename(columns={'index': 'Tipo', 'Tipo_Desconexao': 'Quantidade'})
-                        )
 
+    _mostrar_cache()
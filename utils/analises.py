@@ -0,0 +1,731 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import (
+    indexar_telefones,
+    indexar_target,
+    indexar_ids_chamadas,
+    indexar_assuntos,
+    DetalheAssuntos,
+    tomar,
+    decodificar_ids,
+    faixas_ligacoes_e_reincidentes,
+    calcular_impacto_financeiro,
+    analisar_motivos_rechamadas,
+    formatar_telefone,
+    chaves_telefone,
+)
+from utils.visualization import plot_bar_chart, figura_png
+
+# --- ANÁLISES DAS ABAS, SEM INTERFACE ---
+# Cada aba coleta os parâmetros na tela e chama estas funções; o cli.py chama as mesmas
+# funções com os parâmetros da linha de comando.
+
+DIAS_SEMANA_PT = {
+    0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira',
+    3: 'Quinta-feira', 4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'
+}
+
+
+# --- RECHAMADAS ---
+
+def consolidar_rechamadas(df, rechamadas_detalhe, indice_telefones=None, valor_ligacao=7.56):
+    """
+    Indicadores da aba de rechamadas a partir das rechamadas já identificadas.
+    indice_telefones: IndiceTelefones de df (construído aqui se não for informado).
+    """
+    if indice_telefones is None:
+        indice_telefones = indexar_telefones(df)
+
+    # Faixas de ligações e reincidentes
+    faixas_ligacoes, total_telefones_reincidentes, contagem_por_telefone = faixas_ligacoes_e_reincidentes(
+        df, indice_telefones
+    )
+
+    # Clientes frequentes (mais de 1 ligação)
+    clientes_frequentes_todos = contagem_por_telefone[contagem_por_telefone > 1].reset_index()
+    clientes_frequentes_todos.columns = ['telefone', 'total_ligacoes']
+
+    # Impacto financeiro
+    impacto_financeiro = calcular_impacto_financeiro(rechamadas_detalhe, valor_ligacao)
+
+    # Ligações por dia da semana
+    dia_semana_nome = df['datetime'].dt.dayofweek.map(DIAS_SEMANA_PT)
+    ligacoes_por_dia = dia_semana_nome.value_counts().reindex(DIAS_SEMANA_PT.values(), fill_value=0)
+
+    # Horários de pico
+    horarios_pico = df['datetime'].dt.hour.value_counts().sort_index()
+
+    return {
+        'total_ligacoes': len(df),
+        'periodo_analise': f"{df['datetime'].min():%d/%m/%Y} a {df['datetime'].max():%d/%m/%Y}",
+        'total_telefones_unicos': len(indice_telefones),
+        'total_rechamadas_identificadas': len(rechamadas_detalhe),
+        'impacto_financeiro_rechamadas': impacto_financeiro,
+        'ligacoes_por_dia': ligacoes_por_dia,
+        'horarios_pico': horarios_pico,
+        'faixas_ligacoes': faixas_ligacoes,
+        'total_telefones_reincidentes': total_telefones_reincidentes,
+        'contagem_por_telefone': contagem_por_telefone,
+        'clientes_frequentes_todos': clientes_frequentes_todos
+    }
+
+
+def excel_rechamadas(rechamadas_detalhe, consolidado):
+    """Planilha de resultados da aba de rechamadas (detalhe, faixas e clientes frequentes)."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        # Rechamadas por Período (Detalhe)
+        if rechamadas_detalhe is not None and len(rechamadas_detalhe) > 0:
+            df_rechamadas_detalhe_excel = decodificar_ids(rechamadas_detalhe.para_dataframe())
+            df_rechamadas_detalhe_excel['telefone'] = formatar_telefone(df_rechamadas_detalhe_excel['telefone'])
+            df_rechamadas_detalhe_excel.to_excel(writer, sheet_name='Detalhe_Rechamadas', index=False)
+        else:
+            pd.DataFrame([{"Mensagem": "Nenhum detalhe de rechamada disponível."}]).to_excel(writer, sheet_name='Detalhe_Rechamadas', index=False)
+
+        # Faixas de Ligações
+        if consolidado['faixas_ligacoes']:
+            faixas_df = pd.DataFrame(list(consolidado['faixas_ligacoes'].items()), columns=['Faixa', 'Quantidade'])
+            faixas_df.to_excel(writer, sheet_name='Faixas_Ligacoes', index=False)
+        else:
+            pd.DataFrame([{"Mensagem": "Nenhuma faixa de ligação identificada."}]).to_excel(writer, sheet_name='Faixas_Ligacoes', index=False)
+
+        # Clientes Frequentes
+        if not consolidado['clientes_frequentes_todos'].empty:
+            clientes_freq_excel = consolidado['clientes_frequentes_todos'].assign(
+                telefone=lambda d: formatar_telefone(d['telefone'])
+            )
+            clientes_freq_excel.to_excel(writer, sheet_name='Clientes_Frequentes', index=False)
+        else:
+            pd.DataFrame([{"Mensagem": "Nenhum cliente frequente identificado."}]).to_excel(writer, sheet_name='Clientes_Frequentes', index=False)
+
+    buffer.seek(0)
+    return buffer
+
+
+# --- MOTIVOS ---
+
+def colunas_id_target(colunas):
+    """Colunas candidatas a ID no target: as de ID Genesys primeiro, depois as com "id" no nome."""
+    opcoes = []
+    for c in colunas:
+        if 'id' in c.lower() and 'genesys' in c.lower():
+            opcoes.insert(0, c)
+    if not opcoes:
+        for c in colunas:
+            if 'id' in c.lower():
+                opcoes.append(c)
+    if not opcoes:
+        opcoes = list(colunas)
+    return opcoes
+
+
+def _telefones_formatados(telefones, posicoes):
+    """Telefone formatado das linhas em posicoes, nulo onde a posição é -1."""
+    encontradas = posicoes >= 0
+    texto = np.full(len(posicoes), np.nan, dtype=object)
+    texto[encontradas] = formatar_telefone(telefones.take(posicoes[encontradas])).to_numpy()
+    return texto
+
+
+def cruzar_motivos(df_chamadas, rechamadas_detalhe, df_target, indice_target, ids_chamadas,
+                   id_coluna_target, coluna_assunto):
+    """
+    Cruza os pares de rechamada (pelo ID_Conversa das chamadas) com o assunto do target e acrescenta duração e telefone
+    (formatado) da primeira ligação e da rechamada. Retorna (df_final_motivos, erro);
+    sem erro, o DataFrame pode vir vazio (nenhum motivo encontrado).
+    indice_target / ids_chamadas: IndiceIds do target (coluna id_coluna_target) e do
+    ID_Conversa de df_chamadas, ou None para construir aqui.
+    """
+    if ids_chamadas is None:
+        ids_chamadas = indexar_ids_chamadas(df_chamadas)
+
+    # Usa analisar_motivos_rechamadas para montar base de rechamadas + motivos
+    df_final_motivos, erro = analisar_motivos_rechamadas(
+        df_chamadas,
+        rechamadas_detalhe,
+        df_target,
+        id_coluna_target,
+        [coluna_assunto],
+        indice_target=indice_target,
+        ids_chamadas=ids_chamadas
+    )
+    if erro or df_final_motivos.empty:
+        return df_final_motivos, erro
+
+    # ENRIQUECE COM DURAÇÃO DAS CHAMADAS: as ligações com o mesmo ID de cada lado do par,
+    # localizadas pelo índice (como um merge how='left', inclusive com IDs repetidos)
+    duracoes = df_chamadas['duracao_segundos'].to_numpy()
+    telefones = df_chamadas['telefone'].array
+
+    for lado, coluna_id in (('primeira', 'ID_Conversa_Primeira'), ('segunda', 'ID_Conversa_Segunda')):
+        # Os IDs dos pares já são códigos do dicionário de ids_chamadas
+        grupos = ids_chamadas.grupos(df_final_motivos[coluna_id])
+        pos_par, pos_ligacao = ids_chamadas.linhas(grupos, manter_sem_par=True)
+        df_final_motivos = df_final_motivos.take(pos_par).reset_index(drop=True)
+        df_final_motivos[f'duracao_{lado}_segundos'] = tomar(duracoes, pos_ligacao)
+        df_final_motivos[f'telefone_{lado}'] = _telefones_formatados(telefones, pos_ligacao)
+
+    df_final_motivos['duracao_primeira_segundos'] = df_final_motivos['duracao_primeira_segundos'].fillna(0)
+    df_final_motivos['duracao_segunda_segundos'] = df_final_motivos['duracao_segunda_segundos'].fillna(0)
+    return df_final_motivos, None
+
+
+def resumir_assuntos(df_chamadas, rechamadas_detalhe, df_target, indice_telefones, indice_target, ids_chamadas,
+                     indice_assuntos, id_coluna_target, coluna_assunto):
+    """
+    Contagens e tempos por assunto em todas as ligações, nos clientes de uma ligação,
+    nas primeiras ligações dos reincidentes e nas rechamadas.
+    indice_telefones: IndiceTelefones de df_chamadas; indice_target / ids_chamadas:
+    IndiceIds do target (coluna id_coluna_target) e do ID_Conversa de df_chamadas;
+    indice_assuntos: IndiceAssuntos da coluna de assunto do target.
+    Os que vierem None são construídos aqui.
+    Retorna (resumo, detalhe), este um DetalheAssuntos com um assunto por linha de todas
+    as ligações (montado em DataFrame só na exportação).
+    """
+    if indice_telefones is None:
+        indice_telefones = indexar_telefones(df_chamadas)
+    if indice_target is None or indice_target.coluna != id_coluna_target:
+        indice_target = indexar_target(df_target, id_coluna_target)
+    if ids_chamadas is None:
+        ids_chamadas = indexar_ids_chamadas(df_chamadas)
+    if indice_assuntos is None or indice_assuntos.coluna != coluna_assunto:
+        indice_assuntos = indexar_assuntos(df_target, coluna_assunto)
+
+    # Precisamos dos assuntos para TODAS as ligações (não só pares de rechamada): o grupo do
+    # target de cada ligação sai da tradução entre os IDs distintos dos dois índices, e as
+    # linhas do target de cada uma pelo índice (como um merge how='left', inclusive com IDs
+    # repetidos no target)
+    grupo_target = indice_target.traduzir(ids_chamadas)[ids_chamadas.codigos]
+    pos_ligacao, pos_target = indice_target.linhas(grupo_target, manter_sem_par=True)
+    detalhe = DetalheAssuntos(
+        df_chamadas, indice_telefones, ids_chamadas, df_target[coluna_assunto], indice_assuntos,
+        pos_ligacao, pos_target
+    )
+
+    # Cada contagem é uma passada de bincount sobre o valor de assunto de cada ligação;
+    # as ligações fora do filtro ficam com -1 e não contam
+    valores = detalhe.valores
+    total_ligacoes_telefone = detalhe.total_ligacoes_telefone()
+    reincidente = total_ligacoes_telefone > 1
+    primeiras_reinc = reincidente & detalhe.primeira_ligacao()
+    duracoes = df_chamadas['duracao_segundos'].to_numpy(dtype=np.float64)
+
+    def somar(filtro, pesos=None):
+        return indice_assuntos.contar(np.where(filtro, valores, -1), pesos)
+
+    # 1) Todas as ligações; 2) clientes que ligaram apenas uma vez; 3) primeira ligação dos
+    # clientes que ligaram mais de uma vez; 5) todas as ligações dos reincidentes
+    contagens = {
+        'Qtd_Todas': indice_assuntos.contar(valores),
+        'Qtd_Clientes_1_Ligacao': somar(total_ligacoes_telefone == 1),
+        'Qtd_Primeiras_Reincidentes': somar(primeiras_reinc),
+    }
+
+    # Tempo por assunto na PRIMEIRA ligação (clientes reincidentes); a média ignora
+    # durações nulas, como o groupby
+    duracao_ligacao = duracoes[pos_ligacao]
+    com_duracao = ~np.isnan(duracao_ligacao)
+    tempo_prim = somar(primeiras_reinc & com_duracao, np.nan_to_num(duracao_ligacao))
+    qtd_tempo_prim = somar(primeiras_reinc & com_duracao)
+
+    # 4) Assuntos das rechamadas (segunda ligação nos pares): uma linha por telefone + ID da
+    # rechamada, cruzada com as ligações de mesmo ID e telefone e com as linhas do target delas
+    telefones = chaves_telefone(df_chamadas)
+    df_rech = pd.DataFrame({
+        'telefone': telefones[rechamadas_detalhe.pos_segunda],
+        'codigo': ids_chamadas.codigos[rechamadas_detalhe.pos_segunda],
+    }).drop_duplicates()
+
+    # A própria segunda ligação do par sempre é encontrada: toda linha de df_rech tem par
+    pos_rech, pos_mesmo_id = ids_chamadas.linhas(df_rech['codigo'].to_numpy())
+    mesmo_telefone = telefones[pos_mesmo_id] == df_rech['telefone'].to_numpy()[pos_rech]
+    pos_mesmo_id = pos_mesmo_id[mesmo_telefone]
+    pos_assunto, pos_target_rech = indice_target.linhas(grupo_target[pos_mesmo_id], manter_sem_par=True)
+    valores_rech = indice_assuntos.valores(pos_target_rech)
+    duracao_rech = duracoes[pos_mesmo_id[pos_assunto]]
+    rech_com_duracao = np.where(np.isnan(duracao_rech), -1, valores_rech)
+    contagens['Qtd_Rechamadas'] = indice_assuntos.contar(valores_rech)
+    tempo_rech = indice_assuntos.contar(rech_com_duracao, np.nan_to_num(duracao_rech))
+    qtd_tempo_rech = indice_assuntos.contar(rech_com_duracao)
+
+    contagens['Qtd_Total_Reincidentes'] = somar(reincidente)
+
+    # Consolida tudo em um único DataFrame, com os assuntos que aparecem em alguma contagem
+    with np.errstate(invalid='ignore', divide='ignore'):
+        resumo = pd.DataFrame({
+            **contagens,
+            'Tempo_Total_Prim_Seg': tempo_prim,
+            'TMA_Prim_Seg': tempo_prim / qtd_tempo_prim,
+            'Tempo_Total_Rech_Seg': tempo_rech,
+            'TMA_Rech_Seg': tempo_rech / qtd_tempo_rech,
+        }, index=indice_assuntos.assuntos)
+    resumo = resumo[np.any([contagem > 0 for contagem in contagens.values()], axis=0)]
+
+    resumo = resumo.fillna(0)
+
+    # Converte tempos para minutos para exibição
+    resumo['Tempo_Total_Prim_Min'] = (resumo['Tempo_Total_Prim_Seg'] / 60).round(1)
+    resumo['TMA_Prim_Min'] = (resumo['TMA_Prim_Seg'] / 60).round(1)
+    resumo['Tempo_Total_Rech_Min'] = (resumo['Tempo_Total_Rech_Seg'] / 60).round(1)
+    resumo['TMA_Rech_Min'] = (resumo['TMA_Rech_Seg'] / 60).round(1)
+
+    # Ordena por quantidade total
+    resumo = resumo.sort_values('Qtd_Todas', ascending=False).reset_index()
+
+    return resumo, detalhe
+
+
+def excel_motivos(resumo, detalhe_assuntos, df_final_motivos):
+    """Planilha de resultados da aba de motivos (resumo, detalhe por assunto e base de rechamadas)."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        resumo.to_excel(writer, sheet_name='Resumo_Assuntos', index=False)
+        decodificar_ids(detalhe_assuntos.para_dataframe()).to_excel(writer, sheet_name='Detalhe_Assuntos_Todas', index=False)
+        decodificar_ids(df_final_motivos).to_excel(writer, sheet_name='Rechamadas_Base', index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def montar_painel_motivos(resultado_motivos, resumo_assuntos, id_coluna_target=None, coluna_assunto=None):
+    """
+    Parte de exibição da aba de motivos, calculada uma vez por resultado: a base de
+    rechamadas com os IDs decodificados, as métricas gerais e os gráficos Top 15 em PNG.
+    resultado_motivos / resumo_assuntos: retornos de cruzar_motivos e resumir_assuntos.
+    id_coluna_target / coluna_assunto: configuração do cruzamento; não mudam o painel,
+    mas no pipeline identificam os resultados de entrada.
+    """
+    df_final_motivos, _ = resultado_motivos
+    resumo, _ = resumo_assuntos
+
+    def grafico(dados, x, titulo, cor):
+        fig, _ = plot_bar_chart(
+            data=dados, x=x, y='Assunto', title=titulo, color=cor, figsize=(10, 8), is_horizontal=True
+        )
+        return figura_png(fig)
+
+    top = resumo.head(15)
+    top_tma = resumo.sort_values('TMA_Rech_Min', ascending=False).head(15)
+    return {
+        'total_rechamadas': len(df_final_motivos),
+        # Telefones que geraram rechamadas
+        'total_primeiros_contatos': df_final_motivos['ID_Conversa_Primeira'].nunique(),
+        'base': decodificar_ids(df_final_motivos),
+        'grafico_todas': grafico(top, 'Qtd_Todas', 'Top 15 Assuntos - Todas as Ligações', 'steelblue'),
+        'grafico_rechamadas': grafico(top, 'Qtd_Rechamadas', 'Top 15 Assuntos - Rechamadas', 'darkorange'),
+        'grafico_tma': grafico(top_tma, 'TMA_Rech_Min', 'Top 15 Assuntos - TMA em Rechamadas (min)', 'purple'),
+    }
+
+
+# --- AGENTES ---
+
+def consolidar_agentes(df_nota, df_perf):
+    """
+    Junta nota e desempenho por agente, exclui quem não tem atendimentos e calcula
+    TMA/Conversa Máx em minutos e o % de encaminhamento para pesquisa.
+    Retorna (df_consolidado, agentes_excluidos).
+    """
+    # Garantia extra: normaliza nomes novamente (case-insensitive)
+    df_nota = df_nota.assign(Nome_Agente=df_nota['Nome_Agente'].astype(str).str.strip().str.lower())
+    df_perf = df_perf.assign(Nome_Agente=df_perf['Nome_Agente'].astype(str).str.strip().str.lower())
+
+    # Merge usando Nome_Agente como chave (case-insensitive)
+    df_consolidado = pd.merge(
+        df_perf,
+        df_nota,
+        on='Nome_Agente',
+        how='outer'
+    )
+
+    # Preenche valores faltantes
+    df_consolidado = df_consolidado.fillna({
+        'Atendidas': 0,
+        'TMA_Segundos': 0,
+        'Transferidas': 0,
+        'Conversa_Max_Segundos': 0,
+        'Notas_Atendente': 0,
+        'CSAT': 0
+    })
+
+    # Exclusão de agentes sem atendimentos
+    antes_exclusao = len(df_consolidado)
+
+    # Converte para numérico e remove zeros/nulls
+    df_consolidado['Atendidas'] = pd.to_numeric(df_consolidado['Atendidas'], errors='coerce')
+    df_consolidado = df_consolidado[df_consolidado['Atendidas'] > 0]
+
+    agentes_excluidos = antes_exclusao - len(df_consolidado)
+
+    # Converte TMA e Conversa_Max de segundos para minutos
+    df_consolidado['TMA_Minutos'] = (df_consolidado['TMA_Segundos'] / 60).round(2)
+    df_consolidado['Conversa_Max_Minutos'] = (df_consolidado['Conversa_Max_Segundos'] / 60).round(2)
+
+    # Encaminhamento para pesquisa
+    df_consolidado['Transferidas'] = pd.to_numeric(
+        df_consolidado['Transferidas'],
+        errors='coerce'
+    ).fillna(0)
+    df_consolidado['Perc_Encaminhamento_Pesquisa'] = (
+        (df_consolidado['Transferidas'] / df_consolidado['Atendidas']) * 100
+    ).fillna(0).round(2)
+
+    # Garante que não ultrapasse 100%
+    df_consolidado['Perc_Encaminhamento_Pesquisa'] = df_consolidado['Perc_Encaminhamento_Pesquisa'].clip(upper=100)
+
+    # Ordena por CSAT (maior para menor)
+    df_consolidado = df_consolidado.sort_values('CSAT', ascending=False)
+    return df_consolidado, agentes_excluidos
+
+
+# --- RANKING DE AGENTES ---
+
+PESOS_PADRAO = {
+    "TMA": 0.20,
+    "CSAT": 0.30,
+    "Enc_Pesquisa": 0.15,
+    "Desconexoes": 0.20,
+    "Acima_TMax": 0.15,
+}
+
+
+def normalizar_metrica(serie, inverter=False):
+    """Normaliza métrica para escala 0-100. Se inverter=True, menor valor = melhor."""
+    if len(serie) == 0:
+        return pd.Series([], dtype=float)
+
+    if serie.max() == serie.min():
+        return pd.Series([50] * len(serie), index=serie.index)
+
+    if inverter:
+        # Menor valor = 100, maior valor = 0
+        normalized = 100 - ((serie - serie.min()) / (serie.max() - serie.min()) * 100)
+    else:
+        # Maior valor = 100, menor valor = 0
+        normalized = ((serie - serie.min()) / (serie.max() - serie.min()) * 100)
+
+    return normalized
+
+
+def normalizar_pesos(pesos):
+    """Pesos divididos pela soma (0 = indicador fora do ranking). Retorna None se todos forem zero."""
+    total_pesos = sum(pesos.values())
+    if total_pesos == 0:
+        return None
+    return {indicador: peso / total_pesos for indicador, peso in pesos.items()}
+
+
+def calcular_ranking(df_nota, df_perf, df_atend, t_min, t_max, pesos_normalizados):
+    """
+    Consolida nota, desempenho e atendimentos por agente e calcula os scores (0-100)
+    e o Score_Final ponderado. Indicadores com peso zero ficam com score 0.
+    Os DataFrames recebidos não são alterados.
+    """
+    # Normaliza nomes
+    df_nota, df_perf, df_atend = (
+        df.assign(
+            Nome_Agente=df["Nome_Agente"].astype(str).str.strip().str.lower()
+        )
+        for df in (df_nota, df_perf, df_atend)
+    )
+
+    # Merge base
+    df_ranking = pd.merge(df_perf, df_nota, on="Nome_Agente", how="outer")
+
+    # Métricas de atendimentos
+    if "desconexao_agente" not in df_atend.columns:
+        df_atend["desconexao_agente"] = False
+
+    metricas_atend = (
+        df_atend.groupby("Nome_Agente")
+        .agg(
+            total_atendimentos=("Nome_Agente", "count"),
+            acima_tmax=("duracao_segundos", lambda x: (x > t_max).sum()),
+            abaixo_tmin=("duracao_segundos", lambda x: (x < t_min).sum()),
+            desconexoes_agente=("desconexao_agente", "sum"),
+        )
+        .reset_index()
+    )
+
+    metricas_atend["perc_acima_tmax"] = (
+        metricas_atend["acima_tmax"]
+        / metricas_atend["total_atendimentos"]
+        * 100
+    ).fillna(0)
+    metricas_atend["perc_abaixo_tmin"] = (
+        metricas_atend["abaixo_tmin"]
+        / metricas_atend["total_atendimentos"]
+        * 100
+    ).fillna(0)
+    metricas_atend["perc_desconexoes"] = (
+        metricas_atend["desconexoes_agente"]
+        / metricas_atend["total_atendimentos"]
+        * 100
+    ).fillna(0)
+
+    df_ranking = pd.merge(
+        df_ranking, metricas_atend, on="Nome_Agente", how="left"
+    )
+
+    # Filtra agentes com atendidas
+    df_ranking["Atendidas"] = pd.to_numeric(
+        df_ranking["Atendidas"], errors="coerce"
+    ).fillna(0)
+    df_ranking = df_ranking[df_ranking["Atendidas"] > 0]
+    df_ranking = df_ranking.fillna(0)
+
+    # TMA e Conversa Máx em minutos
+    if "TMA_Segundos" in df_ranking.columns:
+        df_ranking["TMA_Minutos"] = (
+            df_ranking["TMA_Segundos"] / 60
+        ).round(2)
+    else:
+        df_ranking["TMA_Minutos"] = 0
+
+    if "Conversa_Max_Segundos" in df_ranking.columns:
+        df_ranking["Conversa_Max_Minutos"] = (
+            df_ranking["Conversa_Max_Segundos"] / 60
+        ).round(2)
+    else:
+        df_ranking["Conversa_Max_Minutos"] = 0
+
+    # % Encaminhamento para pesquisa
+    df_ranking["Transferidas"] = pd.to_numeric(
+        df_ranking.get("Transferidas", 0), errors="coerce"
+    ).fillna(0)
+    df_ranking["Perc_Encaminhamento_Pesquisa"] = (
+        df_ranking["Transferidas"] / df_ranking["Atendidas"] * 100
+    ).fillna(0).clip(upper=100).round(2)
+
+    # Scores normalizados
+    if pesos_normalizados["TMA"] > 0 and "TMA_Segundos" in df_ranking.columns:
+        df_ranking["TMA_Score"] = normalizar_metrica(
+            df_ranking["TMA_Segundos"], inverter=True
+        )
+    else:
+        df_ranking["TMA_Score"] = 0
+
+    if pesos_normalizados["CSAT"] > 0 and "CSAT" in df_ranking.columns:
+        df_ranking["CSAT_Score"] = normalizar_metrica(
+            df_ranking["CSAT"], inverter=False
+        )
+    else:
+        df_ranking["CSAT_Score"] = 0
+
+    if pesos_normalizados["Enc_Pesquisa"] > 0:
+        df_ranking["Enc_Pesquisa_Score"] = normalizar_metrica(
+            df_ranking["Perc_Encaminhamento_Pesquisa"], inverter=False
+        )
+    else:
+        df_ranking["Enc_Pesquisa_Score"] = 0
+
+    if pesos_normalizados["Desconexoes"] > 0:
+        df_ranking["Desconexoes_Score"] = normalizar_metrica(
+            df_ranking["perc_desconexoes"], inverter=True
+        )
+    else:
+        df_ranking["Desconexoes_Score"] = 0
+
+    if pesos_normalizados["Acima_TMax"] > 0:
+        df_ranking["AcimaTMax_Score"] = normalizar_metrica(
+            df_ranking["perc_acima_tmax"], inverter=True
+        )
+    else:
+        df_ranking["AcimaTMax_Score"] = 0
+
+    # Score final
+    df_ranking["Score_Final"] = (
+        df_ranking["TMA_Score"] * pesos_normalizados["TMA"]
+        + df_ranking["CSAT_Score"] * pesos_normalizados["CSAT"]
+        + df_ranking["Enc_Pesquisa_Score"] * pesos_normalizados["Enc_Pesquisa"]
+        + df_ranking["Desconexoes_Score"]
+        * pesos_normalizados["Desconexoes"]
+        + df_ranking["AcimaTMax_Score"]
+        * pesos_normalizados["Acima_TMax"]
+    )
+
+    df_ranking["Posicao"] = df_ranking["Score_Final"].rank(
+        ascending=False, method="min"
+    ).astype(int)
+    return df_ranking.sort_values("Posicao")
+
+
+def tabela_ranking(df_ranking):
+    """Ranking com as colunas principais, renomeadas e arredondadas para exibição."""
+    colunas_desejadas = [
+        "Posicao",
+        "Nome_Agente",
+        "Score_Final",
+        "Atendidas",
+        "TMA_Minutos",
+        "CSAT",
+        "Perc_Encaminhamento_Pesquisa",
+        "perc_desconexoes",
+        "perc_acima_tmax",
+        "perc_abaixo_tmin",
+    ]
+    colunas_disponiveis = [c for c in colunas_desejadas if c in df_ranking.columns]
+    df_display = df_ranking[colunas_disponiveis]
+
+    rename_map = {
+        "Posicao": "Rank",
+        "Nome_Agente": "Agente",
+        "Score_Final": "Score",
+        "Atendidas": "Atendidas",
+        "TMA_Minutos": "TMA (min)",
+        "CSAT": "CSAT",
+        "Perc_Encaminhamento_Pesquisa": "% Encaminhamentos Pesquisa",
+        "perc_desconexoes": "Desconex. (%)",
+        "perc_acima_tmax": "Acima TMax (%)",
+        "perc_abaixo_tmin": "Abaixo TMin (%)",
+    }
+    df_display = df_display.rename(
+        columns={k: v for k, v in rename_map.items() if k in df_display.columns}
+    )
+
+    if "Agente" in df_display.columns:
+        df_display["Agente"] = df_display["Agente"].str.title()
+    if "Score" in df_display.columns:
+        df_display["Score"] = df_display["Score"].round(1)
+    if "TMA (min)" in df_display.columns:
+        df_display["TMA (min)"] = df_display["TMA (min)"].round(1)
+    if "CSAT" in df_display.columns:
+        df_display["CSAT"] = df_display["CSAT"].round(2)
+    if "% Encaminhamentos Pesquisa" in df_display.columns:
+        df_display["% Encaminhamentos Pesquisa"] = df_display[
+            "% Encaminhamentos Pesquisa"
+        ].round(1)
+    if "Desconex. (%)" in df_display.columns:
+        df_display["Desconex. (%)"] = df_display["Desconex. (%)"].round(1)
+    if "Acima TMax (%)" in df_display.columns:
+        df_display["Acima TMax (%)"] = df_display["Acima TMax (%)"].round(1)
+    if "Abaixo TMin (%)" in df_display.columns:
+        df_display["Abaixo TMin (%)"] = df_display["Abaixo TMin (%)"].round(1)
+
+    return df_display
+
+
+def excel_ranking(df_ranking):
+    """Planilha do ranking (tabela exibida + scores detalhados por indicador)."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        tabela_ranking(df_ranking).to_excel(writer, sheet_name="Ranking", index=False)
+
+        colunas_scores_desejadas = [
+            "Nome_Agente",
+            "Posicao",
+            "Score_Final",
+            "TMA_Score",
+            "CSAT_Score",
+            "Enc_Pesquisa_Score",
+            "Desconexoes_Score",
+            "AcimaTMax_Score",
+        ]
+        colunas_scores_disponiveis = [
+            c for c in colunas_scores_desejadas if c in df_ranking.columns
+        ]
+        df_scores = df_ranking[colunas_scores_disponiveis].assign(
+            Nome_Agente=df_ranking["Nome_Agente"].str.title()
+        )
+        df_scores.to_excel(writer, sheet_name="Scores_Detalhados", index=False)
+
+    buffer.seek(0)
+    return buffer
+
+
+# --- MAILING ---
+
+def gerar_lista_mailing(df, rechamadas_detalhe=None, indice_telefones=None, min_ligacoes=None, periodos=None,
+                        duracao_minima_seg=None):
+    """
+    Lista de telefones (formatados) para mailing. Cada critério entra quando seu
+    parâmetro é informado: min_ligacoes (clientes que mais ligaram), periodos com
+    rechamadas_detalhe (clientes com rechamadas) e duracao_minima_seg (ligações longas).
+    indice_telefones: IndiceTelefones de df (construído aqui se não for informado).
+    Retorna um DataFrame vazio se nenhum cliente atender aos critérios.
+    """
+    if indice_telefones is None:
+        indice_telefones = indexar_telefones(df)
+
+    lista_mailing = pd.DataFrame()
+
+    # Clientes que mais ligaram
+    if min_ligacoes is not None:
+        contagem = indice_telefones.contagem()
+        clientes_frequentes_mailing = contagem[contagem >= min_ligacoes].reset_index()
+        clientes_frequentes_mailing.columns = ['telefone', 'total_ligacoes']
+        if not lista_mailing.empty:
+            lista_mailing = pd.merge(lista_mailing, clientes_frequentes_mailing, on='telefone', how='outer')
+        else:
+            lista_mailing = clientes_frequentes_mailing
+
+    # Clientes com rechamadas
+    if rechamadas_detalhe is not None and periodos:
+        telefones_rechamadas = rechamadas_detalhe.telefones(periodos)
+        df_rechamadas_mailing = pd.DataFrame({'telefone': telefones_rechamadas, 'tem_rechamada': True})
+        if not lista_mailing.empty:
+            lista_mailing = pd.merge(lista_mailing, df_rechamadas_mailing, on='telefone', how='outer')
+        else:
+            lista_mailing = df_rechamadas_mailing
+
+    # Clientes com ligações longas
+    if duracao_minima_seg is not None:
+        # Telefones com pelo menos uma ligação longa = duração máxima do telefone acima do mínimo
+        telefones_ligacoes_longas = indice_telefones.telefone[indice_telefones.duracao_maxima >= duracao_minima_seg]
+        df_ligacoes_longas_mailing = pd.DataFrame({'telefone': telefones_ligacoes_longas, 'tem_ligacao_longa': True})
+        if not lista_mailing.empty:
+            lista_mailing = pd.merge(lista_mailing, df_ligacoes_longas_mailing, on='telefone', how='outer')
+        else:
+            lista_mailing = df_ligacoes_longas_mailing
+
+    if lista_mailing.empty:
+        return lista_mailing
+
+    lista_mailing = lista_mailing.drop_duplicates(subset=['telefone'])
+    lista_mailing['telefone'] = formatar_telefone(lista_mailing['telefone'])
+    return lista_mailing
+
+
+# --- CONSULTA DE CLIENTE ---
+
+def historico_telefone(df_chamadas, indice_telefones, rechamadas_detalhe, telefone,
+                       df_target=None, indice_target=None, coluna_assunto=None):
+    """
+    Histórico de um telefone (texto só com dígitos): ligações em ordem de data, pares de
+    rechamada e, com o target, os assuntos de cada ligação. Usa só as linhas do
+    telefone (busca binária no IndiceTelefones), sem percorrer df_chamadas.
+    Retorna None se o telefone não tiver ligações; senão um dict com
+    'resumo', 'ligacoes' e 'rechamadas'.
+    """
+    i = indice_telefones.localizar(telefone)
+    if i is None:
+        return None
+
+    posicoes = indice_telefones.posicoes(telefone)
+    ligacoes = decodificar_ids(
+        df_chamadas.iloc[posicoes][['datetime', 'duracao_segundos', 'ID_Conversa']].reset_index(drop=True)
+    )
+    ligacoes['primeira_ligacao'] = posicoes == indice_telefones.pos_primeira[i]
+
+    if df_target is not None and indice_target is not None and coluna_assunto in df_target.columns:
+        pos_ligacao, pos_target = indice_target.linhas(indice_target.grupos(ligacoes['ID_Conversa']))
+        assuntos = pd.Series(df_target[coluna_assunto].to_numpy()[pos_target], index=pos_ligacao)
+        assuntos = assuntos[assuntos.notna()].astype(str)
+        # Um ID repetido no target junta os assuntos na mesma ligação
+        ligacoes['Assunto'] = assuntos.groupby(level=0).agg('; '.join).reindex(range(len(ligacoes)))
+
+    rechamadas = decodificar_ids(rechamadas_detalhe.das_ligacoes(posicoes).para_dataframe([
+        'primeira_ligacao', 'segunda_ligacao', 'diferenca_horas', 'periodo_rechamada',
+        'ID_Conversa_Primeira', 'ID_Conversa_Segunda'
+    ])).sort_values('segunda_ligacao').reset_index(drop=True)
+
+    resumo = {
+        'total_ligacoes': int(indice_telefones.quantidade[i]),
+        'primeira_ligacao': pd.Timestamp(indice_telefones.primeira_ligacao[i]),
+        'ultima_ligacao': pd.Timestamp(indice_telefones.ultima_ligacao[i]),
+        'duracao_total_seg': float(indice_telefones.duracao_total[i]),
+        'duracao_maxima_seg': float(indice_telefones.duracao_maxima[i]),
+        'total_rechamadas': len(rechamadas),
+    }
+    return {'resumo': resumo, 'ligacoes': ligacoes, 'rechamadas': rechamadas}
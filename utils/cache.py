@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.data_loader import VERSAO_LOADER
+
+# --- CACHE LOCAL DE UPLOADS PROCESSADOS ---
+# Cada upload processado vira um arquivo Parquet, identificado pelo hash do conteúdo
+# enviado + tipo de processamento + VERSAO_LOADER. Um JSON ao lado guarda os metadados
+# para a listagem. O último acesso (mtime do Parquet) define a ordem de descarte (LRU).
+
+DIRETORIO_CACHE = os.environ.get(
+    'APP_ANALISES_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'app_analises')
+)
+LIMITE_CACHE_BYTES = int(os.environ.get('APP_ANALISES_CACHE_MB', 2048)) * 1024 * 1024
+TAMANHO_BLOCO_HASH = 1024 * 1024  # o hash lê o arquivo em blocos, sem guardá-lo inteiro
+
+
+def _caminhos(chave):
+    base = os.path.join(DIRETORIO_CACHE, chave)
+    return base + '.parquet', base + '.json'
+
+
+def chave_cache(uploaded_file, tipo):
+    """
+    Hash do conteúdo enviado + tipo de processamento + versão do loader. Lê o arquivo
+    (UploadedFile do Streamlit ou qualquer arquivo binário) em blocos de
+    TAMANHO_BLOCO_HASH e o devolve posicionado no início.
+    """
+    h = hashlib.sha256()
+    h.update(f"{VERSAO_LOADER}|{tipo}|".encode('utf-8'))
+    uploaded_file.seek(0)
+    for bloco in iter(lambda: uploaded_file.read(TAMANHO_BLOCO_HASH), b''):
+        h.update(bloco)
+    uploaded_file.seek(0)
+    return h.hexdigest()
+
+
+def ler_cache(chave):
+    """Retorna o DataFrame em cache (ou None) e marca o acesso para o LRU."""
+    caminho_parquet, _ = _caminhos(chave)
+    if not os.path.exists(caminho_parquet):
+        return None
+
+    try:
+        df = pd.read_parquet(caminho_parquet)
+    except (pa.ArrowException, OSError, ValueError):
+        # Arquivo corrompido ou de outra versão do pyarrow: descarta e reprocessa
+        limpar_cache(chave)
+        return None
+
+    # O Parquet devolve nulos de colunas texto como None; o read_csv/read_excel usa NaN
+    # (e astype(str) daria 'None' em vez de 'nan' no processamento das abas)
+    for col in df.columns[df.dtypes == object]:
+        nulos = df[col].isna()
+        if nulos.any():
+            df[col] = df[col].where(~nulos, np.nan)
+
+    # E devolve as categorias de texto como object; os dicionários de IDs
+    # (data_loader.codificar_ids) voltam a ser strings do pyarrow
+    for col in df.columns[[isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes]]:
+        categorias = df[col].cat.categories
+        if categorias.dtype == object and pd.api.types.infer_dtype(categorias) == 'string':
+            df[col] = df[col].cat.rename_categories(categorias.astype('string[pyarrow]'))
+
+    os.utime(caminho_parquet)
+    return df
+
+
+def salvar_cache(chave, df, nome_arquivo, tipo):
+    """
+    Grava o DataFrame processado no cache. Retorna False (sem erro) quando o DataFrame
+    não pode ser representado em Parquet, por exemplo colunas object com tipos misturados.
+    """
+    os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+    caminho_parquet, caminho_meta = _caminhos(chave)
+    temporario = f"{caminho_parquet}.{os.getpid()}.tmp"
+
+    try:
+        df.to_parquet(temporario)
+    except (pa.ArrowException, ValueError, TypeError):
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        return False
+
+    # Escrita atômica: outra sessão nunca lê um Parquet pela metade
+    os.replace(temporario, caminho_parquet)
+    with open(caminho_meta, 'w', encoding='utf-8') as f:
+        json.dump({
+            'arquivo': nome_arquivo,
+            'tipo': tipo,
+            'linhas': len(df),
+            'colunas': len(df.columns),
+            'criado_em': time.time(),
+        }, f)
+
+    _aplicar_limite()
+    return True
+
+
+def carregar_com_cache(uploaded_file, tipo, carregar):
+    """
+    Envolve uma função de carga (uploaded_file -> (df, erro)) com o cache local.
+    Em um acerto o DataFrame volta com df.attrs['cache'] = chave. Em ambos os casos
+    df.attrs['impressao'] = chave identifica o conteúdo para a memória de resultados
+    do pipeline (utils/pipeline.py).
+    """
+    if uploaded_file is None:
+        return carregar(uploaded_file)
+
+    chave = chave_cache(uploaded_file, tipo)
+    df = ler_cache(chave)
+    if df is not None:
+        df.attrs['cache'] = chave
+        df.attrs['impressao'] = chave
+        return df, None
+
+    df, erro = carregar(uploaded_file)
+    if erro is None and df is not None:
+        df.attrs['impressao'] = chave
+        salvar_cache(chave, df, getattr(uploaded_file, 'name', ''), tipo)
+    return df, erro
+
+
+def listar_cache():
+    """DataFrame com os datasets em cache, do acesso mais recente para o mais antigo."""
+    registros = []
+    if os.path.isdir(DIRETORIO_CACHE):
+        for nome in os.listdir(DIRETORIO_CACHE):
+            if not nome.endswith('.parquet'):
+                continue
+            chave = nome[:-len('.parquet')]
+            caminho_parquet, caminho_meta = _caminhos(chave)
+            try:
+                with open(caminho_meta, encoding='utf-8') as f:
+                    meta = json.load(f)
+                estado = os.stat(caminho_parquet)
+            except (OSError, ValueError):
+                continue
+            registros.append({
+                'chave': chave,
+                'arquivo': meta.get('arquivo'),
+                'tipo': meta.get('tipo'),
+                'linhas': meta.get('linhas'),
+                'tamanho_mb': round(estado.st_size / (1024 * 1024), 2),
+                'criado_em': pd.to_datetime(meta.get('criado_em'), unit='s'),
+                'ultimo_acesso': pd.to_datetime(estado.st_mtime, unit='s'),
+            })
+
+    colunas = ['chave', 'arquivo', 'tipo', 'linhas', 'tamanho_mb', 'criado_em', 'ultimo_acesso']
+    if not registros:
+        return pd.DataFrame(columns=colunas)
+    return pd.DataFrame(registros, columns=colunas).sort_values('ultimo_acesso', ascending=False).reset_index(drop=True)
+
+
+def limpar_cache(chave=None):
+    """Remove um dataset do cache (ou todos, se chave for None). Retorna quantos foram removidos."""
+    if not os.path.isdir(DIRETORIO_CACHE):
+        return 0
+
+    if chave is None:
+        chaves = [nome[:-len('.parquet')] for nome in os.listdir(DIRETORIO_CACHE) if nome.endswith('.parquet')]
+    else:
+        chaves = [chave]
+
+    removidos = 0
+    for c in chaves:
+        for caminho in _caminhos(c):
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                # Já removido (por outra sessão, por exemplo)
+                continue
+            if caminho.endswith('.parquet'):
+                removidos += 1
+    return removidos
+
+
+def _aplicar_limite():
+    """Descarta os datasets acessados há mais tempo até o cache caber em LIMITE_CACHE_BYTES."""
+    entradas = []
+    for nome in os.listdir(DIRETORIO_CACHE):
+        if not nome.endswith('.parquet'):
+            continue
+        try:
+            estado = os.stat(os.path.join(DIRETORIO_CACHE, nome))
+        except FileNotFoundError:
+            continue
+        entradas.append((estado.st_mtime, estado.st_size, nome[:-len('.parquet')]))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, chave in sorted(entradas):
+        if total <= LIMITE_CACHE_BYTES:
+            break
+        limpar_cache(chave)
+        total -= tamanho
@@ -1,7 +1,23 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import io
-from datetime import datetime, timedelta
+import os
+import re
+import csv
+import codecs
+import logging
+import hashlib
+from pandas.api.extensions import take
+
+# Versão do processamento dos uploads: incremente ao mudar qualquer load_file_* ou
+# process_dataframe_* para invalidar os DataFrames guardados no cache local (utils/cache.py)
+VERSAO_LOADER = '6'
+
+# Diagnósticos do processamento vão para o log: no app, utils.log os repassa para a tela
+# (st.info/st.warning/st.error); na linha de comando (cli.py), para o terminal
+logger = logging.getLogger(__name__)
 
 # --- FUNÇÕES AUXILIARES GERAIS ---
 
@@ -48,100 +64,488 @@ def convert_duration_to_seconds(duracao_str):
         return 0
 
 
+_TEXTOS_DURACAO_VAZIA = pa.array(['', 'nan', 'none', 'nat'])
+
+
+def _duracoes_texto_para_segundos(textos):
+    """
+    Converte um array de strings de duração com kernels do pyarrow.
+    Retorna (segundos, reconhecidos); linhas não reconhecidas (sinais, espaços
+    internos, dígitos não ASCII, notação científica...) ficam para a função escalar.
+    """
+    textos = pc.utf8_trim_whitespace(pa.array(textos, type=pa.string()))
+    vazios = pc.is_in(pc.utf8_lower(textos), value_set=_TEXTOS_DURACAO_VAZIA).to_numpy(zero_copy_only=False)
+
+    # Remove milissegundos: "00:13:56.528" vira "00:13:56"
+    textos = pc.list_element(pc.split_pattern(textos, '.', max_splits=1), 0)
+
+    partes = pc.split_pattern(textos, ':')
+    qtd_partes = pc.list_value_length(partes).to_numpy(zero_copy_only=False)
+    inicio = partes.offsets.to_numpy()[:-1]
+    plano = pc.list_flatten(partes)
+
+    # Só dígitos ASCII, com limites que cabem em int64 e batem com int(float(...))
+    tamanho = pc.binary_length(plano).to_numpy(zero_copy_only=False)
+    digitos = pc.ascii_is_decimal(plano).to_numpy(zero_copy_only=False)
+    valido_unico = digitos & (tamanho <= 15)
+    numeros = pc.cast(pc.if_else(valido_unico, plano, '0'), pa.int64()).to_numpy()
+    valido_parte = digitos & (tamanho <= 9)
+
+    segundos = np.zeros(len(textos), dtype=np.int64)
+    reconhecidos = vazios.copy()
+
+    # Número puro (segundos)
+    um = ~vazios & (qtd_partes == 1)
+    um &= valido_unico[np.where(um, inicio, 0)]
+    segundos[um] = numeros[inicio[um]]
+    reconhecidos |= um
+
+    # mm:ss
+    dois = ~vazios & (qtd_partes == 2)
+    i = inicio[dois]
+    ok = valido_parte[i] & valido_parte[i + 1]
+    linhas = np.flatnonzero(dois)[ok]
+    segundos[linhas] = numeros[i[ok]] * 60 + numeros[i[ok] + 1]
+    reconhecidos[linhas] = True
+
+    # hh:mm:ss
+    tres = ~vazios & (qtd_partes == 3)
+    i = inicio[tres]
+    ok = valido_parte[i] & valido_parte[i + 1] & valido_parte[i + 2]
+    linhas = np.flatnonzero(tres)[ok]
+    segundos[linhas] = numeros[i[ok]] * 3600 + numeros[i[ok] + 1] * 60 + numeros[i[ok] + 2]
+    reconhecidos[linhas] = True
+
+    # Mais de 3 partes é formato desconhecido: sempre 0
+    reconhecidos |= ~vazios & (qtd_partes > 3)
+
+    return segundos, reconhecidos
+
+
+def converter_duracoes_para_segundos(serie):
+    """
+    Versão vetorizada de convert_duration_to_seconds para uma Series inteira.
+    Aceita os mesmos formatos (mm:ss, hh:mm:ss, hh:mm:ss.mmm, números e vazios) e
+    devolve exatamente o mesmo resultado; valores fora dos formatos comuns são
+    resolvidos pela função escalar.
+    """
+    serie = pd.Series(serie)
+    segundos = np.zeros(len(serie), dtype=np.int64)
+
+    if pd.api.types.is_bool_dtype(serie):
+        return pd.Series(segundos, index=serie.index)
+
+    nativo = not isinstance(serie.dtype, pd.api.extensions.ExtensionDtype)
+    valores = serie.to_numpy()
+
+    if nativo and pd.api.types.is_integer_dtype(serie):
+        # int(float(x)) só é exato até 2**53
+        exatos = np.abs(valores) <= 2 ** 53
+        segundos[exatos] = valores[exatos]
+        fallback = ~exatos
+
+    elif nativo and pd.api.types.is_float_dtype(serie):
+        # str(float) só fica em notação posicional nessa faixa; fora dela usa a função escalar
+        nulos = np.isnan(valores)
+        absolutos = np.abs(valores)
+        posicionais = ~nulos & ((absolutos == 0) | ((absolutos >= 1e-4) & (absolutos < 1e15)))
+        segundos[posicionais] = np.trunc(valores[posicionais])
+        fallback = ~nulos & ~posicionais
+
+    else:
+        nulos = serie.isna().to_numpy()
+        if pd.api.types.infer_dtype(valores, skipna=True) in ('string', 'empty'):
+            eh_texto = ~nulos
+        else:
+            eh_texto = np.fromiter((isinstance(v, str) for v in valores), dtype=bool, count=len(valores))
+        fallback = ~nulos & ~eh_texto
+
+        if eh_texto.any():
+            posicoes = np.flatnonzero(eh_texto)
+            valor, reconhecidos = _duracoes_texto_para_segundos(valores[posicoes])
+            segundos[posicoes] = valor
+            fallback[posicoes[~reconhecidos]] = True
+
+    if fallback.any():
+        valores_fallback = [convert_duration_to_seconds(v) for v in valores[fallback]]
+        try:
+            segundos[fallback] = valores_fallback
+        except OverflowError:
+            # Durações absurdas que não cabem em int64: mantém inteiros Python, como o .apply fazia
+            resultado = pd.Series(segundos, index=serie.index, dtype=object)
+            resultado[fallback] = valores_fallback
+            return resultado
+
+    return pd.Series(segundos, index=serie.index)
+
+
 # --- FUNÇÕES DE CARREGAMENTO ---
 
-def load_file_chamadas(uploaded_file):
+ENCODINGS_CSV = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
+SEPARADORES_CSV = [',', ';', '\t']
+TAMANHO_AMOSTRA_CSV = 64 * 1024  # bytes lidos para detectar encoding e separador
+
+
+def detectar_dialeto_csv(amostra):
     """
-    Carrega arquivo de CHAMADAS (CSV ou Excel) e retorna DataFrame padronizado.
-    EXIGE coluna de data/hora válida.
+    Detecta encoding e separador de um CSV a partir de uma amostra de bytes.
+    Retorna (encoding, separador); separador é None se nenhum formar mais de uma coluna.
     """
-    if uploaded_file is None:
-        return None, "Nenhum arquivo enviado."
+    if amostra.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    else:
+        encoding = ENCODINGS_CSV[-1]
+        for enc in ENCODINGS_CSV:
+            try:
+                # final=False: a amostra pode cortar um caractere multibyte no meio
+                codecs.getincrementaldecoder(enc)().decode(amostra, final=False)
+                encoding = enc
+                break
+            except UnicodeDecodeError:
+                continue
+
+    texto = codecs.getincrementaldecoder(encoding)(errors='replace').decode(amostra, final=False)
+
+    # Descarta a última linha se a amostra não terminou em quebra de linha (linha cortada)
+    if len(amostra) >= TAMANHO_AMOSTRA_CSV and '\n' in texto:
+        texto = texto[:texto.rindex('\n') + 1]
+
+    melhor_sep, melhor_campos = None, 1
+    for sep in SEPARADORES_CSV:
+        try:
+            campos = [len(linha) for linha in csv.reader(io.StringIO(texto), delimiter=sep) if linha]
+        except csv.Error:
+            continue
+        if not campos or campos[0] <= 1:
+            continue
+
+        # Separador consistente: todas as linhas com o mesmo número de campos do cabeçalho
+        if all(c == campos[0] for c in campos):
+            return encoding, sep
+
+        if campos[0] > melhor_campos:
+            melhor_sep, melhor_campos = sep, campos[0]
+
+    return encoding, melhor_sep
+
+
+def _ler_csv(uploaded_file, usecols=None, nrows=None):
+    """
+    Lê um CSV detectando encoding/separador em uma amostra limitada e fazendo o
+    parse completo uma única vez, direto dos bytes (sem cópia intermediária em str).
+    usecols (callable) e nrows são repassados ao pd.read_csv.
+    Retorna (df, dialeto, erro).
+    """
+    uploaded_file.seek(0)
+    encoding, sep = detectar_dialeto_csv(uploaded_file.read(TAMANHO_AMOSTRA_CSV))
+
+    if sep is None:
+        return None, None, "Não foi possível carregar o arquivo CSV. Verifique o formato."
+
+    # Se o restante do arquivo não respeitar o encoding da amostra, tenta os demais
+    encodings = [encoding] + [e for e in ENCODINGS_CSV if e != encoding]
+    for enc in encodings:
+        try:
+            uploaded_file.seek(0)
+            df = pd.read_csv(uploaded_file, sep=sep, encoding=enc, usecols=usecols, nrows=nrows)
+        except UnicodeDecodeError:
+            continue
+        except Exception:
+            break
+
+        # Com projeção de colunas, uma única coluna é válida
+        if (df.empty and nrows != 0) or (usecols is None and len(df.columns) <= 1):
+            break
+        return df, {'encoding': enc, 'separador': sep}, None
+
+    return None, None, "Não foi possível carregar o arquivo CSV. Verifique o formato."
+
+
+# Leitura de Excel com várias abas em paralelo (um processo por aba, até o limite)
+MAX_PROCESSOS_EXCEL = int(os.environ.get('APP_ANALISES_PROCESSOS_EXCEL', os.cpu_count() or 1))
+TAMANHO_MINIMO_PARALELO_EXCEL = 5 * 1024 * 1024  # abaixo disso, subir processos custa mais que ler as abas
+
+# Workbook aberto uma vez em cada processo do pool (ver _iniciar_processo_excel)
+_excel_do_processo = None
+
+
+def _ler_aba_excel(excel_file, nome_aba, colunas, nrows):
+    """
+    Lê uma aba do workbook (o engine openpyxl do pandas já abre em modo read-only e
+    itera as linhas em streaming). Retorna as colunas como dict nome -> Series, para
+    concatenar as abas coluna a coluna, ou None se a aba não tiver dados válidos.
+    """
+    usecols = None
+    if colunas is not None:
+        conjunto = set(colunas)
+        usecols = lambda c: c in conjunto
+
+        if nrows != 0:
+            # Só as abas que têm dados válidos na leitura completa (mesmo critério abaixo)
+            cabecalho = pd.read_excel(excel_file, sheet_name=nome_aba, nrows=0)
+            if len(cabecalho.columns) <= 1:
+                return None
+
+    df = pd.read_excel(excel_file, sheet_name=nome_aba, usecols=usecols, nrows=nrows)
+    if (df.empty and nrows != 0) or (colunas is None and len(df.columns) <= 1):
+        return None
+    return {col: df[col] for col in df.columns}
+
+
+def _iniciar_processo_excel(conteudo):
+    global _excel_do_processo
+    _excel_do_processo = pd.ExcelFile(io.BytesIO(conteudo))
+
+
+def _ler_aba_no_processo(nome_aba, colunas, nrows):
+    return _ler_aba_excel(_excel_do_processo, nome_aba, colunas, nrows)
+
+
+def _concatenar_abas(partes):
+    """
+    Concatena as abas coluna a coluna, liberando as partes de cada coluna assim que ela
+    é montada: o pico de memória fica em (abas + uma coluna), e não em duas cópias inteiras.
+    Abas com colunas diferentes seguem pelo pd.concat normal.
+    """
+    colunas = list(dict.fromkeys(col for parte in partes for col in parte))
+    if any(list(parte) != colunas for parte in partes):
+        return pd.concat([pd.DataFrame(parte, copy=False) for parte in partes], ignore_index=True)
+
+    resultado = {}
+    for col in colunas:
+        resultado[col] = pd.concat([parte.pop(col) for parte in partes], ignore_index=True)
+    return pd.DataFrame(resultado, copy=False)
+
 
+def _ler_excel(uploaded_file, colunas=None, nrows=None, progresso=None):
+    """
+    Lê todas as abas do Excel em um único DataFrame. Workbooks grandes com várias abas
+    são lidos em paralelo por um pool de processos. progresso(concluidas, total, aba)
+    é chamado a cada aba lida. Retorna (df, erro).
+    """
+    uploaded_file.seek(0)
+    excel_file = pd.ExcelFile(uploaded_file)
+    abas = excel_file.sheet_names
+    partes = [None] * len(abas)
+
+    conteudo = uploaded_file.getvalue() if hasattr(uploaded_file, 'getvalue') else None
+    processos = min(len(abas), MAX_PROCESSOS_EXCEL)
+    paralelo = (
+        processos > 1 and nrows != 0 and
+        conteudo is not None and len(conteudo) >= TAMANHO_MINIMO_PARALELO_EXCEL
+    )
+
+    if paralelo:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        import multiprocessing
+
+        # spawn: o servidor do Streamlit tem várias threads, e fork com threads pode travar
+        with ProcessPoolExecutor(
+            max_workers=processos,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_iniciar_processo_excel,
+            initargs=(conteudo,)
+        ) as pool:
+            futuros = {pool.submit(_ler_aba_no_processo, aba, colunas, nrows): i for i, aba in enumerate(abas)}
+            for concluidas, futuro in enumerate(as_completed(futuros), start=1):
+                i = futuros[futuro]
+                partes[i] = futuro.result()
+                if progresso:
+                    progresso(concluidas, len(abas), abas[i])
+    else:
+        for i, aba in enumerate(abas):
+            partes[i] = _ler_aba_excel(excel_file, aba, colunas, nrows)
+            if progresso:
+                progresso(i + 1, len(abas), aba)
+
+    partes = [parte for parte in partes if parte is not None]
+    if not partes:
+        return None, "Nenhum dado válido foi carregado de nenhuma aba do Excel."
+    return _concatenar_abas(partes), None
+
+
+def _ler_arquivo(uploaded_file, colunas=None, nrows=None, progresso=None):
+    """
+    Lê o arquivo enviado (CSV ou Excel, todas as abas) em um único DataFrame.
+    colunas limita a leitura a essas colunas (as ausentes em uma aba são ignoradas);
+    nrows=0 lê só o cabeçalho; progresso recebe o andamento das abas do Excel.
+    Retorna (df, erro). Para CSV, o dialeto detectado fica em df.attrs['dialeto_csv'].
+    """
     file_extension = uploaded_file.name.split('.')[-1].lower()
-    dfs = []
 
-    try:
-        if file_extension == 'csv':
-            uploaded_file_content = uploaded_file.getvalue()
-            df_temp = None
-            for encoding in ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']:
-                for sep in [',', ';', '\t']:
-                    try:
-                        df_temp = pd.read_csv(io.StringIO(uploaded_file_content.decode(encoding)), sep=sep)
-                        if not df_temp.empty and len(df_temp.columns) > 1:
-                            dfs.append(df_temp)
-                            break
-                    except Exception:
-                        continue
-                if dfs:
-                    break
-            if not dfs:
-                return None, "Não foi possível carregar o arquivo CSV. Verifique o formato."
-
-        elif file_extension in ['xlsx', 'xls']:
+    if file_extension == 'csv':
+        usecols = None
+        if colunas is not None:
+            conjunto = set(colunas)
+            usecols = lambda c: c in conjunto
+        df, dialeto, erro = _ler_csv(uploaded_file, usecols=usecols, nrows=nrows)
+        if erro:
+            return None, erro
+        df.attrs['dialeto_csv'] = dialeto
+        return df, None
+
+    elif file_extension in ['xlsx', 'xls']:
+        return _ler_excel(uploaded_file, colunas=colunas, nrows=nrows, progresso=progresso)
+
+    else:
+        return None, f"Formato de arquivo não suportado: {file_extension}"
+
+
+def ler_cabecalho(uploaded_file):
+    """
+    Lê só o cabeçalho do arquivo (CSV ou todas as abas do Excel), sem colunas Unnamed.
+    Retorna (colunas, erro).
+    """
+    df, erro = _ler_arquivo(uploaded_file, nrows=0)
+    if erro:
+        return None, erro
+    return [col for col in df.columns if not str(col).startswith('Unnamed')], None
+
+
+# Leitura em blocos (streaming) para exports de chamadas muito grandes
+MEMORIA_STREAMING_MB = int(os.environ.get('APP_ANALISES_MEMORIA_STREAMING_MB', 512))
+LIMIAR_STREAMING_BYTES = int(os.environ.get('APP_ANALISES_LIMIAR_STREAMING_MB', 256)) * 1024 * 1024
+FATOR_MEMORIA_BLOCO = 10  # bytes em memória (strings object + colunas derivadas) por byte de CSV lido
+
+
+def usar_streaming(uploaded_file):
+    """Indica se o arquivo de chamadas deve ser lido em blocos (CSV maior que LIMIAR_STREAMING_BYTES)."""
+    if uploaded_file is None or not uploaded_file.name.lower().endswith('.csv'):
+        return False
+    tamanho = getattr(uploaded_file, 'size', None)
+    if tamanho is None:
+        tamanho = uploaded_file.seek(0, io.SEEK_END)
+        uploaded_file.seek(0)
+    return tamanho > LIMIAR_STREAMING_BYTES
+
+
+def _linhas_por_bloco(amostra, memoria_mb):
+    """Quantidade de linhas por bloco para que cada bloco caiba em memoria_mb."""
+    bytes_por_linha = len(amostra) / max(amostra.count(b'\n'), 1)
+    return max(1000, int(memoria_mb * 1024 * 1024 / (bytes_por_linha * FATOR_MEMORIA_BLOCO)))
+
+
+def _ler_chamadas_em_blocos(uploaded_file, memoria_mb):
+    """
+    Lê o CSV de chamadas em blocos limitados por memoria_mb, só com as colunas de
+    origem detectadas no cabeçalho, e normaliza cada bloco (normalizar_chamadas) assim
+    que é lido. Só as colunas normalizadas ficam em memória até o fim.
+    Retorna (df, dialeto, erro).
+    """
+    uploaded_file.seek(0)
+    amostra = uploaded_file.read(TAMANHO_AMOSTRA_CSV)
+    encoding, sep = detectar_dialeto_csv(amostra)
+
+    if sep is None:
+        return None, None, "Não foi possível carregar o arquivo CSV. Verifique o formato."
+
+    linhas_por_bloco = _linhas_por_bloco(amostra, memoria_mb)
+    colunas_finais = ['datetime', 'telefone', 'duracao_segundos', 'ID_Conversa']
+
+    # Se o restante do arquivo não respeitar o encoding da amostra, recomeça com os demais
+    encodings = [encoding] + [e for e in ENCODINGS_CSV if e != encoding]
+    for enc in encodings:
+        try:
             uploaded_file.seek(0)
-            excel_file = pd.ExcelFile(uploaded_file)
-            for sheet_name in excel_file.sheet_names:
-                df_temp = pd.read_excel(excel_file, sheet_name=sheet_name)
-                if not df_temp.empty and len(df_temp.columns) > 1:
-                    dfs.append(df_temp)
-            if not dfs:
-                return None, "Nenhum dado válido foi carregado de nenhuma aba do Excel."
+            cabecalho = pd.read_csv(uploaded_file, sep=sep, encoding=enc, nrows=0).columns
+            colunas = detectar_colunas_chamadas(cabecalho)
 
-        else:
-            return None, f"Formato de arquivo não suportado: {file_extension}"
+            if not colunas['datetime']:
+                _registrar_contagens_chamadas(colunas, {'linhas': 0})
+                return None, None, "Nenhuma coluna de data/hora foi detectada no arquivo de chamadas."
+
+            # Tudo como texto: a inferência de tipos por bloco variaria de um bloco para outro
+            uploaded_file.seek(0)
+            leitor = pd.read_csv(
+                uploaded_file,
+                sep=sep,
+                encoding=enc,
+                usecols=list(dict.fromkeys(c for c in colunas.values() if c)),
+                dtype=str,
+                chunksize=linhas_por_bloco
+            )
+
+            blocos = []
+            contagens = None
+            for bloco in leitor:
+                bloco, contagens_bloco = normalizar_chamadas(bloco, colunas)
+                blocos.append(bloco[colunas_finais])
+                if contagens is None:
+                    contagens = contagens_bloco
+                else:
+                    contagens = {k: contagens[k] + contagens_bloco[k] for k in contagens}
+        except UnicodeDecodeError:
+            continue
+
+        if not blocos:
+            return None, None, "Não foi possível carregar o arquivo CSV. Verifique o formato."
+
+        _registrar_contagens_chamadas(colunas, contagens)
+        logger.info(f"🧩 Arquivo lido em {len(blocos)} bloco(s) de até {linhas_por_bloco:,} linhas")
 
-        df_combined = pd.concat(dfs, ignore_index=True)
-        return process_dataframe_chamadas(df_combined), None
+        df = pd.concat(blocos, ignore_index=True)
+        df = df.sort_values(['telefone', 'datetime']).reset_index(drop=True)
+        return df, {'encoding': enc, 'separador': sep}, None
+
+    return None, None, "Não foi possível carregar o arquivo CSV. Verifique o formato."
+
+
+def load_file_chamadas(uploaded_file, streaming=False, memoria_mb=MEMORIA_STREAMING_MB, progresso=None):
+    """
+    Carrega arquivo de CHAMADAS (CSV ou Excel) e retorna DataFrame padronizado.
+    EXIGE coluna de data/hora válida.
+    Com streaming=True, CSVs são lidos em blocos de até memoria_mb e o DataFrame final
+    traz só as colunas padronizadas (datetime, telefone, duracao_segundos, ID_Conversa).
+    progresso(concluidas, total, aba) acompanha a leitura das abas de um Excel.
+    """
+    if uploaded_file is None:
+        return None, "Nenhum arquivo enviado."
+
+    try:
+        if streaming and uploaded_file.name.lower().endswith('.csv'):
+            df, dialeto, erro = _ler_chamadas_em_blocos(uploaded_file, memoria_mb)
+            if erro:
+                return None, erro
+            df = compactar_chamadas(df)
+            df.attrs['dialeto_csv'] = dialeto
+            return df, None
+
+        # Só as colunas de origem detectadas no cabeçalho são lidas
+        cabecalho, erro = ler_cabecalho(uploaded_file)
+        if erro:
+            return None, erro
+        colunas = detectar_colunas_chamadas(cabecalho)
+        usecols = [c for c in colunas.values() if c] if colunas['datetime'] else None
+
+        df_combined, erro = _ler_arquivo(uploaded_file, colunas=usecols, progresso=progresso)
+        if erro:
+            return None, erro
+
+        dialeto = df_combined.attrs.get('dialeto_csv')
+        df = process_dataframe_chamadas(df_combined)
+        if df['datetime'].notna().any():
+            df = compactar_chamadas(df)
+        if dialeto:
+            df.attrs['dialeto_csv'] = dialeto
+        return df, None
 
     except Exception as e:
         return None, f"Erro ao carregar arquivo: {e}"
 
 
-def load_file_target(uploaded_file):
+def load_file_target(uploaded_file, colunas=None, progresso=None):
     """
     Carrega arquivo TARGET (CSV ou Excel) SEM processar data/hora.
     Apenas remove colunas Unnamed e mantém dados originais.
+    Com colunas, lê só essas colunas do arquivo.
     """
     if uploaded_file is None:
         return None, "Nenhum arquivo enviado."
 
-    file_extension = uploaded_file.name.split('.')[-1].lower()
-    dfs = []
-
     try:
-        if file_extension == 'csv':
-            uploaded_file_content = uploaded_file.getvalue()
-            df_temp = None
-            for encoding in ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']:
-                for sep in [',', ';', '\t']:
-                    try:
-                        df_temp = pd.read_csv(io.StringIO(uploaded_file_content.decode(encoding)), sep=sep)
-                        if not df_temp.empty and len(df_temp.columns) > 1:
-                            dfs.append(df_temp)
-                            break
-                    except Exception:
-                        continue
-                if dfs:
-                    break
-            if not dfs:
-                return None, "Não foi possível carregar o arquivo CSV. Verifique o formato."
-
-        elif file_extension in ['xlsx', 'xls']:
-            uploaded_file.seek(0)
-            excel_file = pd.ExcelFile(uploaded_file)
-            for sheet_name in excel_file.sheet_names:
-                df_temp = pd.read_excel(excel_file, sheet_name=sheet_name)
-                if not df_temp.empty and len(df_temp.columns) > 1:
-                    dfs.append(df_temp)
-            if not dfs:
-                return None, "Nenhum dado válido foi carregado de nenhuma aba do Excel."
-
-        else:
-            return None, f"Formato de arquivo não suportado: {file_extension}"
-
-        df_combined = pd.concat(dfs, ignore_index=True)
+        df_combined, erro = _ler_arquivo(uploaded_file, colunas=colunas, progresso=progresso)
+        if erro:
+            return None, erro
 
         # Remove apenas colunas Unnamed
         df_combined = df_combined.loc[:, ~df_combined.columns.str.contains('^Unnamed', na=False)]
@@ -152,406 +556,1300 @@ def load_file_target(uploaded_file):
         return None, f"Erro ao carregar arquivo: {e}"
 
 
-# --- PROCESSAMENTO DE DATAFRAMES ---
-
-def process_dataframe_chamadas(df):
+def load_file_target_motivos(uploaded_file, progresso=None):
     """
-    Processa DataFrame de CHAMADAS.
-    Garante que 'datetime', 'telefone', 'duracao_segundos' e 'ID_Conversa' existam.
-    EXCLUI telefones bloqueados e inválidos.
+    Carrega o TARGET para a análise de motivos lendo só as colunas de ID (todas, se
+    nenhuma tiver "id" no nome), codificadas como os IDs das chamadas (codificar_ids).
+    As demais são lidas sob demanda por carregar_colunas_target; a lista completa fica
+    em df.attrs['colunas_arquivo'].
     """
-    import streamlit as st
+    if uploaded_file is None:
+        return None, "Nenhum arquivo enviado."
 
-    # Remove colunas Unnamed
-    df = df.loc[:, ~df.columns.str.contains('^Unnamed', na=False)]
+    try:
+        cabecalho, erro = ler_cabecalho(uploaded_file)
+        if erro:
+            return None, erro
+    except Exception as e:
+        return None, f"Erro ao carregar arquivo: {e}"
 
+    colunas_id = [col for col in cabecalho if 'id' in str(col).lower()]
+    df, erro = load_file_target(uploaded_file, colunas=colunas_id or None, progresso=progresso)
+    if erro:
+        return None, erro
 
-    st.info(f"🔍 DEBUG: Total de linhas no CSV: {len(df)}")
+    for col in colunas_id:
+        df[col] = codificar_ids(df[col])
 
-    # --- DETECTAR COLUNA DE DATA/HORA (PRIORIDADE PARA NOMES EXATOS) ---
-    datetime_col_name = None
+    df.attrs['colunas_arquivo'] = cabecalho
+    return df, None
 
-    # PASSO 1: Procurar por nomes EXATOS de colunas de data (prioridade máxima)
-    exact_datetime_names = ['Data', 'data', 'DATA', 'Date', 'date', 'Datetime', 'datetime']
 
-    for exact_name in exact_datetime_names:
-        if exact_name in df.columns:
-            datetime_col_name = exact_name
-            break
+def carregar_colunas_target(df_target, arquivo, colunas):
+    """
+    Target com as colunas pedidas que ainda não foram lidas, relendo só essas colunas
+    do arquivo original. df_target não é alterado: volta um novo DataFrame (com os mesmos
+    attrs), para ser guardado no lugar do anterior. As linhas saem na mesma ordem da
+    primeira leitura. Retorna (df_target, erro).
+    """
+    faltando = [col for col in colunas if col not in df_target.columns]
+    if not faltando:
+        return df_target, None
 
-    # PASSO 2: Se não encontrou, procura por palavras-chave genéricas
-    if not datetime_col_name:
-        datetime_keywords = ['hora', 'time', 'timestamp', 'dt']
+    df_extra, erro = load_file_target(arquivo, colunas=faltando)
+    if erro:
+        return None, erro
+    if len(df_extra) != len(df_target):
+        return None, "O arquivo target mudou desde o upload; carregue-o novamente."
 
-        for col in df.columns:
-            col_lower = str(col).lower().strip()
-            # Ignora colunas que contenham "parcial" ou "carimbo" (são metadados)
-            if 'parcial' in col_lower or 'carimbo' in col_lower:
-                continue
-            if any(k in col_lower for k in datetime_keywords):
-                datetime_col_name = col
-                break
+    return df_target.assign(**{col: df_extra[col].to_numpy() for col in df_extra.columns}), None
 
-    if not datetime_col_name:
-        st.error("❌ DEBUG: Nenhuma coluna de data/hora foi detectada!")
-        df['datetime'] = pd.NaT
-        return df
 
+# --- PROCESSAMENTO DE DATAFRAMES ---
 
-    # Normaliza a coluna
-    df['data_hora'] = df[datetime_col_name].astype(str).str.strip().str.replace(r'\s+', ' ', regex=True)
-
-
-    datetime_formats = [
-        '%d/%m/%Y %H:%M:%S',
-        '%d/%m/%Y %H:%M',
-        '%d/%m/%Y',
-        '%Y-%m-%dT%H:%M:%S',
-        '%Y-%m-%d %H:%M:%S',
-        '%Y-%m-%d %H:%M',
-        '%Y-%m-%d',
-        '%m/%d/%Y %H:%M:%S',
-        '%m/%d/%Y %H:%M',
-        '%m/%d/%Y',
-        '%H:%M:%S',
-        '%H:%M',
-        '%Y-%m-%d %H:%M:%S.%f',
-    ]
+FORMATOS_DATA_HORA = [
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+    '%H:%M:%S',
+    '%H:%M',
+    '%Y-%m-%d %H:%M:%S.%f',
+]
+TAMANHO_AMOSTRA_DATAS = 1000
+# Espaços que str.isspace() reconhece além do espaço simples, na sintaxe RE2 do pyarrow
+_OUTROS_ESPACOS = r'[\t\n\x0b\x0c\r\x1c-\x1f\x{85}\x{a0}\x{1680}\x{2000}-\x{200a}\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}]'
+_TEXTOS_DATA_VAZIA = ['', 'nan', 'NaN', 'NaT', 'None', '<NA>']
+
+
+# Campos com largura fixa (zero à esquerda), nas mesmas faixas aceitas pelo strptime do pandas
+_CAMPOS_DATA = {
+    'd': ('(0[1-9]|[12][0-9]|3[01])', 2),
+    'm': ('(0[1-9]|1[0-2])', 2),
+    'Y': ('[0-9]{4}', 4),
+    'H': ('([01][0-9]|2[0-3])', 2),
+    'M': ('[0-5][0-9]', 2),
+    'S': ('([0-5][0-9]|6[01])', 2),
+}
+_PADRAO_ISO = {'Y': '1900', 'm': '01', 'd': '01', 'H': '00', 'M': '00', 'S': '00'}
+
+
+def _normalizar_espacos(serie):
+    """
+    Equivale a astype(str).str.strip().str.replace(r'\s+', ' '), mas só passa pelo
+    Python nas linhas que realmente têm espaços a ajustar.
+    """
+    textos = serie.astype(str).to_numpy(dtype=object)
+    ajustar = pc.match_substring_regex(
+        pa.array(textos, type=pa.string()), f'^ | $|  |{_OUTROS_ESPACOS}'
+    ).to_numpy(zero_copy_only=False)
+
+    if ajustar.any():
+        textos = textos.copy()
+        textos[ajustar] = [re.sub(r'\s+', ' ', t.strip()) for t in textos[ajustar]]
+    return textos
+
+
+def _reescrever_iso(textos, fmt):
+    """
+    Reescreve strings no formato fmt com campos de largura fixa (ex.: '05/03/2024 10:00')
+    como 'YYYY-mm-dd HH:MM:SS', que o pandas converte pelo caminho rápido.
+    Retorna (iso, casou); as linhas que não casam ficam para o strptime do pandas.
+    """
+    padrao, inicio_campo, largura = '', {}, 0
+    i = 0
+    while i < len(fmt):
+        if fmt[i] == '%' and fmt[i + 1] in _CAMPOS_DATA:
+            regex_campo, tamanho = _CAMPOS_DATA[fmt[i + 1]]
+            inicio_campo[fmt[i + 1]] = largura
+            padrao += regex_campo
+            largura += tamanho
+            i += 2
+        else:
+            padrao += re.escape(fmt[i])
+            largura += 1
+            i += 1
+
+    arr = pa.array(textos, type=pa.string())
+    casou = pc.match_substring_regex(arr, f'^{padrao}$').to_numpy(zero_copy_only=False)
+
+    partes = {}
+    for campo, padrao_iso in _PADRAO_ISO.items():
+        if campo in inicio_campo:
+            ini = inicio_campo[campo]
+            partes[campo] = pc.utf8_slice_codeunits(arr, ini, ini + len(padrao_iso))
+        else:
+            partes[campo] = padrao_iso
+
+    iso = pc.binary_join_element_wise(
+        partes['Y'], '-', partes['m'], '-', partes['d'], ' ',
+        partes['H'], ':', partes['M'], ':', partes['S'], ''
+    )
+    return iso.to_numpy(zero_copy_only=False), casou
 
-    df['datetime'] = pd.NaT
 
-    # Tenta cada formato
-    for fmt in datetime_formats:
-        mask = df['datetime'].isna()
-        if not mask.any():
+def _aplicar_formatos(textos, posicoes, formatos, resultado):
+    """
+    Tenta cada formato, em ordem, nas posições ainda sem data e grava as convertidas
+    em resultado. Retorna as posições que continuam pendentes.
+    """
+    for fmt in formatos:
+        if len(posicoes) == 0:
             break
 
-        try:
-            converted = pd.to_datetime(df.loc[mask, 'data_hora'], format=fmt, errors='coerce')
-            converted_count = converted.notna().sum()
+        # Formatos ISO (ano-mês-dia) já usam o parser rápido do pandas
+        if fmt.startswith('%Y-%m-%d'):
+            convertido = pd.to_datetime(textos[posicoes], format=fmt, errors='coerce').to_numpy(dtype='datetime64[ns]')
+        else:
+            iso, casou = _reescrever_iso(textos[posicoes], fmt)
+            convertido = np.full(len(posicoes), np.datetime64('NaT'), dtype='datetime64[ns]')
+            convertido[casou] = pd.to_datetime(iso[casou], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+            if not casou.all():
+                # Campos sem zero à esquerda, espaço antes do dia etc.: strptime do pandas
+                convertido[~casou] = pd.to_datetime(textos[posicoes[~casou]], format=fmt, errors='coerce')
+
+        ok = ~np.isnat(convertido)
+        resultado[posicoes[ok]] = convertido[ok]
+        posicoes = posicoes[~ok]
+    return posicoes
 
-            if converted_count > 0:
-                df.loc[mask, 'datetime'] = converted
-        except Exception as e:
-            continue
 
-    # Última tentativa com inferência
-    mask_final = df['datetime'].isna()
-    if mask_final.any():
-        df.loc[mask_final, 'datetime'] = pd.to_datetime(
-            df.loc[mask_final, 'data_hora'],
+def converter_datas(serie):
+    """
+    Converte a coluna de data/hora detectada em datetime64.
+    Descobre em uma amostra quais de FORMATOS_DATA_HORA aparecem no arquivo e
+    converte a coluna inteira com eles, na ordem de prioridade; só as linhas que
+    sobrarem passam pela cadeia completa de formatos e pela inferência com dayfirst.
+    """
+    # Excel costuma entregar a coluna já como datetime: nada a converter
+    if pd.api.types.is_datetime64_dtype(serie):
+        return serie.astype('datetime64[ns]')
+
+    # Normaliza espaços
+    textos = _normalizar_espacos(serie)
+
+    resultado = np.full(len(textos), np.datetime64('NaT'), dtype='datetime64[ns]')
+    pendentes = np.flatnonzero(~pd.Series(textos).isin(_TEXTOS_DATA_VAZIA).to_numpy())
+
+    # Amostra espalhada pelo arquivo (abas/trechos diferentes podem mudar de formato)
+    amostra = pendentes
+    if len(amostra) > TAMANHO_AMOSTRA_DATAS:
+        amostra = amostra[np.linspace(0, len(amostra) - 1, TAMANHO_AMOSTRA_DATAS).astype(int)]
+
+    formatos_detectados = []
+    amostra_resultado = np.full(len(textos), np.datetime64('NaT'), dtype='datetime64[ns]')
+    for fmt in FORMATOS_DATA_HORA:
+        restante = _aplicar_formatos(textos, amostra, [fmt], amostra_resultado)
+        if len(restante) < len(amostra):
+            formatos_detectados.append(fmt)
+        amostra = restante
+
+    # Conversão da coluna inteira só com os formatos detectados
+    pendentes = _aplicar_formatos(textos, pendentes, formatos_detectados, resultado)
+
+    # Sobras: demais formatos e, por último, inferência
+    outros_formatos = [fmt for fmt in FORMATOS_DATA_HORA if fmt not in formatos_detectados]
+    pendentes = _aplicar_formatos(textos, pendentes, outros_formatos, resultado)
+    if len(pendentes) > 0:
+        resultado[pendentes] = pd.to_datetime(
+            pd.Series(textos[pendentes]),
             dayfirst=True,
             errors='coerce'
-        )
+        ).to_numpy(dtype='datetime64[ns]')
 
-    # Conta quantas datas foram convertidas
-    valid_dates = df['datetime'].notna().sum()
-    total_rows = len(df)
+    return pd.Series(resultado, index=serie.index)
 
 
-    if valid_dates == 0:
-        st.error("❌ DEBUG: NENHUMA data foi convertida com sucesso!")
-        return df
-
-    # Remove linhas sem data válida
-    df = df.dropna(subset=['datetime']).copy()
 
-    # --- DETECTAR TELEFONE ---
-    telefone_col_name = None
+TELEFONES_BLOQUEADOS = [
+    'sip:anonymous@anonymous.invalid',
+    'anonymous',
+    'blocked',
+    'bloqueado',
+    'privado',
+    'private',
+    'unknown',
+    'desconhecido'
+]
+TELEFONES_INVALIDOS = [
+    '2020159147',  # número que aparece incorretamente
+    '0000000000',
+    '1111111111',
+    '9999999999'
+]
+MIN_DIGITOS_TELEFONE = 8
 
-    # Primeiro procura por "ANI" (que é o nome no seu CSV)
-    if 'ANI' in df.columns:
-        telefone_col_name = 'ANI'
-    else:
-        telefone_keywords = ['telefone', 'phone', 'numero', 'número', 'fone', 'tel', 'ani']
-
-        for col in df.columns:
-            col_lower = str(col).lower().strip()
-            if any(k in col_lower for k in telefone_keywords):
-                telefone_col_name = col
-                break
 
-    if telefone_col_name:
+def sanitizar_telefones(serie):
+    """
+    Limpa a coluna de telefone em uma única passada vetorizada.
+    Retorna (telefones, mascaras): telefones é um array string[pyarrow] só com os dígitos
+    (zeros à esquerda preservados; '' nas linhas descartadas) e mascaras é um dict, na
+    ordem das etapas de limpeza, com as linhas a excluir em cada uma:
+    'bloqueados', 'invalidos', 'curtos' e 'repetidos'.
+    """
+    textos = pa.array(serie.astype(str).to_numpy(dtype=object), type=pa.string())
+
+    # Bloqueados: valores conhecidos, "sip:" ou "@"
+    bloqueados = pc.or_(
+        pc.is_in(pc.utf8_lower(textos), value_set=pa.array(TELEFONES_BLOQUEADOS)),
+        pc.match_substring_regex(textos, '(?i)sip:|@')
+    ).to_numpy(zero_copy_only=False)
+
+    # Só os dígitos
+    digitos = pc.replace_substring_regex(textos, '[^0-9]', '')
+    quantidade = pc.utf8_length(digitos)
+
+    invalidos = pc.is_in(digitos, value_set=pa.array(TELEFONES_INVALIDOS)).to_numpy(zero_copy_only=False)
+    curtos = pc.less(quantidade, MIN_DIGITOS_TELEFONE).to_numpy(zero_copy_only=False)
+
+    # Zeros ou um único dígito repetido: o primeiro dígito repetido no tamanho do número
+    repetido = pc.binary_repeat(pc.utf8_slice_codeunits(digitos, 0, 1), quantidade)
+    repetidos = ~curtos & pc.equal(repetido, digitos).to_numpy(zero_copy_only=False)
+
+    mascaras = {
+        'bloqueados': bloqueados,
+        'invalidos': invalidos,
+        'curtos': curtos,
+        'repetidos': repetidos,
+    }
+    excluir = bloqueados | invalidos | curtos | repetidos
+    telefones = pc.if_else(pa.array(excluir), '', digitos)
+    return pd.array(telefones, dtype='string[pyarrow]'), mascaras
 
-        # === NOVO: FILTRO PARA TELEFONES BLOQUEADOS ===
 
-        # 1. Remove linhas com telefones bloqueados (sip:anonymous, etc.)
-        telefones_bloqueados = [
-            'sip:anonymous@anonymous.invalid',
-            'anonymous',
-            'blocked',
-            'bloqueado',
-            'privado',
-            'private',
-            'unknown',
-            'desconhecido'
-        ]
+def codificar_telefones(telefones):
+    """
+    Guarda os telefones (texto só com dígitos) como categoria com as categorias em ordem
+    crescente: os códigos viram chaves inteiras na mesma ordem do texto (ver chaves_telefone).
+    """
+    codigos, categorias = pd.factorize(pd.Series(telefones).astype('string[pyarrow]'), sort=True)
+    return pd.Categorical.from_codes(codigos, dtype=pd.CategoricalDtype(categorias.astype('string[pyarrow]')))
 
-        # Cria máscara para identificar telefones bloqueados
-        mask_bloqueados = df[telefone_col_name].astype(str).str.lower().isin(telefones_bloqueados)
 
-        # Também verifica se contém "sip:" ou "@" (padrão de telefone bloqueado)
-        mask_sip = df[telefone_col_name].astype(str).str.contains('sip:', case=False, na=False)
-        mask_arroba = df[telefone_col_name].astype(str).str.contains('@', na=False)
+def chaves_telefone(df):
+    """
+    Chave inteira (int64) por linha para agrupar/comparar telefones, na mesma ordem do texto.
+    Usa os códigos da categoria quando as categorias estão ordenadas (compactar_chamadas).
+    """
+    telefones = df['telefone']
+    if isinstance(telefones.dtype, pd.CategoricalDtype) and telefones.cat.categories.is_monotonic_increasing:
+        return telefones.cat.codes.to_numpy().astype(np.int64)
+    return pd.factorize(telefones, sort=True)[0].astype(np.int64)
 
-        # Combina todas as máscaras
-        mask_total_bloqueados = mask_bloqueados | mask_sip | mask_arroba
 
-        linhas_bloqueadas = mask_total_bloqueados.sum()
-        if linhas_bloqueadas > 0:
-            st.warning(f"⚠️ DEBUG: Removendo {linhas_bloqueadas} linhas com telefones bloqueados")
-            df = df[~mask_total_bloqueados].copy()
+def formatar_telefone(telefones):
+    """
+    Converte os telefones em texto (só dígitos, zeros à esquerda preservados) para
+    exibição/exportação. Telefone ausente (sem coluna de telefone) vira string vazia.
+    """
+    telefones = pd.Series(telefones)
+    return telefones.astype(object).where(telefones.notna(), '').astype(str)
 
-        # 2. Limpa o telefone (remove tudo que não seja dígito)
-        df['telefone'] = df[telefone_col_name].astype(str).str.replace(r'[^\d]', '', regex=True)
 
-        # 3. Remove números específicos inválidos (como 2020159147)
-        numeros_invalidos = [
-            '2020159147',  # número que aparece incorretamente
-            '0000000000',
-            '1111111111',
-            '9999999999'
-        ]
+def _detectar_coluna_data(colunas):
+    """Coluna de data/hora, com prioridade para nomes exatos."""
+    # PASSO 1: Procurar por nomes EXATOS de colunas de data (prioridade máxima)
+    exact_datetime_names = ['Data', 'data', 'DATA', 'Date', 'date', 'Datetime', 'datetime']
 
-        mask_invalidos = df['telefone'].isin(numeros_invalidos)
-        linhas_invalidas = mask_invalidos.sum()
-        if linhas_invalidas > 0:
-            df = df[~mask_invalidos].copy()
+    for exact_name in exact_datetime_names:
+        if exact_name in colunas:
+            return exact_name
 
-        # 4. Mantém apenas telefones com 8 ou mais dígitos
-        before_filter = len(df)
-        df = df[df['telefone'].str.len() >= 8].copy()
-        after_filter = len(df)
+    # PASSO 2: Se não encontrou, procura por palavras-chave genéricas
+    datetime_keywords = ['hora', 'time', 'timestamp', 'dt']
 
-        if before_filter != after_filter:
-            st.warning(f"⚠️ DEBUG: {before_filter - after_filter} linhas removidas por telefone inválido (< 8 dígitos)")
+    for col in colunas:
+        col_lower = str(col).lower().strip()
+        # Ignora colunas que contenham "parcial" ou "carimbo" (são metadados)
+        if 'parcial' in col_lower or 'carimbo' in col_lower:
+            continue
+        if any(k in col_lower for k in datetime_keywords):
+            return col
+    return None
 
-        # 5. Remove telefones que são apenas zeros ou apenas um dígito repetido
-        mask_zeros = df['telefone'].str.match(r'^0+$')
-        mask_repetidos = df['telefone'].apply(lambda x: len(set(x)) == 1 if len(x) > 0 else False)
 
-        mask_padroes_invalidos = mask_zeros | mask_repetidos
-        linhas_padroes = mask_padroes_invalidos.sum()
-        if linhas_padroes > 0:
-            st.warning(f"⚠️ DEBUG: Removendo {linhas_padroes} linhas com padrões inválidos (zeros, repetições)")
-            df = df[~mask_padroes_invalidos].copy()
+def _detectar_coluna_telefone(colunas):
+    """Coluna de telefone ("ANI" no export do Genesys)."""
+    if 'ANI' in colunas:
+        return 'ANI'
 
+    telefone_keywords = ['telefone', 'phone', 'numero', 'número', 'fone', 'tel', 'ani']
 
-    else:
-        st.warning("⚠️ DEBUG: Nenhuma coluna de telefone detectada")
-        df['telefone'] = ''
+    for col in colunas:
+        col_lower = str(col).lower().strip()
+        if any(k in col_lower for k in telefone_keywords):
+            return col
+    return None
 
-        # --- DETECTAR DURAÇÃO ---
-    duracao_col_name = None
 
-    # Procura por "Duração" ou variações
+def _detectar_coluna_duracao(colunas):
+    """Coluna de duração ("Duração" ou variações, inclusive com encoding quebrado)."""
     duracao_keywords = ['duracao', 'duração', 'duration', 'tempo', 'tma']
 
-    for col in df.columns:
-        col_lower = str(col).lower().strip()
+    # Normaliza caracteres com encoding incorreto
+    replacements = {
+        'ã': 'a', 'Ã': 'a', 'á': 'a', 'à': 'a', 'â': 'a',
+        'é': 'e', 'ê': 'e', 'è': 'e',
+        'í': 'i', 'ì': 'i', 'î': 'i',
+        'ó': 'o', 'ô': 'o', 'õ': 'o', 'ò': 'o',
+        'ú': 'u', 'ù': 'u', 'û': 'u',
+        'ç': 'c', '§': 'c',
+        'ñ': 'n'
+    }
 
-        # === CORREÇÃO: Normalização COMPLETA de caracteres especiais ===
-        # Remove acentos e caracteres HTML
-        import unicodedata
+    for col in colunas:
+        col_lower = str(col).lower().strip()
 
         # Remove entidades HTML como &nbsp;
         col_normalized = col_lower.replace('&nbsp;', '').replace('&', '').replace('<', '').replace('>', '')
 
-        # Normaliza caracteres com encoding incorreto
-        replacements = {
-            'ã': 'a', 'Ã': 'a', 'á': 'a', 'à': 'a', 'â': 'a',
-            'é': 'e', 'ê': 'e', 'è': 'e',
-            'í': 'i', 'ì': 'i', 'î': 'i',
-            'ó': 'o', 'ô': 'o', 'õ': 'o', 'ò': 'o',
-            'ú': 'u', 'ù': 'u', 'û': 'u',
-            'ç': 'c', '§': 'c',
-            'ñ': 'n'
-        }
-
         for old_char, new_char in replacements.items():
             col_normalized = col_normalized.replace(old_char, new_char)
 
         # Remove qualquer caractere não-ASCII restante
         col_normalized = ''.join(char for char in col_normalized if ord(char) < 128)
 
-
         # Verifica se alguma palavra-chave está na coluna normalizada
         if any(k in col_normalized for k in duracao_keywords):
-            duracao_col_name = col
-            break
+            return col
+    return None
 
-    if duracao_col_name:
 
-        # Aplica a conversão
-        df['duracao_segundos'] = df[duracao_col_name].apply(
-            lambda x: convert_duration_to_seconds(x) if pd.notna(x) else 0
-        )
+def _detectar_coluna_id_conversa(colunas):
+    """Coluna de ID de conversa ("ID de conversa" no export do Genesys)."""
+    if 'ID de conversa' in colunas:
+        return 'ID de conversa'
 
+    id_conversa_keywords = ['id', 'conversa', 'protocolo', 'ticket', 'call_id']
 
-        # === DEBUG: Estatísticas da duração ===
-        total_segundos = df['duracao_segundos'].sum()
-        media_segundos = df['duracao_segundos'].mean()
-        zeros_count = (df['duracao_segundos'] == 0).sum()
+    for col in colunas:
+        col_lower = str(col).lower().strip()
+        if any(k in col_lower for k in id_conversa_keywords):
+            return col
+    return None
 
 
-        if zeros_count > 0:
+def detectar_colunas_chamadas(colunas):
+    """
+    Detecta, só pelo cabeçalho, as colunas de origem do arquivo de chamadas.
+    Retorna dict com 'datetime', 'telefone', 'duracao' e 'id_conversa' (None se ausente).
+    """
+    colunas = [col for col in colunas if not str(col).startswith('Unnamed')]
+    return {
+        'datetime': _detectar_coluna_data(colunas),
+        'telefone': _detectar_coluna_telefone(colunas),
+        'duracao': _detectar_coluna_duracao(colunas),
+        'id_conversa': _detectar_coluna_id_conversa(colunas),
+    }
 
-            # Mostra alguns exemplos de valores que ficaram zerados
-            exemplos_zero = df[df['duracao_segundos'] == 0][duracao_col_name].head(5).tolist()
-            
-    else:
-        st.warning("⚠️ DEBUG: Nenhuma coluna de duração detectada")
-        df['duracao_segundos'] = 0
 
+def normalizar_chamadas(df, colunas):
+    """
+    Cria 'datetime', 'telefone', 'duracao_segundos' e 'ID_Conversa' a partir das colunas
+    detectadas (detectar_colunas_chamadas) e descarta, em um único filtro, as linhas sem
+    data válida ou com telefone bloqueado/inválido.
+    Não exibe mensagens: retorna (df, contagens) para quem chamou.
+    """
+    contagens = dict.fromkeys(['linhas', 'datas_validas', 'bloqueados', 'invalidos', 'curtos', 'repetidos'], 0)
+    contagens['linhas'] = len(df)
+
+    datas = converter_datas(df[colunas['datetime']])
 
+    # Linhas sem data válida são descartadas no filtro único abaixo
+    mask_manter = datas.notna().to_numpy()
+    contagens['datas_validas'] = int(np.count_nonzero(mask_manter))
 
-    # --- DETECTAR ID DE CONVERSA ---
-    id_conversa_col_name = None
+    if colunas['telefone']:
+        telefones, mascaras = sanitizar_telefones(df[colunas['telefone']])
 
-    # Primeiro procura por "ID de conversa" (que é o nome no seu CSV)
-    if 'ID de conversa' in df.columns:
-        id_conversa_col_name = 'ID de conversa'
+        # As contagens seguem a ordem das etapas de limpeza, sobre as linhas com data válida
+        for etapa, mascara in mascaras.items():
+            contagens[etapa] = int(np.count_nonzero(mask_manter & mascara))
+            mask_manter = mask_manter & ~mascara
     else:
-        id_conversa_keywords = ['id', 'conversa', 'protocolo', 'ticket', 'call_id']
+        telefones = pd.array([''] * len(df), dtype='string[pyarrow]')
 
-        for col in df.columns:
-            col_lower = str(col).lower().strip()
-            if any(k in col_lower for k in id_conversa_keywords):
-                id_conversa_col_name = col
-                break
+    df = df[mask_manter]
+    df['datetime'] = datas[mask_manter]
+    df['telefone'] = telefones[mask_manter]
+
+    if colunas['duracao']:
+        df['duracao_segundos'] = converter_duracoes_para_segundos(df[colunas['duracao']])
+    else:
+        df['duracao_segundos'] = 0
 
-    if id_conversa_col_name:
-        df['ID_Conversa'] = df[id_conversa_col_name].astype(str)
+    if colunas['id_conversa']:
+        df['ID_Conversa'] = df[colunas['id_conversa']].astype(str)
     else:
         df['ID_Conversa'] = (
             df.index.astype(str) + '_' +
             df['datetime'].dt.strftime('%Y%m%d%H%M%S').fillna('NA')
         )
 
+    return df, contagens
+
+
+def _registrar_contagens_chamadas(colunas, contagens):
+    """Registra no log o diagnóstico do processamento do arquivo de chamadas."""
+    logger.info(f"🔍 DEBUG: Total de linhas no CSV: {contagens['linhas']}")
+
+    if not colunas['datetime']:
+        logger.error("❌ DEBUG: Nenhuma coluna de data/hora foi detectada!")
+        return
+
+    if contagens['datas_validas'] == 0:
+        logger.error("❌ DEBUG: NENHUMA data foi convertida com sucesso!")
+        return
+
+    if colunas['telefone']:
+        if contagens['bloqueados'] > 0:
+            logger.warning(f"⚠️ DEBUG: Removendo {contagens['bloqueados']} linhas com telefones bloqueados")
+        if contagens['curtos'] > 0:
+            logger.warning(f"⚠️ DEBUG: {contagens['curtos']} linhas removidas por telefone inválido (< 8 dígitos)")
+        if contagens['repetidos'] > 0:
+            logger.warning(f"⚠️ DEBUG: Removendo {contagens['repetidos']} linhas com padrões inválidos (zeros, repetições)")
+    else:
+        logger.warning("⚠️ DEBUG: Nenhuma coluna de telefone detectada")
+
+    if not colunas['duracao']:
+        logger.warning("⚠️ DEBUG: Nenhuma coluna de duração detectada")
+
+
+def process_dataframe_chamadas(df):
+    """
+    Processa DataFrame de CHAMADAS.
+    Garante que 'datetime', 'telefone', 'duracao_segundos' e 'ID_Conversa' existam.
+    EXCLUI telefones bloqueados e inválidos.
+    """
+    # Remove colunas Unnamed
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed', na=False)]
+
+    colunas = detectar_colunas_chamadas(df.columns)
+
+    if not colunas['datetime']:
+        _registrar_contagens_chamadas(colunas, {'linhas': len(df)})
+        df['datetime'] = pd.NaT
+        return df
+
+    df, contagens = normalizar_chamadas(df, colunas)
+    _registrar_contagens_chamadas(colunas, contagens)
+
     df = df.sort_values(['telefone', 'datetime']).reset_index(drop=True)
 
     return df
 
 
+COLUNAS_PADRONIZADAS_CHAMADAS = ['datetime', 'telefone', 'duracao_segundos', 'ID_Conversa']
+LIMITE_CARDINALIDADE_CATEGORIA = 0.5  # fração máxima de valores distintos para texto virar category
+TAMANHO_AMOSTRA_CARDINALIDADE = 100_000
+
+
+def _memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+def compactar_chamadas(df):
+    """
+    Reduz a memória do DataFrame de chamadas já padronizado:
+    - mantém só as colunas padronizadas (as de origem já foram convertidas e nenhuma aba as lê);
+    - converte ID_Conversa em códigos de um dicionário de IDs (codificar_ids);
+    - converte telefone em category com as categorias ordenadas (codificar_telefones);
+    - converte colunas texto de baixa cardinalidade em category;
+    - reduz duracao_segundos para int32 quando os valores cabem.
+    O relatório de memória (antes/depois) fica em df.attrs['memoria'].
+    """
+    memoria_antes = _memoria_mb(df)
+    attrs = dict(df.attrs)
+
+    colunas_removidas = [col for col in df.columns if col not in COLUNAS_PADRONIZADAS_CHAMADAS]
+    df = df.drop(columns=colunas_removidas)
+
+    # IDs de conversa: quase todos distintos, mas viram códigos inteiros de um dicionário
+    # compartilhado pelos recortes de período, pelas rechamadas e pelos cruzamentos
+    colunas_categoricas = []
+    if 'ID_Conversa' in df.columns:
+        df['ID_Conversa'] = codificar_ids(df['ID_Conversa'])
+        colunas_categoricas.append('ID_Conversa')
+    if 'telefone' in df.columns:
+        df['telefone'] = codificar_telefones(df['telefone'])
+        colunas_categoricas.append('telefone')
+
+    for col in df.columns[df.dtypes == object]:
+        # Amostra primeiro: evita o nunique completo em colunas quase únicas (ID_Conversa)
+        amostra = df[col].iloc[:TAMANHO_AMOSTRA_CARDINALIDADE]
+        if amostra.nunique() > LIMITE_CARDINALIDADE_CATEGORIA * len(amostra):
+            continue
+        if df[col].nunique() <= LIMITE_CARDINALIDADE_CATEGORIA * len(df):
+            df[col] = df[col].astype('category')
+            colunas_categoricas.append(col)
+
+    duracao = df['duracao_segundos']
+    if (
+        pd.api.types.is_integer_dtype(duracao) and len(duracao) > 0 and
+        duracao.min() >= np.iinfo(np.int32).min and duracao.max() <= np.iinfo(np.int32).max
+    ):
+        df['duracao_segundos'] = duracao.astype(np.int32)
+
+    df.attrs = attrs
+    df.attrs['memoria'] = {
+        'antes_mb': round(memoria_antes, 1),
+        'depois_mb': round(_memoria_mb(df), 1),
+        'colunas_removidas': colunas_removidas,
+        'colunas_categoricas': colunas_categoricas,
+    }
+    return df
+
+
 # --- FUNÇÕES DE ANÁLISE DE RECHAMADAS ---
 
+FAIXAS_RECHAMADA = ['0-24h', '24-48h', '48-72h', 'mais_72h']
+LIMITES_FAIXAS_HORAS = np.array([24, 48, 72])
+
+
+def _ordenar_por_telefone(df):
+    """
+    Ordem (iloc) das ligações por telefone/datetime e os arrays já nessa ordem.
+    Retorna (ordem, telefones, datas, inicio_grupo), com inicio_grupo marcando a
+    primeira ligação de cada telefone.
+    """
+    telefones = chaves_telefone(df)
+    datas = df['datetime'].to_numpy(dtype='datetime64[ns]')
+
+    # process_dataframe_chamadas já entrega o DataFrame ordenado por telefone/datetime;
+    # só reordena (de forma estável) se receber algo fora dessa ordem
+    mesmo_telefone = telefones[1:] == telefones[:-1]
+    ordenado = (
+        not np.any(telefones[1:] < telefones[:-1]) and
+        not np.any(mesmo_telefone & (datas[1:] < datas[:-1]))
+    )
+    if ordenado:
+        ordem = np.arange(len(df))
+    else:
+        # NaT vai para o fim de cada telefone, como no sort_values
+        ordem = np.lexsort((datas, np.isnat(datas), telefones))
+        telefones = telefones[ordem]
+        datas = datas[ordem]
+        mesmo_telefone = telefones[1:] == telefones[:-1]
+
+    inicio_grupo = np.concatenate(([True], ~mesmo_telefone)) if len(ordem) else np.zeros(0, dtype=bool)
+    return ordem, telefones, datas, inicio_grupo
+
+
+def _pares_rechamada(df):
+    """
+    Núcleo vetorizado da detecção de rechamadas.
+    Para cada ligação calcula, em uma única passada sobre os arrays, a diferença
+    em horas para a PRIMEIRA ligação do mesmo telefone e a faixa correspondente.
+    Retorna (pos_primeira, pos_segunda, diferenca_horas, codigo_faixa), com as
+    posições (iloc) das ligações em df e o código da faixa em FAIXAS_RECHAMADA.
+    """
+    ordem, _, datas, inicio_grupo = _ordenar_por_telefone(df)
+
+    # Posição da primeira ligação do telefone de cada linha
+    inicios = np.flatnonzero(inicio_grupo)
+    primeira = inicios[np.cumsum(inicio_grupo) - 1]
+
+    # Diferença em horas entre cada ligação e a PRIMEIRA ligação do telefone
+    diferenca_horas = (datas - datas[primeira]) / np.timedelta64(1, 'h')
+
+    # A primeira ligação nunca é rechamada, nem ligações no mesmo instante dela
+    rechamada = ~inicio_grupo & ~(diferenca_horas <= 0)
+    pos_segunda = np.flatnonzero(rechamada)
+    pos_primeira = primeira[pos_segunda]
+    diferenca_horas = diferenca_horas[pos_segunda]
+
+    # Faixas fechadas à direita: (0, 24], (24, 48], (48, 72], > 72
+    codigo_faixa = np.searchsorted(LIMITES_FAIXAS_HORAS, diferenca_horas, side='left')
+
+    return ordem[pos_primeira], ordem[pos_segunda], diferenca_horas, codigo_faixa
+
+
+class TabelaRechamadas:
+    """
+    Resultado colunar de identificar_faixas_rechamada.
+    Guarda apenas as posições (int32) da primeira ligação e da rechamada em
+    df_chamadas, a diferença em horas e a faixa (categórica). As linhas ficam
+    ordenadas por faixa, então cada faixa é uma fatia (view) dos arrays.
+    """
+
+    def __init__(self, df_chamadas, pos_primeira, pos_segunda, diferenca_horas, codigo_faixa):
+        codigo_faixa = np.asarray(codigo_faixa, dtype=np.int8)
+        ordem = np.argsort(codigo_faixa, kind='stable')
+
+        self._definir(
+            df_chamadas,
+            np.asarray(pos_primeira, dtype=np.int32)[ordem],
+            np.asarray(pos_segunda, dtype=np.int32)[ordem],
+            np.asarray(diferenca_horas, dtype=np.float64)[ordem],
+            codigo_faixa[ordem]
+        )
+
+    def _definir(self, df_chamadas, pos_primeira, pos_segunda, diferenca_horas, codigo_faixa):
+        """Atribui arrays já ordenados por faixa (sem copiar)."""
+        self.df_chamadas = df_chamadas
+        self._ordem_segunda = None  # argsort de pos_segunda, criado na primeira consulta por ligação
+        self.pos_primeira = pos_primeira
+        self.pos_segunda = pos_segunda
+        self.diferenca_horas = diferenca_horas
+        self.faixa = pd.Categorical.from_codes(codigo_faixa, categories=FAIXAS_RECHAMADA)
+
+        # Limites [inicio, fim) de cada faixa dentro dos arrays
+        self._limites = np.searchsorted(codigo_faixa, np.arange(len(FAIXAS_RECHAMADA) + 1))
+
+    def __len__(self):
+        return len(self.pos_segunda)
+
+    @property
+    def nbytes(self):
+        """Memória dos arrays próprios (um df_chamadas recortado por período é contado pelo pipeline)."""
+        return (
+            self.pos_primeira.nbytes + self.pos_segunda.nbytes
+            + self.diferenca_horas.nbytes + self.faixa.codes.nbytes
+            + (self._ordem_segunda.nbytes if self._ordem_segunda is not None else 0)
+        )
+
+    def contagem(self):
+        """Quantidade de rechamadas por faixa."""
+        return dict(zip(FAIXAS_RECHAMADA, np.diff(self._limites).tolist()))
+
+    def por_faixa(self, *faixas):
+        """Retorna só as rechamadas das faixas indicadas (faixa única = view sem cópia)."""
+        codigos = sorted(FAIXAS_RECHAMADA.index(f) for f in set(faixas))
+        fatias = [slice(self._limites[c], self._limites[c + 1]) for c in codigos]
+
+        def juntar(array):
+            if not fatias:
+                return array[:0]
+            if len(fatias) == 1:
+                return array[fatias[0]]
+            return np.concatenate([array[f] for f in fatias])
+
+        sub = TabelaRechamadas.__new__(TabelaRechamadas)
+        sub._definir(
+            self.df_chamadas,
+            juntar(self.pos_primeira),
+            juntar(self.pos_segunda),
+            juntar(self.diferenca_horas),
+            juntar(self.faixa.codes)
+        )
+        return sub
+
+    def das_ligacoes(self, posicoes):
+        """
+        Só as rechamadas cuja segunda ligação está em posicoes (iloc em df_chamadas).
+        A ordenação de pos_segunda é feita na primeira consulta e reaproveitada nas demais.
+        """
+        if self._ordem_segunda is None:
+            self._ordem_segunda = np.argsort(self.pos_segunda, kind='stable')
+        segunda_ordenada = self.pos_segunda[self._ordem_segunda]
+
+        posicoes = np.asarray(posicoes)
+        inicio = np.searchsorted(segunda_ordenada, posicoes, side='left')
+        fim = np.searchsorted(segunda_ordenada, posicoes, side='right')
+        linhas = np.sort(np.concatenate(
+            [self._ordem_segunda[a:b] for a, b in zip(inicio, fim)] or [np.array([], dtype=np.int64)]
+        ))
+
+        sub = TabelaRechamadas.__new__(TabelaRechamadas)
+        sub._definir(
+            self.df_chamadas,
+            self.pos_primeira[linhas],
+            self.pos_segunda[linhas],
+            self.diferenca_horas[linhas],
+            self.faixa.codes[linhas]
+        )
+        return sub
+
+    def telefones(self, faixas=None):
+        """Telefones distintos que tiveram rechamada (opcionalmente só nas faixas indicadas)."""
+        tabela = self if faixas is None else self.por_faixa(*faixas)
+        return pd.unique(np.asarray(self.df_chamadas['telefone'].array.take(tabela.pos_segunda), dtype=object))
+
+    def para_dataframe(self, colunas=None):
+        """
+        Materializa o detalhe das rechamadas (uma linha por par primeira+rechamada).
+        Se colunas for informado, monta apenas essas colunas, na ordem pedida.
+        """
+        df = self.df_chamadas
+
+        def duracao(pos):
+            if 'duracao_segundos' in df.columns:
+                return df['duracao_segundos'].to_numpy()[pos]
+            return np.zeros(len(pos))
+
+        construtores = {
+            'telefone': lambda: df['telefone'].array.take(self.pos_segunda),
+            'primeira_ligacao': lambda: df['datetime'].to_numpy()[self.pos_primeira],
+            'segunda_ligacao': lambda: df['datetime'].to_numpy()[self.pos_segunda],
+            'diferenca_horas': lambda: self.diferenca_horas,
+            'duracao_primeira_seg': lambda: duracao(self.pos_primeira),
+            'duracao_segunda_seg': lambda: duracao(self.pos_segunda),
+            # Com ID_Conversa em category, as cópias levam só os códigos
+            'ID_Conversa_Primeira': lambda: df['ID_Conversa'].array.take(self.pos_primeira),
+            'ID_Conversa_Segunda': lambda: df['ID_Conversa'].array.take(self.pos_segunda),
+            'periodo_rechamada': lambda: self.faixa,
+        }
+        if colunas is None:
+            colunas = list(construtores)
+
+        return pd.DataFrame({col: construtores[col]() for col in colunas})
+
+
 def identificar_faixas_rechamada(df):
     """
     Identifica rechamadas em faixas de 0-24h, 24-48h, 48-72h.
     Cada rechamada é comparada com a PRIMEIRA ligação do telefone.
     A primeira ligação nunca é considerada rechamada.
+    Retorna uma TabelaRechamadas com posições das ligações em df.
     """
-    rechamadas = {'0-24h': [], '24-48h': [], '48-72h': [], 'mais_72h': []}
+    vazio = np.array([], dtype=np.int32)
 
     if 'telefone' not in df.columns or 'datetime' not in df.columns or 'ID_Conversa' not in df.columns:
-        return rechamadas
+        return TabelaRechamadas(df, vazio, vazio, vazio, vazio)
 
-    for telefone, grupo in df.groupby('telefone'):
-        grupo = grupo.sort_values('datetime')
+    if df.empty:
+        return TabelaRechamadas(df, vazio, vazio, vazio, vazio)
 
-        # Se tiver menos de 2 ligações, não há rechamada
-        if len(grupo) < 2:
-            continue
+    pos_primeira, pos_segunda, diferenca_horas, codigo_faixa = _pares_rechamada(df)
+
+    return TabelaRechamadas(df, pos_primeira, pos_segunda, diferenca_horas, codigo_faixa)
+
+
+class IndiceDatas:
+    """
+    Posições (iloc) de df_chamadas em ordem de datetime. Um período vira duas buscas
+    binárias em datas e uma fatia de ordem, sem máscara sobre o DataFrame inteiro.
+    """
+
+    def __init__(self, df_chamadas):
+        datas = df_chamadas['datetime'].to_numpy(dtype='datetime64[ns]')
+        self.ordem = np.argsort(datas, kind='stable')
+        self.datas = datas[self.ordem]
+
+    def __len__(self):
+        return len(self.datas)
+
+    @property
+    def nbytes(self):
+        return self.ordem.nbytes + self.datas.nbytes
+
+    def limites(self):
+        """(primeira, última) data/hora do arquivo."""
+        return pd.Timestamp(self.datas[0]), pd.Timestamp(self.datas[-1])
+
+    def posicoes(self, inicio, fim):
+        """Posições das ligações em [inicio, fim), na ordem original de df_chamadas."""
+        limites = np.array([pd.Timestamp(inicio).to_datetime64(), pd.Timestamp(fim).to_datetime64()], dtype='datetime64[ns]')
+        a, b = np.searchsorted(self.datas, limites, side='left')
+        return np.sort(self.ordem[a:b])
+
+
+def indexar_datas(df):
+    """Constrói o IndiceDatas de df_chamadas."""
+    return IndiceDatas(df)
+
+
+def fatiar_periodo(df, indice_datas, inicio, fim):
+    """
+    Ligações de df em [inicio, fim), mantendo a ordem por telefone/datetime.
+    Se o período cobre o arquivo inteiro devolve o próprio df (mesma impressão).
+    O recorte recebe uma impressão derivada da original e do período, para a memória
+    de resultados do pipeline distinguir um período do outro.
+    """
+    posicoes = indice_datas.posicoes(inicio, fim)
+    if len(posicoes) == len(df):
+        return df
 
-        # Pega os dados ordenados
-        ids_conversa = grupo['ID_Conversa'].values
-        datas = grupo['datetime'].values
+    recorte = df.take(posicoes).reset_index(drop=True)
+    recorte.attrs = dict(df.attrs)
+    recorte.attrs['periodo'] = (pd.Timestamp(inicio), pd.Timestamp(fim))
+    if df.attrs.get('impressao'):
+        recorte.attrs['impressao'] = hashlib.sha256(
+            f"{df.attrs['impressao']}|{pd.Timestamp(inicio)}|{pd.Timestamp(fim)}".encode('utf-8')
+        ).hexdigest()
+    return recorte
 
-        # Verifica se há coluna de duração
-        if 'duracao_segundos' in df.columns:
-            duras = grupo['duracao_segundos'].values
+
+# Faixas de quantidade de ligações por telefone: cada faixa começa no limite correspondente
+FAIXAS_LIGACOES = ['1 ligação', '2-5 ligações', '6-10 ligações', '11-20 ligações', '21-50 ligações', 'Mais de 50 ligações']
+LIMITES_FAIXAS_LIGACOES = np.array([1, 2, 6, 11, 21, 51])
+
+
+class IndiceTelefones:
+    """
+    Agregados por telefone de df_chamadas, calculados uma vez por dataset e lidos pelas
+    análises de rechamadas, motivos e mailing. Cada array tem um elemento por telefone
+    (ordem crescente de telefone); linha_grupo liga cada linha de df_chamadas ao seu
+    telefone no índice. As ligações de um telefone são ordem[inicio:inicio + quantidade]
+    (posições em df_chamadas, por data), localizadas por busca binária em telefone.
+    """
+
+    def __init__(self, df_chamadas):
+        self.df_chamadas = df_chamadas
+        ordem, telefones, datas, inicio_grupo = _ordenar_por_telefone(df_chamadas)
+
+        inicios = np.flatnonzero(inicio_grupo)
+        fins = np.append(inicios[1:], len(ordem)) if len(inicios) else inicios
+
+        if 'duracao_segundos' in df_chamadas.columns:
+            duracoes = df_chamadas['duracao_segundos'].to_numpy(dtype=np.float64)[ordem]
+        else:
+            duracoes = np.zeros(len(ordem))
+
+        self.ordem = ordem
+        self.inicio = inicios
+        # Telefones (só dígitos) em ordem crescente, para a busca binária de localizar
+        self.telefone = np.asarray(df_chamadas['telefone'].array.take(ordem[inicios]), dtype=object)
+        self.quantidade = fins - inicios
+        self.primeira_ligacao = datas[inicios]
+        self.ultima_ligacao = datas[fins - 1]
+        self.pos_primeira = ordem[inicios]
+
+        # Soma ignora durações nulas e o máximo também (como no groupby)
+        if len(inicios):
+            self.duracao_total = np.add.reduceat(np.nan_to_num(duracoes), inicios)
+            self.duracao_maxima = np.fmax.reduceat(duracoes, inicios)
         else:
-            duras = np.zeros(len(grupo))
+            self.duracao_total = np.array([], dtype=np.float64)
+            self.duracao_maxima = np.array([], dtype=np.float64)
+
+        self.linha_grupo = np.empty(len(ordem), dtype=np.int64)
+        self.linha_grupo[ordem] = np.cumsum(inicio_grupo) - 1
+
+    def __len__(self):
+        return len(self.telefone)
+
+    @property
+    def nbytes(self):
+        """Memória dos arrays próprios (um df_chamadas recortado por período é contado pelo pipeline)."""
+        return sum(
+            getattr(self, nome).nbytes for nome in [
+                'ordem', 'inicio', 'telefone', 'quantidade', 'primeira_ligacao', 'ultima_ligacao',
+                'pos_primeira', 'duracao_total', 'duracao_maxima', 'linha_grupo'
+            ]
+        )
 
-        # === CORREÇÃO: Todas as rechamadas são comparadas com a PRIMEIRA ligação (i=0) ===
-        primeira_data = datas[0]
-        primeira_id = ids_conversa[0]
-        primeira_duracao = duras[0]
+    def localizar(self, telefone):
+        """Posição do telefone no índice (busca binária) ou None se ele não tiver ligações."""
+        i = int(np.searchsorted(self.telefone, telefone))
+        if i < len(self.telefone) and self.telefone[i] == telefone:
+            return i
+        return None
 
-        # Começa da segunda ligação (i=1) e compara SEMPRE com a primeira (i=0)
-        for i in range(1, len(datas)):
-            # Calcula diferença em horas entre ligação atual e a PRIMEIRA
-            diff_h = (datas[i] - primeira_data) / np.timedelta64(1, 'h')
+    def posicoes(self, telefone):
+        """Posições (iloc) das ligações do telefone em df_chamadas, em ordem de data."""
+        i = self.localizar(telefone)
+        if i is None:
+            return self.ordem[:0]
+        return self.ordem[self.inicio[i]:self.inicio[i] + self.quantidade[i]]
 
-            if diff_h <= 0:
-                continue
+    def contagem(self):
+        """Quantidade de ligações por telefone (como groupby('telefone').size())."""
+        return pd.Series(self.quantidade, index=pd.Index(self.telefone, name='telefone'))
 
-            rec = {
-                'telefone': telefone,
-                'primeira_ligacao': pd.to_datetime(primeira_data),      # SEMPRE a primeira ligação
-                'segunda_ligacao': pd.to_datetime(datas[i]),           # Ligação atual (rechamada)
-                'diferenca_horas': float(diff_h),
-                'duracao_primeira_seg': primeira_duracao,              # SEMPRE duração da primeira
-                'duracao_segunda_seg': duras[i],                       # Duração da ligação atual
-                'ID_Conversa_Primeira': primeira_id,                   # SEMPRE ID da primeira
-                'ID_Conversa_Segunda': ids_conversa[i]                 # ID da ligação atual
-            }
+    def faixas(self):
+        """Quantidade de telefones em cada faixa de FAIXAS_LIGACOES (um único bincount)."""
+        codigo = np.searchsorted(LIMITES_FAIXAS_LIGACOES, self.quantidade, side='right') - 1
+        return dict(zip(FAIXAS_LIGACOES, np.bincount(codigo, minlength=len(FAIXAS_LIGACOES)).tolist()))
 
-            # Classifica por faixa de tempo
-            if diff_h <= 24:
-                rechamadas['0-24h'].append(rec)
-            elif 24 < diff_h <= 48:
-                rechamadas['24-48h'].append(rec)
-            elif 48 < diff_h <= 72:
-                rechamadas['48-72h'].append(rec)
-            else:
-                rechamadas['mais_72h'].append(rec)
+    def por_linha(self, valores):
+        """Espalha um valor por telefone para as linhas de df_chamadas."""
+        return np.asarray(valores)[self.linha_grupo]
+
+    def primeira_por_linha(self):
+        """Máscara das linhas de df_chamadas que são a primeira ligação do telefone."""
+        mascara = np.zeros(len(self.linha_grupo), dtype=bool)
+        mascara[self.pos_primeira] = True
+        return mascara
 
-    return rechamadas
 
+def indexar_telefones(df):
+    """Constrói o IndiceTelefones de df_chamadas."""
+    return IndiceTelefones(df)
 
-def faixas_ligacoes_e_reincidentes(df):
-    """Calcula a contagem de ligações por telefone e as faixas de reincidência."""
+
+def faixas_ligacoes_e_reincidentes(df, indice=None):
+    """
+    Calcula a contagem de ligações por telefone e as faixas de reincidência.
+    indice: IndiceTelefones de df, se já construído.
+    """
     if 'telefone' not in df.columns:
         return {}, 0, pd.Series()
 
-    contagem_por_telefone = df.groupby("telefone").size()
-    faixas = {
-        '1 ligação': len(contagem_por_telefone[contagem_por_telefone == 1]),
-        '2-5 ligações': len(contagem_por_telefone[(contagem_por_telefone >= 2) & (contagem_por_telefone <= 5)]),
-        '6-10 ligações': len(contagem_por_telefone[(contagem_por_telefone >= 6) & (contagem_por_telefone <= 10)]),
-        '11-20 ligações': len(contagem_por_telefone[(contagem_por_telefone >= 11) & (contagem_por_telefone <= 20)]),
-        '21-50 ligações': len(contagem_por_telefone[(contagem_por_telefone >= 21) & (contagem_por_telefone <= 50)]),
-        'Mais de 50 ligações': len(contagem_por_telefone[contagem_por_telefone > 50])
-    }
-    telefones_ligaram_mais_de_uma_vez = len(contagem_por_telefone[contagem_por_telefone > 1])
-    return faixas, telefones_ligaram_mais_de_uma_vez, contagem_por_telefone
+    if indice is None:
+        indice = indexar_telefones(df)
+
+    faixas = indice.faixas()
+    telefones_ligaram_mais_de_uma_vez = int(np.count_nonzero(indice.quantidade > 1))
+    return faixas, telefones_ligaram_mais_de_uma_vez, indice.contagem()
 
 def calcular_impacto_financeiro(rechamadas, valor_ligacao=7.56):
     """Calcula o impacto financeiro das rechamadas."""
+    contagem = rechamadas.contagem()
     impacto_por_faixa = {
-        '0-24h': len(rechamadas.get('0-24h', [])) * valor_ligacao,
-        '24-48h': len(rechamadas.get('24-48h', [])) * valor_ligacao,
-        '48-72h': len(rechamadas.get('48-72h', [])) * valor_ligacao,
+        '0-24h': contagem['0-24h'] * valor_ligacao,
+        '24-48h': contagem['24-48h'] * valor_ligacao,
+        '48-72h': contagem['48-72h'] * valor_ligacao,
         'mais_72h': 0
     }
-    total_religacoes_com_impacto = sum(len(rechamadas.get(k, [])) for k in ['0-24h', '24-48h', '48-72h'])
+    total_religacoes_com_impacto = sum(contagem[k] for k in ['0-24h', '24-48h', '48-72h'])
     return total_religacoes_com_impacto * valor_ligacao
 
-def analisar_motivos_rechamadas(df_chamadas, rechamadas_detalhe, df_target, id_coluna_target, colunas_retorno):
+def _expandir(inicio, quantidade):
+    """
+    Expande intervalos [inicio, inicio + quantidade) em posições, em ordem.
+    Retorna (pos_intervalo, posicoes): posicoes[i] pertence ao intervalo pos_intervalo[i].
+    """
+    deslocamento = np.arange(quantidade.sum()) - np.repeat(np.cumsum(quantidade) - quantidade, quantidade)
+    return np.repeat(np.arange(len(quantidade)), quantidade), np.repeat(inicio, quantidade) + deslocamento
+
+
+class IndiceIds:
+    """
+    Índice de uma coluna de ID de conversa, com o texto sem espaços nas pontas (a forma
+    usada nos cruzamentos com o target). ids tem cada ID uma vez e codigos[linha] é a
+    posição do ID da linha em ids; as linhas do i-ésimo ID são ordem[inicio[i]:inicio[i + 1]],
+    na ordem do arquivo (IDs repetidos preservados).
+    Índices de colunas diferentes (target e chamadas) se cruzam pelos IDs distintos
+    (traduzir), sem voltar ao texto de cada linha.
+    """
+
+    def __init__(self, serie, coluna=None):
+        self.coluna = coluna
+        self.codigos, self.ids = fatorar_texto(serie)
+        self.ordem = np.argsort(self.codigos, kind='stable')
+        self.inicio = np.concatenate(([0], np.cumsum(np.bincount(self.codigos, minlength=len(self.ids)))))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return int(self.ids.memory_usage(deep=True)) + self.codigos.nbytes + self.ordem.nbytes + self.inicio.nbytes
+
+    def grupos(self, valores):
+        """Posição em ids de cada valor consultado (-1 se o ID não existir)."""
+        if isinstance(getattr(valores, 'dtype', None), pd.CategoricalDtype) and valores.cat.categories is self.ids:
+            return valores.cat.codes.to_numpy()
+        codigos, distintos = fatorar_texto(valores)
+        return self.ids.get_indexer(distintos)[codigos]
+
+    def traduzir(self, outro):
+        """Posição em ids de cada ID de outro.ids (-1 se não existir): cruza só os distintos."""
+        if outro is self:
+            return np.arange(len(self.ids))
+        return self.ids.get_indexer(outro.ids)
+
+    def linhas(self, grupos, manter_sem_par=False):
+        """
+        Linhas de cada grupo consultado (posições em ids, -1 = ID inexistente).
+        Retorna (pos_consulta, pos_linha): a i-ésima linha encontrada é a linha pos_linha[i]
+        da coluna indexada para a consulta pos_consulta[i], na ordem das consultas e, dentro
+        de cada uma, na ordem do arquivo. Consultas sem linha não aparecem, ou, com
+        manter_sem_par=True, aparecem uma vez com pos_linha -1 (como um merge how='left').
+        """
+        grupos = np.asarray(grupos, dtype=np.int64)
+        # O elemento extra no fim atende as consultas -1: nenhuma linha, a partir do fim de ordem
+        quantidade = np.append(np.diff(self.inicio), 0)[grupos]
+        inicio = np.append(self.inicio[:-1], len(self.ordem))[grupos]
+        repeticoes = np.maximum(quantidade, 1) if manter_sem_par else quantidade
+
+        pos_consulta, posicoes = _expandir(inicio, repeticoes)
+        return pos_consulta, np.append(self.ordem, -1)[posicoes]
+
+
+def indexar_target(df_target, id_coluna_target):
+    """Constrói o IndiceIds de df_target pela coluna de ID."""
+    return IndiceIds(df_target[id_coluna_target], id_coluna_target)
+
+
+def indexar_ids_chamadas(df):
+    """Constrói o IndiceIds de df_chamadas pela coluna ID_Conversa."""
+    return IndiceIds(df['ID_Conversa'], 'ID_Conversa')
+
+
+def tomar(valores, posicoes):
+    """
+    valores[posicoes], com nulo onde a posição é -1 (linha sem par num cruzamento).
+    Colunas category e outros tipos do pandas mantêm o tipo, como num merge.
+    """
+    if isinstance(getattr(valores, 'dtype', None), pd.api.extensions.ExtensionDtype):
+        valores = pd.Series(valores).array
+    else:
+        valores = np.asarray(valores)
+    return take(valores, posicoes, allow_fill=True)
+
+
+def fatorar_texto(serie, nulos_como_texto=True, ordenar=False):
+    """
+    Equivale a pd.factorize(serie.astype(str).str.strip()), mas converte e limpa só os
+    valores distintos em vez de cada linha. Com nulos_como_texto=False os nulos ficam
+    com código -1 (como no factorize) em vez de virar 'nan'.
+    Uma coluna category já traz os distintos (as categorias) e os códigos por linha:
+    nenhuma linha é relida.
+    Retorna (codigos, distintos).
+    """
+    if isinstance(getattr(serie, 'dtype', None), pd.CategoricalDtype):
+        categorico = pd.Categorical(serie)
+        codigos, distintos = categorico.codes, categorico.categories
+        if nulos_como_texto and (codigos < 0).any():
+            codigos = np.where(codigos < 0, len(distintos), codigos)
+            distintos = distintos.append(pd.Index(['nan'], dtype=distintos.dtype))
+        textos = pd.Series(distintos)
+        if not isinstance(textos.dtype, pd.StringDtype):
+            textos = textos.astype(object).astype(str)
+    else:
+        codigos, distintos = pd.factorize(np.asarray(serie, dtype=object), use_na_sentinel=not nulos_como_texto)
+        textos = pd.Series(distintos, dtype=object).astype(str)
+
+    codigos_texto, distintos_texto = pd.factorize(textos.str.strip(), sort=ordenar)
+    codigos_texto = np.append(codigos_texto, -1)  # codigos == -1 (nulo) continua -1
+    return codigos_texto[codigos], pd.Index(distintos_texto)
+
+
+def codificar_ids(serie):
+    """
+    Coluna de ID de conversa como category: cada ID distinto (texto sem espaços nas
+    pontas, guardado como string do pyarrow) fica uma vez no dicionário e cada linha
+    carrega só o código inteiro. Cruzamentos e cópias (rechamadas, motivos) usam os
+    códigos; decodificar_ids volta ao texto para exibição e exportação.
+    """
+    codigos, ids = fatorar_texto(serie)
+    categorias = pd.Index(ids.astype(str) if ids.dtype == object else ids, dtype='string[pyarrow]')
+    return pd.Series(pd.Categorical.from_codes(codigos, dtype=pd.CategoricalDtype(categorias)), index=serie.index)
+
+
+def decodificar_ids(df):
+    """
+    df com as colunas category de dicionário maior que o próprio df (os IDs de conversa)
+    de volta em texto, para exibição e exportação. Só os códigos das linhas de df são
+    convertidos; o dicionário inteiro não é materializado.
+    """
+    decodificadas = {}
+    for col in df.columns[[isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes]]:
+        categorias = df[col].cat.categories
+        if len(categorias) <= len(df):
+            continue
+        codigos = df[col].cat.codes.to_numpy()
+        texto = np.asarray(tomar(categorias, codigos), dtype=object)
+        texto[codigos < 0] = np.nan
+        decodificadas[col] = texto
+    return df.assign(**decodificadas) if decodificadas else df
+
+
+def _juntar_distintos_por_grupo(codigos, quantidade_grupos, valores, separador=' | '):
+    """
+    Para cada grupo (codigos de 0 a quantidade_grupos - 1), junta os valores distintos
+    não vazios, em ordem, com o separador; grupos sem valor ficam None.
+    Vetorizado: os pares (grupo, valor) viram uma chave inteira, uma ordenação deixa os
+    repetidos lado a lado (e os valores em ordem), e o pyarrow junta cada grupo a partir
+    dos offsets.
+    """
+    # ordenar=True ordena os valores como o sorted() do Python
+    codigos_valor, distintos = fatorar_texto(valores, nulos_como_texto=False, ordenar=True)
+    preenchidos = (codigos_valor >= 0) & (distintos.to_numpy()[codigos_valor] != '')
+
+    pares = np.sort(np.asarray(codigos, dtype=np.int64)[preenchidos] * len(distintos) + codigos_valor[preenchidos])
+    pares = pares[np.concatenate(([True], pares[1:] != pares[:-1]))] if len(pares) else pares
+    grupo, valor = np.divmod(pares, max(len(distintos), 1))
+
+    quantidade = np.bincount(grupo, minlength=quantidade_grupos)
+    offsets = np.concatenate(([0], np.cumsum(quantidade)))
+    listas = pa.LargeListArray.from_arrays(
+        pa.array(offsets, type=pa.int64()),
+        pa.array(distintos.to_numpy(dtype=object)[valor], type=pa.large_string())
+    )
+    juntados = pc.binary_join(listas, pa.scalar(separador, type=pa.large_string())).to_numpy(zero_copy_only=False).astype(object)
+    juntados[quantidade == 0] = None
+    return juntados
+
+
+def agregar_target(df_target, id_coluna_target, colunas, indice_target=None):
+    """
+    Uma linha por ID do target (texto sem espaços nas pontas), com os valores distintos
+    de cada coluna juntados por " | " em ordem alfabética (None se o ID não tiver valor).
+    indice_target: IndiceIds de df_target pela coluna de ID (construído aqui se não for
+    informado); a i-ésima linha do resultado é o ID indice_target.ids[i].
+    """
+    if indice_target is None:
+        indice_target = indexar_target(df_target, id_coluna_target)
+    df_target_agg = pd.DataFrame({id_coluna_target: indice_target.ids})
+    for col in colunas:
+        if col == id_coluna_target:
+            continue
+        df_target_agg[col] = _juntar_distintos_por_grupo(indice_target.codigos, len(indice_target), df_target[col])
+    return df_target_agg
+
+
+SEPARADORES_ASSUNTOS = r'[;,/|]+'
+
+
+class IndiceAssuntos:
+    """
+    Assuntos de uma coluna do target, separados uma única vez por valor distinto
+    (separadores ; , / |, sem espaços nas pontas; vazios e 'nan' descartados).
+    codigos[linha] é o valor distinto da linha e os assuntos do valor v são
+    assunto[inicio[v]:inicio[v + 1]] (repetições preservadas), códigos de assuntos,
+    que fica em ordem alfabética. As contagens por assunto saem de dois bincount: das
+    linhas para os valores distintos e destes para os assuntos.
+    """
+
+    def __init__(self, serie, coluna=None):
+        self.coluna = coluna
+        valores = np.asarray(serie, dtype=object)
+        self.codigos, distintos = pd.factorize(valores)
+        distintos = np.asarray(distintos, dtype=object)
+
+        # Nulos separados pelo texto, como no astype(str): NaN vira 'nan', que não gera
+        # assunto, mas None vira o assunto 'None'
+        nulos = self.codigos < 0
+        if nulos.any():
+            codigos_nulos, textos_nulos = pd.factorize(valores[nulos].astype(str))
+            self.codigos[nulos] = len(distintos) + codigos_nulos
+            distintos = np.concatenate([distintos, textos_nulos.astype(object)])
+
+        partes = pd.Series(distintos, dtype=object).astype(str).str.split(SEPARADORES_ASSUNTOS).explode()
+        partes = partes.astype(str).str.strip()
+        partes = partes[(partes != '') & (partes != 'nan')]
+
+        # sort=True deixa os assuntos na ordem do sorted() do Python
+        self.assunto, assuntos = pd.factorize(partes, sort=True)
+        self.assuntos = pd.Index(assuntos, dtype=object, name='Assunto')
+        valor_da_parte = partes.index.to_numpy(dtype=np.int64)
+        self.inicio = np.concatenate(([0], np.cumsum(np.bincount(valor_da_parte, minlength=len(distintos)))))
+
+    def __len__(self):
+        return len(self.assuntos)
+
+    @property
+    def nbytes(self):
+        return (
+            self.codigos.nbytes + self.assunto.nbytes + self.inicio.nbytes +
+            int(self.assuntos.memory_usage(deep=True))
+        )
+
+    def valores(self, linhas):
+        """Valor distinto de cada linha do target (posições; -1 = sem linha, sem assunto)."""
+        return np.append(self.codigos, -1)[linhas]
+
+    def contar(self, valores, pesos=None):
+        """
+        Por assunto, a quantidade (ou a soma dos pesos) das linhas com cada valor, como um
+        value_counts (ou groupby.sum) depois de explodir: cada linha conta uma vez para
+        cada assunto do seu valor. valores: valor distinto por linha (-1 = não conta).
+        """
+        validos = valores >= 0
+        por_valor = np.bincount(
+            valores[validos], weights=None if pesos is None else pesos[validos], minlength=len(self.inicio) - 1
+        )
+        por_assunto = np.bincount(self.assunto, weights=np.repeat(por_valor, np.diff(self.inicio)), minlength=len(self))
+        return por_assunto.astype(np.int64) if pesos is None else por_assunto
+
+    def explodir(self, valores):
+        """(pos_linha, assunto): uma posição por assunto de cada linha, na ordem das linhas."""
+        quantidade = np.append(np.diff(self.inicio), 0)[valores]
+        inicio = np.append(self.inicio[:-1], 0)[valores]
+        pos_linha, posicoes = _expandir(inicio, quantidade)
+        return pos_linha, self.assunto[posicoes]
+
+
+def indexar_assuntos(df_target, coluna_assunto):
+    """Constrói o IndiceAssuntos da coluna de assunto do target."""
+    return IndiceAssuntos(df_target[coluna_assunto], coluna_assunto)
+
+
+class DetalheAssuntos:
+    """
+    Detalhe por assunto de todas as ligações (uma linha por ligação e assunto) guardado
+    como posições: a linha i é a ligação pos_ligacao[i] de df_chamadas com a linha
+    pos_target[i] do target (-1 = ID fora do target). As contagens usam só esses arrays;
+    para_dataframe monta a tabela explodida quando ela é exportada.
+    """
+
+    def __init__(self, df_chamadas, indice_telefones, ids_chamadas, assuntos_target, indice_assuntos,
+                 pos_ligacao, pos_target):
+        self.df_chamadas = df_chamadas
+        self.indice_telefones = indice_telefones
+        self.ids_chamadas = ids_chamadas
+        self.assuntos_target = assuntos_target
+        self.indice_assuntos = indice_assuntos
+        self.pos_ligacao = pos_ligacao
+        self.pos_target = pos_target
+        self.valores = indice_assuntos.valores(pos_target)
+
+    def __len__(self):
+        return len(self.pos_ligacao)
+
+    @property
+    def nbytes(self):
+        """Memória dos arrays próprios (as tabelas e índices referenciados não entram na conta)."""
+        return self.pos_ligacao.nbytes + self.pos_target.nbytes + self.valores.nbytes
+
+    def total_ligacoes_telefone(self):
+        return self.indice_telefones.por_linha(self.indice_telefones.quantidade)[self.pos_ligacao]
+
+    def primeira_ligacao(self):
+        """Primeira ligação do telefone (só a primeira linha dela, se o target repetir o ID)."""
+        repetida = np.diff(self.pos_ligacao, prepend=-1) == 0
+        return self.indice_telefones.primeira_por_linha()[self.pos_ligacao] & ~repetida
+
+    def para_dataframe(self, coluna_assunto=None, nova_coluna='Assunto'):
+        """
+        Tabela explodida: as colunas de df_chamadas, os indicadores do telefone, o valor
+        original do assunto e nova_coluna com um assunto por linha. O índice é a posição
+        da ligação+target antes de explodir.
+        """
+        coluna_assunto = coluna_assunto or self.indice_assuntos.coluna
+        total = self.total_ligacoes_telefone()
+        df = self.df_chamadas.take(self.pos_ligacao).reset_index(drop=True).assign(
+            total_ligacoes_telefone=total,
+            cliente_uma_ligacao=total == 1,
+            cliente_reincidente=total > 1,
+        )
+        df['ID_Conversa'] = pd.Categorical.from_codes(
+            self.ids_chamadas.codigos[self.pos_ligacao], categories=self.ids_chamadas.ids
+        )
+        df[coluna_assunto] = tomar(self.assuntos_target, self.pos_target)
+        df['primeira_ligacao'] = self.primeira_ligacao()
+
+        pos_linha, assunto = self.indice_assuntos.explodir(self.valores)
+        df = df.take(pos_linha)
+        df[nova_coluna] = self.indice_assuntos.assuntos.to_numpy()[assunto]
+        return df
+
+
+def analisar_motivos_rechamadas(df_chamadas, rechamadas_detalhe, df_target, id_coluna_target, colunas_retorno,
+                                indice_target=None, ids_chamadas=None):
     """
     Cruza as rechamadas identificadas com os motivos de contato de um arquivo target.
     Garante 1 linha por rechamada (ID_Conversa_Primeira + ID_Conversa_Segunda),
     mesmo que o target tenha múltiplos registros por ID Genesys.
+    indice_target: IndiceIds de df_target pela coluna id_coluna_target; ids_chamadas:
+    IndiceIds do ID_Conversa das chamadas das rechamadas. Os que não forem informados
+    são construídos aqui.
     """
-    if not rechamadas_detalhe or df_target.empty:
+    if rechamadas_detalhe is None or df_target.empty:
         return pd.DataFrame(), "Dados de rechamadas ou arquivo target vazios."
 
-    # 1) Achata o dicionário de rechamadas em um DataFrame
-    all_rechamadas_list = []
-    for periodo, dados in rechamadas_detalhe.items():
-        for item in dados:
-            all_rechamadas_list.append({
-                'telefone': str(item['telefone']),
-                'primeira_ligacao_datetime': item['primeira_ligacao'],
-                'segunda_ligacao_datetime': item['segunda_ligacao'],
-                'diferenca_horas': item['diferenca_horas'],
-                'periodo_rechamada': periodo,
-                'ID_Conversa_Primeira': str(item['ID_Conversa_Primeira']),
-                'ID_Conversa_Segunda': str(item['ID_Conversa_Segunda'])
-            })
-
-    df_rechamadas_consolidado = pd.DataFrame(all_rechamadas_list)
+    # 1) Monta o DataFrame de rechamadas direto da tabela colunar
+    df_rechamadas_consolidado = rechamadas_detalhe.para_dataframe([
+        'telefone',
+        'primeira_ligacao',
+        'segunda_ligacao',
+        'diferenca_horas',
+        'periodo_rechamada',
+    ]).rename(columns={
+        'primeira_ligacao': 'primeira_ligacao_datetime',
+        'segunda_ligacao': 'segunda_ligacao_datetime'
+    })
+    df_rechamadas_consolidado['telefone'] = formatar_telefone(df_rechamadas_consolidado['telefone'])
 
     if df_rechamadas_consolidado.empty:
         return pd.DataFrame(), "Nenhuma rechamada consolidada."
@@ -564,59 +1862,164 @@ def analisar_motivos_rechamadas(df_chamadas, rechamadas_detalhe, df_target, id_c
     if not colunas_existentes_retorno:
         return pd.DataFrame(), "Nenhuma coluna selecionada existe no target."
 
-    # 3) Normaliza o ID do target e AGREGA motivos por ID (1 linha por ID genesys)
-    df_target_reduzido = df_target[[id_coluna_target] + colunas_existentes_retorno].copy()
-    df_target_reduzido[id_coluna_target] = df_target_reduzido[id_coluna_target].astype(str).str.strip()
+    # 3) AGREGA motivos por ID do target (1 linha por ID genesys, na ordem de indice_target.ids)
+    if indice_target is None or indice_target.coluna != id_coluna_target:
+        indice_target = indexar_target(df_target, id_coluna_target)
+    if ids_chamadas is None:
+        ids_chamadas = indexar_ids_chamadas(rechamadas_detalhe.df_chamadas)
+    df_target_agg = agregar_target(df_target, id_coluna_target, colunas_existentes_retorno, indice_target)
+
+    # 4) IDs das rechamadas normalizados: códigos do dicionário do índice das chamadas
+    codigo_primeira = ids_chamadas.codigos[rechamadas_detalhe.pos_primeira]
+    codigo_segunda = ids_chamadas.codigos[rechamadas_detalhe.pos_segunda]
+    df_rechamadas_consolidado['ID_Conversa_Primeira'] = pd.Categorical.from_codes(codigo_primeira, categories=ids_chamadas.ids)
+    df_rechamadas_consolidado['ID_Conversa_Segunda'] = pd.Categorical.from_codes(codigo_segunda, categories=ids_chamadas.ids)
+
+    # 5) Linha agregada do target de cada ligação: tradução entre os IDs distintos dos
+    # dois índices e um take por coluna, no lugar dos merges por texto (-1 = ID fora do target)
+    grupo_target = indice_target.traduzir(ids_chamadas)
+    grupo_primeira = grupo_target[codigo_primeira]
+    grupo_segunda = grupo_target[codigo_segunda]
 
-    # Para cada coluna de motivo, agregamos valores distintos em uma string única por ID
-    agg_dict = {}
     for col in colunas_existentes_retorno:
-        # Junta valores distintos não nulos, ordenados, separados por " | "
-        agg_dict[col] = lambda s: ' | '.join(sorted({str(v).strip() for v in s.dropna() if str(v).strip()})) or None
-
-    df_target_agg = df_target_reduzido.groupby(id_coluna_target, as_index=False).agg(agg_dict)
-
-    # 4) Normaliza IDs das rechamadas
-    df_rechamadas_consolidado['ID_Conversa_Primeira'] = df_rechamadas_consolidado['ID_Conversa_Primeira'].astype(str).str.strip()
-    df_rechamadas_consolidado['ID_Conversa_Segunda'] = df_rechamadas_consolidado['ID_Conversa_Segunda'].astype(str).str.strip()
-
-    # 5) Prepara mapeamentos de nome de coluna para primeira e segunda ligação
-    rename_map_primeira = {col: f'motivo_primeira_{col}' for col in colunas_existentes_retorno}
-    rename_map_segunda = {col: f'motivo_segunda_{col}' for col in colunas_existentes_retorno}
-
-    # 6) Merge da PRIMEIRA ligação (left join mantém 1 linha por rechamada)
-    df_resultado = pd.merge(
-        df_rechamadas_consolidado,
-        df_target_agg.rename(columns=rename_map_primeira),
-        left_on='ID_Conversa_Primeira',
-        right_on=id_coluna_target,
-        how='left'
-    )
-
-    if id_coluna_target not in colunas_existentes_retorno:
-        df_resultado = df_resultado.drop(columns=[id_coluna_target], errors='ignore')
-
-    # 7) Merge da SEGUNDA ligação
-    df_resultado = pd.merge(
-        df_resultado,
-        df_target_agg.rename(columns=rename_map_segunda),
-        left_on='ID_Conversa_Segunda',
-        right_on=id_coluna_target,
-        how='left',
-        suffixes=('', '_dup')
-    )
-
-    if id_coluna_target not in colunas_existentes_retorno:
-        df_resultado = df_resultado.drop(columns=[id_coluna_target], errors='ignore')
+        df_rechamadas_consolidado[f'motivo_primeira_{col}'] = tomar(df_target_agg[col], grupo_primeira)
+    for col in colunas_existentes_retorno:
+        df_rechamadas_consolidado[f'motivo_segunda_{col}'] = tomar(df_target_agg[col], grupo_segunda)
 
-    # 8) Garante que não houve duplicação de linhas
-    df_resultado = df_resultado.drop_duplicates(
+    # 6) Garante que não houve duplicação de linhas
+    df_resultado = df_rechamadas_consolidado.drop_duplicates(
         subset=['telefone', 'ID_Conversa_Primeira', 'ID_Conversa_Segunda', 'primeira_ligacao_datetime', 'segunda_ligacao_datetime']
     ).reset_index(drop=True)
 
     return df_resultado, None
 
 
+# --- PROCESSAMENTO DOS ARQUIVOS DE AGENTES (NOTA, DESEMPENHO, ATENDIMENTOS) ---
+
+def _colunas_faltando(df, colunas_necessarias):
+    """Mensagem de erro quando faltam colunas obrigatórias (ou None)."""
+    colunas_faltando = [col for col in colunas_necessarias if col not in df.columns]
+    if not colunas_faltando:
+        return None
+    return (
+        f"Colunas faltando: {', '.join(colunas_faltando)}. "
+        f"Colunas encontradas: {', '.join(map(str, df.columns))}"
+    )
+
+
+def process_dataframe_nota(df):
+    """Padroniza o arquivo de Nota (Zendesk): Nome_Agente, Notas_Atendente e CSAT."""
+    erro = _colunas_faltando(df, ['Nome do atribuído', 'Notas Atendente', 'CSAT'])
+    if erro:
+        return None, erro
+
+    # Padroniza nomes
+    df = df.rename(columns={
+        'Nome do atribuído': 'Nome_Agente',
+        'Notas Atendente': 'Notas_Atendente',
+        'CSAT': 'CSAT'
+    })
+
+    # Limpa dados
+    df = df[df['Nome_Agente'].notna() & (df['Nome_Agente'] != '')]
+    df['Nome_Agente'] = df['Nome_Agente'].astype(str).str.strip().str.lower()
+    df['Notas_Atendente'] = pd.to_numeric(df['Notas_Atendente'], errors='coerce').fillna(0)
+    df['CSAT'] = pd.to_numeric(df['CSAT'], errors='coerce').fillna(0)
+    return df, None
+
+
+def process_dataframe_desempenho(df):
+    """Padroniza o arquivo de Desempenho (Genesys) e converte as durações para segundos."""
+    erro = _colunas_faltando(df, ['Nome do agente', 'Atendidas', 'Conversação média', 'Transferidas', 'Conversa máx.'])
+    if erro:
+        return None, erro
+
+    df = df.rename(columns={
+        'Nome do agente': 'Nome_Agente',
+        'Atendidas': 'Atendidas',
+        'Conversação média': 'Conversacao_Media',
+        'Transferidas': 'Transferidas',
+        'Conversa máx.': 'Conversa_Max'
+    })
+
+    df = df[df['Nome_Agente'].notna() & (df['Nome_Agente'] != '')]
+    df['Nome_Agente'] = df['Nome_Agente'].astype(str).str.strip().str.lower()
+
+    # Converte durações para segundos
+    df['TMA_Segundos'] = converter_duracoes_para_segundos(df['Conversacao_Media'])
+    df['Conversa_Max_Segundos'] = converter_duracoes_para_segundos(df['Conversa_Max'])
+
+    df['Atendidas'] = pd.to_numeric(df['Atendidas'], errors='coerce').fillna(0).astype(int)
+    df['Transferidas'] = pd.to_numeric(df['Transferidas'], errors='coerce').fillna(0).astype(int)
+    return df, None
+
+
+def _normalizar_nome_coluna(col):
+    """Troca EN/EM DASH por hífen e remove espaços duplicados do nome da coluna."""
+    col = str(col)
+    col = col.replace('–', '-').replace('—', '-')
+    col = ' '.join(col.split())
+    return col.strip()
+
+
+def process_dataframe_atendimentos(df):
+    """
+    Padroniza o arquivo de Atendimentos detalhados: Nome_Agente, Duracao,
+    duracao_segundos, Tipo_Desconexao e desconexao_agente.
+    """
+    # 'Usuários – Interagiram' -> 'Usuários - Interagiram'
+    df = df.rename(columns=_normalizar_nome_coluna)
+
+    erro = _colunas_faltando(df, ['Duração', 'Usuários - Interagiram', 'Tipo de desconexão'])
+    if erro:
+        return None, erro
+
+    # Renomeia para padrão interno
+    df = df.rename(columns={
+        'Usuários - Interagiram': 'Nome_Agente',
+        'Duração': 'Duracao',
+        'Tipo de desconexão': 'Tipo_Desconexao'
+    })
+
+    # 1. Normaliza nome do agente
+    df['Nome_Agente'] = df['Nome_Agente'].astype(str).str.strip().str.lower()
+    df = df[
+        df['Nome_Agente'].notna() &
+        (df['Nome_Agente'] != '') &
+        (df['Nome_Agente'] != 'nan')
+    ]
+
+    # 2. Converte duração para segundos
+    df['duracao_segundos'] = converter_duracoes_para_segundos(df['Duracao'])
+
+    # 3. Tipo de desconexão -> marcar AGENTE
+    df['Tipo_Desconexao'] = df['Tipo_Desconexao'].astype(str).str.strip().str.lower()
+    df['desconexao_agente'] = df['Tipo_Desconexao'] == 'agente'
+    return df, None
+
+
+PROCESSADORES_AGENTES = {
+    'nota': process_dataframe_nota,
+    'desempenho': process_dataframe_desempenho,
+    'atendimentos': process_dataframe_atendimentos,
+}
+
+
+def load_file_agentes(uploaded_file, tipo):
+    """
+    Carrega um arquivo de agentes ('nota', 'desempenho' ou 'atendimentos') e aplica
+    o processamento correspondente. Retorna (df, erro).
+    """
+    df, erro = load_file_target(uploaded_file)
+    if erro:
+        return None, erro
+
+    try:
+        return PROCESSADORES_AGENTES[tipo](df)
+    except Exception as e:
+        return None, f"Erro ao processar arquivo de {tipo}: {e}"
+
+
 # --- FUNÇÕES DE ANÁLISE DE DESEMPENHO DE AGENTES ---
 
 def process_performance_file(uploaded_file, file_type):
@@ -692,7 +2095,7 @@ def analisar_desempenho_agentes(df_tma, df_desliga, df_nota, normalized_weights,
         'Nota_Media_Satisfacao': 0
     })
 
-    operator_performance = operator_performance[operator_performance['Total_Chamadas'] > 0].copy()
+    operator_performance = operator_performance[operator_performance['Total_Chamadas'] > 0]
 
     if operator_performance.empty:
         return None, "Nenhum operador com chamadas válidas."
@@ -730,112 +2133,3 @@ def analisar_desempenho_agentes(df_tma, df_desliga, df_nota, normalized_weights,
     operator_performance['Rank'] = operator_performance['Score_Desempenho'].rank(ascending=False).astype(int)
 
     return operator_performance.sort_values('Rank').reset_index(drop=True), None
-import streamlit as st
-from utils.data_loader import load_file_chamadas, load_file_target
-
-def show():
-    st.header("📁 Upload de Arquivos")
-
-    # --- ARQUIVO DE CHAMADAS ---
-    st.subheader("Arquivo de Chamadas")
-    uploaded_file_chamadas = st.file_uploader(
-        "Carregar arquivo de chamadas (CSV ou Excel)",
-        type=["csv", "xlsx", "xls"],
-        key="chamadas_upload"
-    )
-
-    if uploaded_file_chamadas:
-        df_chamadas, error = load_file_chamadas(uploaded_file_chamadas)
-        if error:
-            st.error(f"Erro ao carregar arquivo de chamadas: {error}")
-            st.session_state.df_chamadas = None
-        else:
-            if not df_chamadas.empty and 'datetime' in df_chamadas.columns and not df_chamadas['datetime'].isna().all():
-                st.session_state.df_chamadas = df_chamadas
-                st.success(
-                    f"✅ Arquivo de chamadas carregado com sucesso! "
-                    f"Total de registros: {len(df_chamadas):,}"
-                )
-                st.write(f"Colunas detectadas: {list(df_chamadas.columns)}")
-                st.write("Primeiras 5 linhas do arquivo de chamadas:")
-                st.dataframe(df_chamadas.head())
-            else:
-                st.error(
-                    "❌ O arquivo de chamadas carregado está vazio ou não contém datas válidas após o processamento. "
-                    "Verifique o conteúdo do arquivo."
-                )
-                st.session_state.df_chamadas = None
-
-    # --- ARQUIVO TARGET ---
-    st.subheader("Arquivo Target (para Motivos de Rechamadas)")
-    uploaded_file_target = st.file_uploader(
-        "Carregar arquivo Target (CSV ou Excel)",
-        type=["csv", "xlsx", "xls"],
-        key="target_upload"
-    )
-
-    if uploaded_file_target:
-        df_target, error = load_file_target(uploaded_file_target)
-        if error:
-            st.error(f"Erro ao carregar arquivo target: {error}")
-            st.session_state.df_target = None
-        else:
-            st.session_state.df_target = df_target
-            st.success(
-                f"✅ Arquivo target carregado com sucesso! "
-                f"Total de registros: {len(df_target):,}"
-            )
-            st.write(f"Colunas detectadas: {list(df_target.columns)}")
-            st.write("Primeiras 5 linhas do arquivo target:")
-            st.dataframe(df_target.head())
-
-    # --- ARQUIVOS DE DESEMPENHO ---
-    st.subheader("Arquivos de Desempenho de Agentes (Opcional)")
-
-    uploaded_file_tma = st.file_uploader(
-        "Carregar arquivo TMA",
-        type=["xlsx", "xls"],
-        key="tma_upload"
-    )
-
-    uploaded_file_desliga = st.file_uploader(
-        "Carregar arquivo Desliga",
-        type=["xlsx", "xls"],
-        key="desliga_upload"
-    )
-
-    uploaded_file_nota = st.file_uploader(
-        "Carregar arquivo Nota",
-        type=["xlsx", "xls"],
-        key="nota_upload"
-    )
-
-    if uploaded_file_tma:
-        from utils.data_loader import process_performance_file
-        df_tma, error = process_performance_file(uploaded_file_tma, 'tma')
-        if error:
-            st.error(f"Erro ao carregar arquivo TMA: {error}")
-            st.session_state.df_tma = None
-        else:
-            st.session_state.df_tma = df_tma
-            st.success(f"✅ Arquivo TMA carregado com sucesso! Total de registros: {len(df_tma):,}")
-
-    if uploaded_file_desliga:
-        from utils.data_loader import process_performance_file
-        df_desliga, error = process_performance_file(uploaded_file_desliga, 'desliga')
-        if error:
-            st.error(f"Erro ao carregar arquivo Desliga: {error}")
-            st.session_state.df_desliga = None
-        else:
-            st.session_state.df_desliga = df_desliga
-            st.success(f"✅ Arquivo Desliga carregado com sucesso! Total de registros: {len(df_desliga):,}")
-
-    if uploaded_file_nota:
-        from utils.data_loader import process_performance_file
-        df_nota, error = process_performance_file(uploaded_file_nota, 'nota')
-        if error:
-            st.error(f"Erro ao carregar arquivo Nota: {error}")
-            st.session_state.df_nota = None
-        else:
-            st.session_state.df_nota = df_nota
-            st.success(f"✅ Arquivo Nota carregado com sucesso! Total de registros: {len(df_nota):,}")
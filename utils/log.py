@@ -0,0 +1,40 @@
+import logging
+
+import streamlit as st
+
+# --- LOG DOS UTILITÁRIOS NA INTERFACE ---
+# Os módulos de utils registram diagnósticos com logging.getLogger(__name__). No app,
+# este handler mostra cada registro na aba que está rodando; na linha de comando
+# (cli.py) o logging padrão escreve no terminal.
+
+FUNCOES_POR_NIVEL = [
+    (logging.ERROR, st.error),
+    (logging.WARNING, st.warning),
+    (logging.INFO, st.info),
+]
+
+
+class HandlerStreamlit(logging.Handler):
+    """Repassa os registros de log para st.error / st.warning / st.info, conforme o nível."""
+
+    def emit(self, record):
+        try:
+            mensagem = self.format(record)
+            for nivel, funcao in FUNCOES_POR_NIVEL:
+                if record.levelno >= nivel:
+                    funcao(mensagem)
+                    return
+        except Exception:
+            self.handleError(record)
+
+
+def configurar_log_streamlit(nome='utils', nivel=logging.INFO):
+    """
+    Liga o HandlerStreamlit ao logger dos utilitários. O app roda de novo a cada
+    interação; o handler só é adicionado uma vez.
+    """
+    logger = logging.getLogger(nome)
+    logger.setLevel(nivel)
+    if not any(isinstance(h, HandlerStreamlit) for h in logger.handlers):
+        logger.addHandler(HandlerStreamlit())
+    return logger
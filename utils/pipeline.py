@@ -0,0 +1,237 @@
+import os
+import sys
+import hashlib
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.data_loader import (
+    identificar_faixas_rechamada,
+    indexar_telefones,
+    indexar_target,
+    indexar_ids_chamadas,
+    indexar_assuntos,
+    indexar_datas,
+)
+from utils.analises import (
+    consolidar_rechamadas,
+    cruzar_motivos,
+    resumir_assuntos,
+    montar_painel_motivos,
+    gerar_lista_mailing,
+    consolidar_agentes,
+    calcular_ranking,
+)
+
+# --- PIPELINE DAS ANÁLISES ---
+# Cada etapa declara suas entradas: fontes (DataFrames carregados no upload, lidos de um
+# mapeamento como o st.session_state) ou outras etapas. A impressão de uma etapa combina
+# seu nome, seus parâmetros e as impressões das entradas, e os resultados são guardados
+# por impressão. Assim um novo upload invalida tudo o que depende dele e uma etapa pedida
+# recalcula só o que ainda não foi calculado no caminho. Uma etapa de entrada recebe só
+# os parâmetros que a etapa declara repassar a ela: a impressão depende apenas dos
+# parâmetros pedidos, e não de qual página pediu a etapa de entrada por último.
+
+
+class Etapa:
+    """
+    Declaração de uma etapa: função(*valores das entradas, **parâmetros).
+    Cada entrada é um nome (fonte ou etapa sem parâmetros) ou (etapa, nomes): a etapa de
+    entrada é calculada com esses parâmetros da própria etapa, com os mesmos nomes.
+    """
+
+    def __init__(self, nome, funcao, entradas):
+        self.nome = nome
+        self.funcao = funcao
+        self.entradas = tuple(
+            (entrada, ()) if isinstance(entrada, str) else (entrada[0], tuple(entrada[1]))
+            for entrada in entradas
+        )
+
+
+ETAPAS = {
+    etapa.nome: etapa for etapa in [
+        Etapa('indice_datas', indexar_datas, ['df_chamadas_completo']),
+        Etapa('telefones', indexar_telefones, ['df_chamadas']),
+        Etapa('rechamadas', identificar_faixas_rechamada, ['df_chamadas']),
+        Etapa('indice_target', indexar_target, ['df_target']),
+        Etapa('ids_chamadas', indexar_ids_chamadas, ['df_chamadas']),
+        Etapa('assuntos', indexar_assuntos, ['df_target']),
+        Etapa('indicadores_rechamadas', consolidar_rechamadas, ['df_chamadas', 'rechamadas', 'telefones']),
+        Etapa('motivos', cruzar_motivos, [
+            'df_chamadas', 'rechamadas', 'df_target', ('indice_target', ['id_coluna_target']), 'ids_chamadas'
+        ]),
+        Etapa('resumo_assuntos', resumir_assuntos, [
+            'df_chamadas', 'rechamadas', 'df_target', 'telefones', ('indice_target', ['id_coluna_target']),
+            'ids_chamadas', ('assuntos', ['coluna_assunto'])
+        ]),
+        Etapa('painel_motivos', montar_painel_motivos, [
+            ('motivos', ['id_coluna_target', 'coluna_assunto']),
+            ('resumo_assuntos', ['id_coluna_target', 'coluna_assunto']),
+        ]),
+        Etapa('mailing', gerar_lista_mailing, ['df_chamadas', 'rechamadas', 'telefones']),
+        Etapa('agentes', consolidar_agentes, ['df_nota', 'df_desempenho']),
+        Etapa('ranking', calcular_ranking, ['df_nota', 'df_desempenho', 'df_atendimentos']),
+    ]
+}
+
+# Memória máxima dos resultados guardados por sessão (os mais antigos são descartados)
+LIMITE_MEMO_BYTES = int(os.environ.get('APP_ANALISES_MEMO_MB', 512)) * 1024 * 1024
+
+
+def tamanho_resultado(resultado):
+    """Estimativa em bytes da memória de um resultado (DataFrames, arrays, tuplas, dicts)."""
+    if isinstance(resultado, pd.DataFrame):
+        uso = resultado.memory_usage(deep=True)
+        # Dicionários de IDs (category maior que o resultado) pertencem ao arquivo
+        # carregado e são compartilhados: o resultado só guarda os códigos
+        for col in resultado.columns[[isinstance(dtype, pd.CategoricalDtype) for dtype in resultado.dtypes]]:
+            if len(resultado[col].cat.categories) > len(resultado):
+                uso[col] = resultado[col].cat.codes.nbytes
+        return int(uso.sum())
+    if isinstance(resultado, pd.Series):
+        return int(resultado.memory_usage(deep=True))
+    if hasattr(resultado, 'nbytes'):
+        return int(resultado.nbytes)
+    if isinstance(resultado, (tuple, list)):
+        return sys.getsizeof(resultado) + sum(tamanho_resultado(item) for item in resultado)
+    if isinstance(resultado, dict):
+        return sys.getsizeof(resultado) + sum(tamanho_resultado(item) for item in resultado.values())
+    return sys.getsizeof(resultado)
+
+
+def recortes_referenciados(resultado):
+    """
+    Recortes de período (df.attrs['periodo'], ver fatiar_periodo) que o resultado mantém
+    vivos pela referência df_chamadas. O arquivo inteiro fica na sessão de qualquer forma,
+    mas um recorte antigo só continua em memória por causa dos resultados memorizados.
+    """
+    df = getattr(resultado, 'df_chamadas', None)
+    if isinstance(df, pd.DataFrame) and 'periodo' in df.attrs:
+        return [df]
+    if isinstance(resultado, (tuple, list)):
+        return [df for item in resultado for df in recortes_referenciados(item)]
+    if isinstance(resultado, dict):
+        return [df for item in resultado.values() for df in recortes_referenciados(item)]
+    return []
+
+
+def _repassar(parametros, nomes):
+    """Parâmetros que uma etapa repassa a uma entrada; falta de um deles é erro de uso."""
+    faltando = [nome for nome in nomes if nome not in parametros]
+    if faltando:
+        raise TypeError(f"Parâmetros não informados para a etapa de entrada: {', '.join(faltando)}")
+    return {nome: parametros[nome] for nome in nomes}
+
+
+class Pipeline:
+    """
+    Resultados das etapas de uma sessão, memorizados por impressão em um LRU limitado a
+    limite_bytes: voltar a uma configuração já calculada (outro valor por ligação, outra
+    coluna de assunto, outros pesos) devolve o resultado guardado sem recalcular.
+
+    A fonte entra na impressão pelo df.attrs['impressao'] (hash do conteúdo, ver
+    utils/cache.py) ou, sem ele, pela identidade do objeto: o upload sempre guarda um
+    DataFrame novo, e a referência mantida aqui impede que outro objeto reaproveite o
+    mesmo id enquanto a versão estiver em uso.
+    """
+
+    def __init__(self, etapas=ETAPAS, limite_bytes=LIMITE_MEMO_BYTES):
+        self.etapas = etapas
+        self.limite_bytes = limite_bytes
+        self._fontes = {}                    # fonte -> (versão, objeto)
+        self._resultados = OrderedDict()     # impressão -> (etapa, resultado, bytes, recortes), do menos ao mais recente
+        self._recortes = {}                  # id do recorte -> [recorte, resultados que o referenciam, bytes]
+        self._bytes = 0
+
+    def _impressao_fonte(self, nome, fontes):
+        valor = fontes.get(nome)
+        impressao = getattr(valor, 'attrs', {}).get('impressao')
+        if impressao:
+            return f"{nome}#{impressao}"
+
+        versao, atual = self._fontes.get(nome, (0, None))
+        if valor is not atual:
+            versao += 1
+            self._fontes[nome] = (versao, valor)
+        return f"{nome}@{versao}"
+
+    def impressao(self, nome, fontes, parametros=None):
+        """Impressão da etapa com os parâmetros dados (as entradas recebem os repassados)."""
+        etapa = self.etapas[nome]
+        parametros = parametros or {}
+
+        partes = [nome, repr(sorted(parametros.items()))]
+        for entrada, repassados in etapa.entradas:
+            if entrada in self.etapas:
+                partes.append(self.impressao(entrada, fontes, _repassar(parametros, repassados)))
+            else:
+                partes.append(self._impressao_fonte(entrada, fontes))
+        return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+    def _buscar(self, impressao):
+        registro = self._resultados.get(impressao)
+        if registro is None:
+            return None
+        self._resultados.move_to_end(impressao)
+        return registro
+
+    def _guardar(self, impressao, nome, resultado):
+        tamanho = tamanho_resultado(resultado)
+
+        # Cada recorte de período referenciado entra uma única vez na conta, enquanto
+        # algum resultado memorizado o referenciar
+        recortes = {id(df): df for df in recortes_referenciados(resultado)}
+        for chave, recorte in recortes.items():
+            if chave not in self._recortes:
+                self._recortes[chave] = [recorte, 0, tamanho_resultado(recorte)]
+                self._bytes += self._recortes[chave][2]
+            self._recortes[chave][1] += 1
+
+        self._resultados[impressao] = (nome, resultado, tamanho, list(recortes))
+        self._bytes += tamanho
+
+        # Descarta os menos usados até caber no limite; o resultado recém-calculado fica
+        while self._bytes > self.limite_bytes and len(self._resultados) > 1:
+            _, (_, _, tamanho_antigo, recortes_antigos) = self._resultados.popitem(last=False)
+            self._bytes -= tamanho_antigo
+            for chave in recortes_antigos:
+                self._recortes[chave][1] -= 1
+                if self._recortes[chave][1] == 0:
+                    self._bytes -= self._recortes.pop(chave)[2]
+
+    def atual(self, nome, fontes, **parametros):
+        """Resultado da etapa para as fontes e parâmetros atuais, se estiver memorizado; senão None."""
+        registro = self._buscar(self.impressao(nome, fontes, parametros))
+        return None if registro is None else registro[1]
+
+    def calculada(self, nome):
+        """Indica se a etapa tem algum resultado memorizado (mesmo que de outra configuração)."""
+        return any(registro[0] == nome for registro in self._resultados.values())
+
+    def uso_memoria(self):
+        """(quantidade de resultados memorizados, bytes estimados)."""
+        return len(self._resultados), self._bytes
+
+    def limpar(self):
+        self._resultados.clear()
+        self._recortes.clear()
+        self._bytes = 0
+
+    def obter(self, nome, fontes, **parametros):
+        """Resultado da etapa, recalculando ela e as entradas que não estiverem memorizadas."""
+        etapa = self.etapas[nome]
+        impressao = self.impressao(nome, fontes, parametros)
+
+        registro = self._buscar(impressao)
+        if registro is not None:
+            return registro[1]
+
+        valores = [
+            self.obter(entrada, fontes, **_repassar(parametros, repassados))
+            if entrada in self.etapas else fontes.get(entrada)
+            for entrada, repassados in etapa.entradas
+        ]
+        resultado = etapa.funcao(*valores, **parametros)
+        self._guardar(impressao, nome, resultado)
+        return resultado
@@ -1,3 +1,4 @@
+import io
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
@@ -22,6 +23,17 @@ def set_style():
     plt.rcParams['axes.facecolor'] = 'white'
 
 
+def figura_png(fig, dpi=200):
+    """
+    Renderiza a figura em PNG (as mesmas opções do st.pyplot) e fecha a figura.
+    O PNG pode ser guardado e exibido com st.image sem redesenhar o gráfico.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
 def plot_bar_chart(data, x, y, title, xlabel=None, ylabel=None,
                   color='skyblue', figsize=(10, 6), is_horizontal=False):
     """